@@ -66,6 +66,17 @@ Provided by Gismo 0.0.3
                           This type is also mandatory for both Meteonorm 6 and Meteonorm 7.
                           -
                           If not supplied 0 (Meteonorm 6 and Meteonorm 7) will be used by default.
+        horizonEngine_: The method used for calculation of horizon angles:
+                        -
+                        0 - elevation grid sweep: "_context" is rasterized to an elevation grid once. Then for each azimuth the grid is walked outward from the "_analysisGeometry" point, while keeping the maximal elevation angle. Thin obstacles narrower than a grid cell (1/1000 of the "_context" size) are enlarged to a single grid cell.
+                        1 - sky dome rays: rays are shot from each "_analysisGeometry" point towards the sky dome in 0.1 degrees horizontal and 0.075 degrees vertical steps. The highest ray which hits the "_context" gives the horizon angle of each azimuth. It is the slowest method.
+                        2 - sky dome rays search: for each of the 360 azimuths, the highest ray which hits the "_context" is searched for (starting from the result of the previous azimuth) with far less rays than the 1 method. Very thin obstacles (for example: poles) may be missed.
+                        -
+                        If not supplied, 1 (sky dome rays) will be used by default.
+        parallel_: Set to "True" to calculate the horizon angles on all processor cores at the same time.
+                   The 360 azimuths are split into 36 sectors, which are then processed in parallel. The results are the same as with "False".
+                   -
+                   If not supplied default value "False" will be used.
         exportHorizon_: Set to "True" to bake export(create) a .hor file.
                         -
                         If not supplied default value "False" will be used.
@@ -108,6 +119,7 @@ ghenv.Component.IconDisplayMode = ghenv.Component.IconDisplayMode.application
 ghenv.Component.Category = "Gismo"
 ghenv.Component.SubCategory = "2 | Terrain"
 #compatibleGismoVersion = VER 0.0.3\nJAN_29_2019
+#requiresGismoKernels
 try: ghenv.Component.AdditionalHelpFromDocStrings = "2"
 except: pass
 
@@ -122,7 +134,7 @@ import math
 import os
 
 
-def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometryIndex, workingFolderPath, horizonFileType):
+def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometryIndex, workingFolderPath, horizonFileType, horizonEngine):
     
     pathsAnalysisGeometry = analysisGeometry.Paths
     analysisGeometryBranchesLists = analysisGeometry.Branches
@@ -176,21 +188,21 @@ def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometry
         if item == None:
             NoneItemsIn_srfCentroidL += 1
     if len(srfCentroidL) == NoneItemsIn_srfCentroidL:
-        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
         validInputData = False
         printMsg = "The value(s) you supplied to the \"_analysisGeometry\" input are neither points nor surfaces.\n" + \
                    "Please input one of these."
-        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
     
     
     # check if something inputted into "context_" input
     if len(contextMeshes) == 0:
-        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
         validInputData = False
         printMsg = "Input the \"terrainShadingMask\" output from \"Terrain shading mask\" component.\n" + \
                    "You can additionally input other opaque obstacles surrounding your location: houses, buildings etc.\n" + \
                    "Do not input trees, as they are not opaque obstacles and should not be taken into account when analysing the horizon angles."
-        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
     else:
         # remove "None" from context_
         contextMeshesFiltered = []
@@ -210,10 +222,10 @@ def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometry
         try:  # check if it's a number
             north = float(north)
             if north < 0 or north > 360:
-                srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+                srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
                 validInputData = False
                 printMsg = "Please input north angle value from 0 to 360."
-                return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+                return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
         except Exception, e:  # check if it's a vector
             north.Unitize()
         
@@ -234,12 +246,12 @@ def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometry
         workingSubFolderPath = os.path.join(workingFolderPath, "horizon_files")
     folderCreated = gismo_preparation.createFolder(workingSubFolderPath)
     if folderCreated == False:
-        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+        srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
         validInputData = False
         printMsg = "workingFolder_ input is invalid.\n" + \
                    "Input the string in the following format (example): C:\someFolder.\n" + \
                    "Or do not input anything, in which case a default Gismo folder will be used instead."
-        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+        return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
     
     
     if (horizonFileType == None) or (horizonFileType == 0):  # .hor file with no heading (Meteonorm 6 and Meteonorm 7)
@@ -266,21 +278,25 @@ def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometry
               "horizonFileType_ input set to 0 (Meteonorm) by default."
     
     
+    if (horizonEngine == None) or (horizonEngine < 0) or (horizonEngine > 2):
+        horizonEngine = 1  # default, sky dome rays
+    
+    
     if (outputGeometryIndex == None) or (outputGeometryIndex < 0):
         outputGeometryIndex = 0  # default
     else:
         if (outputGeometryIndex + 1) > len(pathsAnalysisGeometry):
-            srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+            srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
             validInputData = False
             printMsg = "The index number inputted into \"outputGeometryIndex_\" is higher than number of inputted objects into \"_analysisGeometry\". Please choose an input for \"outputGeometryIndex_\" from 0 to %s." % str(len(analysisGeometryBranchesLists)-1)
-            return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+            return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
         elif srfCentroidL[outputGeometryIndex] == None:
-            srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = unitConversionFactor = None
+            srfCornerPtsLL = srfCentroidL = srfCentroid = contextMeshJoined = northRad = northVec = scale = outputGeometryIndex = workingSubFolderPath = horizonFileType = horizonFileTypeLabel = horizonEngine = unitConversionFactor = None
             validInputData = False
             printMsg = "The %s supplied to the \"outputGeometryIndex_\" input, points to the %s. item in the \"_analysisGeometry\" input. This item is neither a surface, nor a point, therefor it's invalid.\n" % (outputGeometryIndex, outputGeometryIndex) + \
                        "Remove that item from your \"_analysisGeometry\" input, or change the value supplied to the \"outputGeometryIndex_\" so that it points to some other valid \"_analysisGeometry\" item."
             outputGeometryIndex  = None  # set bellow the "printMsg" variable, so that it does not confront with it
-            return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+            return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
     
     
     srfCentroid = srfCentroidL[outputGeometryIndex]
@@ -290,120 +306,161 @@ def checkInputData(analysisGeometry, contextMeshes, north, scale, outputGeometry
     validInputData = True
     printMsg = "ok"
     
-    return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg
+    return srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg
 
 
-def calculateHorizonAngles(contextMeshJoined, origin, northRad, unitConversionFactor):
+def contextElevationGrid(contextMeshJoined):
     
-    originLifted = Rhino.Geometry.Point3d(origin.X, origin.Y, origin.Z + 0.01)  # fix for rays intersection, if user inputted a ground surface to "_contex" input
+    # rasterize the contextMeshJoined to an elevation grid, which is then used for all "_analysisGeometry" points
+    gridResolution = 1000  # number of grid cells along the longer side of the contextMeshJoined bounding box
+    contextBB = contextMeshJoined.GetBoundingBox(True)
+    cellSize = max(contextBB.Max.X - contextBB.Min.X, contextBB.Max.Y - contextBB.Min.Y) / gridResolution
     
-    # create skyDome
-    skyDomeRadius = 200 / unitConversionFactor  # in meters
-    skyDomeSphere = Rhino.Geometry.Sphere(originLifted, skyDomeRadius)
-    skyDomeSrf = skyDomeSphere.ToBrep().Faces[0]
+    verticesL, trianglesL = gismo_geometry.meshToArrays(contextMeshJoined)
+    elevationsLL, startX, startY, numOfRows, numOfColumns = gismo_terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+    del verticesL; del trianglesL
     
-    # small number of rays (for example: precisionU = 30, precisionV = 10) can result in rays missing the contextMeshJoined, thererfor the shadingMaskSrf will not be created
-    precisionU = 3600  # rays shot per 0.1 degrees (10th of a degree)
-    precisionV = 1200  # rays shot per 0.075 degrees - more denser than precisionU
-    #precisionU = 140
-    #precisionV = 40
-    
-    halvedSkyDomeSrf = skyDomeSrf.Trim(Rhino.Geometry.Interval(skyDomeSrf.Domain(0)[0], skyDomeSrf.Domain(0)[1]), Rhino.Geometry.Interval(0, skyDomeSrf.Domain(1)[1])) # split the skyDome sphere in half
-    halvedSkyDomeSrf.SetDomain(1, Rhino.Geometry.Interval(0, halvedSkyDomeSrf.Domain(1)[1]))  # shrink the halvedSkyDomeSrf V start domain
-    
-    clockwise = True
-    if clockwise == True:
-        # reverse the U domain (from counter-clockwise to clockwise)
-        uStart,uEnd = halvedSkyDomeSrf.Domain(0)
-        interval0 = Rhino.Geometry.Interval(-uEnd, -uStart)
-        halvedSkyDomeSrf.SetDomain(0,interval0)
-        halvedSkyDomeSrf = halvedSkyDomeSrf.Reverse(0)
-    else:
-        pass
+    return elevationsLL, startX, startY, cellSize
+
+
+def calculateHorizonAngles_elevationGrid(contextMeshJoined, originsLifted, northRad, parallel):
     
-    # rotate the halvedSkyDomeSrf by 90 degrees so that it starts at 0 degrees (+Y axis)
-    transformMatrixRotate1 = Rhino.Geometry.Transform.Rotation(math.radians(90), Rhino.Geometry.Vector3d(0,0,1), originLifted)
-    halvedSkyDomeSrf.Transform(transformMatrixRotate1)
+    # walk the elevation grid from each of the originsLifted, for each azimuth: 0,1,2,3... 358,359
+    elevationsLL, startX, startY, cellSize = contextElevationGrid(contextMeshJoined)
+    azimuthsD = range(0,360)
+    directions = gismo_terrain.azimuthDirections(azimuthsD, northRad)
+    originPts = [(originLifted.X, originLifted.Y, originLifted.Z) for originLifted in originsLifted]
     
-    # rotation due to north angle position
-    #transformMatrixRotate2 = Rhino.Geometry.Transform.Rotation(-northRad, Rhino.Geometry.Vector3d(0,0,1), originLifted)  # counter-clockwise
-    transformMatrixRotate2 = Rhino.Geometry.Transform.Rotation(northRad, Rhino.Geometry.Vector3d(0,0,1), originLifted)  # clockwise
-    halvedSkyDomeSrf.Transform(transformMatrixRotate2)
+    def sectorHorizonAngles(sectorIndex):
+        sectorDirections = directions[sectorIndex*sectorSize:(sectorIndex+1)*sectorSize]
+        return gismo_terrain.horizonAnglesMultiple(elevationsLL, startX, startY, cellSize, originPts, sectorDirections, bilinear=False)
     
-    skyDomeDomainUmin, skyDomeDomainUmax = halvedSkyDomeSrf.Domain(0)
-    skyDomeDomainVmin, skyDomeDomainVmax = halvedSkyDomeSrf.Domain(1)
-    stepU = (skyDomeDomainUmax - skyDomeDomainUmin)/precisionU
-    stepV = (skyDomeDomainVmax - skyDomeDomainVmin)/precisionV
+    numOfSectors = 36  # 10 degrees sectors
+    sectorSize = 360 // numOfSectors
+    sectorsHorizonAnglesRLL = gismo_kernels.runInParallel(sectorHorizonAngles, numOfSectors, parallel)
     
+    # merge the sectors in the order of azimuths
+    horizonAnglesRLL = [[] for originLifted in originsLifted]
+    for sectorHorizonAnglesRLL in sectorsHorizonAnglesRLL:
+        for originIndex,sectorHorizonAnglesR in enumerate(sectorHorizonAnglesRLL):
+            horizonAnglesRLL[originIndex].extend(sectorHorizonAnglesR)
     
-    # check for intersection between the contextMeshJoined and rays
-    horizonAnglesRoseMeshPts = []
-    lastRowPoints = []
-    
-    hitted = False  # initial switch
-    for i in xrange(0,precisionU):
-        u = skyDomeDomainUmin + stepU*i
-        if (i % 10 == 0):
-            horizonAnglesRoseMeshPts.append(originLifted)
-            firstRowPt = halvedSkyDomeSrf.PointAt(u,0)
-            horizonAnglesRoseMeshPts.append(firstRowPt)
-        for k in xrange(0,precisionV):
-            v = skyDomeDomainVmin + stepV*k
-            skyDomePt = halvedSkyDomeSrf.PointAt(u,v)
-            rayVector = skyDomePt-originLifted
-            ray = Rhino.Geometry.Ray3d(originLifted, rayVector)
-            rayIntersectParam = Rhino.Geometry.Intersect.Intersection.MeshRay(contextMeshJoined,ray)
-            if rayIntersectParam >= 0:
-                # ray hitted something in that column
-                hitted = True
-                lastRowPt = skyDomePt
-                continue
-            else:
-                # ray did not hit anything in that column
-                pass
-        if hitted == False:
-            lastRowPt = halvedSkyDomeSrf.PointAt(u,0)
-        lastRowPoints.append(lastRowPt)
-        hitted = False  # reset the hitted switch
+    return horizonAnglesRLL
+
+
+def calculateHorizonAngles_skyDomeRays(contextMeshJoined, originsLifted, northRad, parallel, highestHitRowSearch=False):
     
+    # small number of rays (for example: precisionU = 30, precisionV = 10) can result in rays missing the contextMeshJoined
+    if highestHitRowSearch == False:
+        precisionU = 3600  # rays shot per 0.1 degrees (10th of a degree)
+    else:
+        precisionU = 360  # rays shot per 1 degree (azimuths 0,1,2,3... 358,359)
+    precisionV = 1200  # rays shot per 0.075 degrees - more denser than precisionU
+    columnsPerAzimuth = precisionU // 360
+    
+    # directions of the rays are the same for all originsLifted: clockwise from the north, from the astronomical horizon upward
+    columnDirections = gismo_terrain.azimuthDirections([i/float(columnsPerAzimuth) for i in xrange(0,precisionU)], northRad)
+    stepV = (0.5*math.pi)/precisionV
+    rowAnglesR = [stepV*k for k in xrange(0,precisionV)]
+    
+    def sectorHorizonAngles(sectorIndex):
+        sectorHorizonAnglesRLL = [[] for originLifted in originsLifted]
+        previousHitRows = [None for originLifted in originsLifted]
+        for columnIndex in xrange(sectorIndex*sectorSize, (sectorIndex+1)*sectorSize):
+            dx,dy = columnDirections[columnIndex]
+            columnRayDirections = [Rhino.Geometry.Vector3d(dx*math.cos(rowAngleR), dy*math.cos(rowAngleR), math.sin(rowAngleR)) for rowAngleR in rowAnglesR]
+            for originIndex,originLifted in enumerate(originsLifted):
+                def rayHit(k):
+                    ray = Rhino.Geometry.Ray3d(originLifted, columnRayDirections[k])
+                    rayIntersectParam = Rhino.Geometry.Intersect.Intersection.MeshRay(contextMeshJoined, ray)
+                    return rayIntersectParam >= 0
+                if highestHitRowSearch == False:
+                    # shoot all the rays of the column, and keep the highest one which hits the contextMeshJoined
+                    hitRow = -1
+                    for k in xrange(0,precisionV):
+                        if rayHit(k):
+                            hitRow = k
+                else:
+                    # search for the highest row which hits the contextMeshJoined, starting from the one of the previous column
+                    hitRow = gismo_terrain.highestHitRow(rayHit, precisionV, previousHitRows[originIndex])
+                    previousHitRows[originIndex] = hitRow
+                if (columnIndex % columnsPerAzimuth) != 0:
+                    continue  # only take the columns of azimuths 0,1,2,3... 358,359
+                if hitRow >= 0:
+                    horizonAngleR = rowAnglesR[hitRow]
+                else:
+                    horizonAngleR = 0  # ray did not hit anything in that column
+                sectorHorizonAnglesRLL[originIndex].append(horizonAngleR)
+        return sectorHorizonAnglesRLL
+    
+    # columns are always split into the same sectors, so that the results do not depend on parallel_ input
+    numOfSectors = 36  # 10 degrees sectors
+    sectorSize = precisionU // numOfSectors
+    sectorsHorizonAnglesRLL = gismo_kernels.runInParallel(sectorHorizonAngles, numOfSectors, parallel)
+    
+    # merge the sectors in the order of azimuths
+    horizonAnglesRLL = [[] for originLifted in originsLifted]
+    for sectorHorizonAnglesRLL in sectorsHorizonAnglesRLL:
+        for originIndex,sectorHorizonAnglesR in enumerate(sectorHorizonAnglesRLL):
+            horizonAnglesRLL[originIndex].extend(sectorHorizonAnglesR)
+    
+    return horizonAnglesRLL
+
+
+def horizonAnglesOutputs(originLifted, horizonAnglesR, northRad, unitConversionFactor):
+    
+    # horizonAnglesD, horizonAnglesRoseMeshPts and horizonAnglesD_for_colors of a single point, for azimuths 0,1,2,3... 358,359
+    skyDomeRadius = 200 / unitConversionFactor  # in meters
+    azimuthsD = range(0,360)
+    directions = gismo_terrain.azimuthDirections(azimuthsD, northRad)
     
-    # calculate the horizonAngles from lastRowPoints:
-    azimuthsD = []  # depends on precisionU and precisionV
     horizonAnglesD = []
+    horizonAnglesRoseMeshPts = []
     horizonAnglesD_for_colors = []  # made of horizonAnglesD duplicates to account for the origin point of the horizonAnglesRoseMeshPts
-    for azimuth,lastRowPt in enumerate(lastRowPoints):
-        if (azimuth % 10 == 0):  # only take azimuths 0,10,20,30... 3580,3590
-            projectedLastRowPt = Rhino.Geometry.Point3d(lastRowPt.X, lastRowPt.Y, originLifted.Z)
-            tangent_horizonAngleR = (lastRowPt.Z - originLifted.Z)/originLifted.DistanceTo(projectedLastRowPt)
-            if tangent_horizonAngleR < 0.001:  # fix if horizonAngle = 0
-                tangent_horizonAngleR = 0
-            horizonAngleR = math.atan(tangent_horizonAngleR)
-            horizonAngleD = math.degrees(horizonAngleR)  # .hor files have integer values for horizon angles
-            
-            horizonAnglesD.append(int(horizonAngleD))
-            azimuthsD.append(int(azimuth/10))  # convert the azimuths from 0,10,20,30... 3580,3590 to 0,1,2,3... 358,359
-            
-            horizonAnglesD_for_colors.append(horizonAngleD)
-            horizonAnglesD_for_colors.append(horizonAngleD)
-    
+    for i,(dx,dy) in enumerate(directions):
+        horizonAnglesRoseMeshPts.append(originLifted)
+        firstRowPt = Rhino.Geometry.Point3d(originLifted.X + dx*skyDomeRadius, originLifted.Y + dy*skyDomeRadius, originLifted.Z)
+        horizonAnglesRoseMeshPts.append(firstRowPt)
+        
+        horizonAngleR = horizonAnglesR[i]
+        if math.tan(horizonAngleR) < 0.001:  # fix if horizonAngle = 0
+            horizonAngleR = 0
+        horizonAngleD = math.degrees(horizonAngleR)  # .hor files have integer values for horizon angles
+        
+        horizonAnglesD.append(int(horizonAngleD))
+        horizonAnglesD_for_colors.append(horizonAngleD)
+        horizonAnglesD_for_colors.append(horizonAngleD)
     
     # possible future creation of contextShadingMask (more precisely contextShadingMaskUnscaledUnrotated), the same as from "Terrain shading mask" component by its code starting from "    if maskStyle == 0:  # spherical terrain shading mask" (line ?)
     contextShadingMaskUnscaledUnrotated = None
     
-    return azimuthsD, horizonAnglesD, originLifted, horizonAnglesRoseMeshPts, horizonAnglesD_for_colors, contextShadingMaskUnscaledUnrotated
+    return azimuthsD, horizonAnglesD, horizonAnglesRoseMeshPts, horizonAnglesD_for_colors, contextShadingMaskUnscaledUnrotated
 
 
-def main(contextMeshJoined, srfCentroidL, northRad, outputGeometryIndex, unitConversionFactor):
+def main(contextMeshJoined, srfCentroidL, northRad, outputGeometryIndex, horizonEngine, parallel, unitConversionFactor):
     
     azimuthsD_dataTree = Grasshopper.DataTree[object]()
     horizonAnglesD_dataTree = Grasshopper.DataTree[object]()
     maximalAzimuthD_dataTree = Grasshopper.DataTree[object]()
     maximalHorizonAngleD_dataTree = Grasshopper.DataTree[object]()
     
+    # calculate horizon angles for all the points at once, so that the context elevation grid (or the joined context mesh and ray directions) are created only once
+    time1 = time.time()
+    originsLifted = [Rhino.Geometry.Point3d(srfCentroid.X, srfCentroid.Y, srfCentroid.Z + 0.01) for srfCentroid in srfCentroidL if srfCentroid != None]  # fix for rays intersection, if user inputted a ground surface to "_contex" input
+    if horizonEngine == 0:
+        horizonAnglesRLL = calculateHorizonAngles_elevationGrid(contextMeshJoined, originsLifted, northRad, parallel)
+    elif horizonEngine == 1:
+        horizonAnglesRLL = calculateHorizonAngles_skyDomeRays(contextMeshJoined, originsLifted, northRad, parallel)
+    elif horizonEngine == 2:
+        horizonAnglesRLL = calculateHorizonAngles_skyDomeRays(contextMeshJoined, originsLifted, northRad, parallel, highestHitRowSearch=True)
+    print "Horizon angles calculated for %s points in %0.2f seconds" % (len(originsLifted), time.time()-time1)
+    
     paths = _analysisGeometry.Paths
+    originIndex = 0
     for index,srfCentroid in enumerate(srfCentroidL):
         if srfCentroid != None:  # the inputted _analysisGeometry is not a point nor a single faced brep
-            azimuthsD, horizonAnglesD, originLifted, horizonAnglesRoseMeshPts_notPicked, horizonAnglesD_for_colors_notPicked, contextShadingMaskUnscaledUnrotated_notPicked = calculateHorizonAngles(contextMeshJoined, srfCentroid, northRad, unitConversionFactor)
+            azimuthsD, horizonAnglesD, horizonAnglesRoseMeshPts_notPicked, horizonAnglesD_for_colors_notPicked, contextShadingMaskUnscaledUnrotated_notPicked = horizonAnglesOutputs(originsLifted[originIndex], horizonAnglesRLL[originIndex], northRad, unitConversionFactor)
+            originIndex += 1
             
            # maximualHorizonAngle, maximalAzimuth
             maximalHorizonAngle_maximalAzimuth = []
@@ -583,7 +640,7 @@ def bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, srfCentr
     groupIndex2 = gismo_preparation.groupGeometry(layerName + "_legend", geometryIds2)
 
 
-def printOutput(north, latitude, longitude, locationName, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType):
+def printOutput(north, latitude, longitude, locationName, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonEngine):
     
     resultsCompletedMsg = "Horizon angles component results successfully completed!"
     printOutputMsg = \
@@ -599,7 +656,8 @@ Scale: %s
 Output geometry index: %s
 Working folder: %s
 Horizon file type: %s
-    """ % (locationName, latitude, longitude, north, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType)
+Horizon engine: %s
+    """ % (locationName, latitude, longitude, north, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonEngine)
     print resultsCompletedMsg
     print printOutputMsg
 
@@ -610,19 +668,21 @@ if sc.sticky.has_key("gismoGismo_released"):
     if validVersionDate:
         gismo_mainComponent = sc.sticky["gismo_mainComponent"]()
         gismo_preparation = sc.sticky["gismo_Preparation"]()
+        gismo_kernels = sc.sticky["gismo_kernels"]
         gismo_geometry = sc.sticky["gismo_CreateGeometry"]()
+        gismo_terrain = sc.sticky["gismo_Terrain"]()
         
         locationName, locationLatitudeD, locationLongitudeD, timeZone, elevation, validLocationData, printMsg = gismo_preparation.checkLocationData(_location)
         if validLocationData:
-            srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, unitConversionFactor, validInputData, printMsg = checkInputData(_analysisGeometry, _context, north_, scale_, outputGeometryIndex_, workingFolder_, horizonFileType_)
+            srfCornerPtsLL, srfCentroidL, srfCentroid, contextMeshJoined, northRad, northVec, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, horizonEngine, unitConversionFactor, validInputData, printMsg = checkInputData(_analysisGeometry, _context, north_, scale_, outputGeometryIndex_, workingFolder_, horizonFileType_, horizonEngine_)
             if validInputData:
                 if _runIt:
-                    azimuthsD, horizonAnglesD, azimuthsD_for_horizonFile, horizonAnglesD_for_horizonFile, maximalAzimuthD, maximalHorizonAngleD, maximalAzimuthD_for_title, maximalHorizonAngleD_for_title, horizonAnglesRoseMeshPts, horizonAnglesD_for_colors, contextShadingMaskUnscaledUnrotated = main(contextMeshJoined, srfCentroidL, northRad, outputGeometryIndex, unitConversionFactor)
+                    azimuthsD, horizonAnglesD, azimuthsD_for_horizonFile, horizonAnglesD_for_horizonFile, maximalAzimuthD, maximalHorizonAngleD, maximalAzimuthD_for_title, maximalHorizonAngleD_for_title, horizonAnglesRoseMeshPts, horizonAnglesD_for_colors, contextShadingMaskUnscaledUnrotated = main(contextMeshJoined, srfCentroidL, northRad, outputGeometryIndex, horizonEngine, parallel_, unitConversionFactor)
                     horizonAnglesRoseMeshUnscaledUnrotated, compassCrvsUnscaledUnrotated, titleDescriptionLabelMeshesUnscaledUnrotated, legendUnscaledUnrotated, legendBasePtUnscaledUnrotated = compassCrvs_legend(srfCentroid, horizonAnglesRoseMeshPts, horizonAnglesD_for_colors, maximalAzimuthD_for_title, maximalHorizonAngleD_for_title, unitConversionFactor, legendBakePar_)
                     contextShadingMask, horizonAnglesRoseMesh, compassCrvs, legend, legendPlane, titleDescriptionLabelMeshes = scalingRotating(northRad, scale, srfCentroid, contextShadingMaskUnscaledUnrotated, horizonAnglesRoseMeshUnscaledUnrotated, compassCrvsUnscaledUnrotated, legendUnscaledUnrotated, legendBasePtUnscaledUnrotated, titleDescriptionLabelMeshesUnscaledUnrotated)
                     if exportHorizon_: createHorFile(locationLatitudeD, locationLongitudeD, locationName, workingSubFolderPath, horizonFileType, horizonFileTypeLabel, azimuthsD_for_horizonFile, horizonAnglesD_for_horizonFile)
                     if bakeIt_: bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, srfCentroid, contextShadingMask, horizonAnglesRoseMesh, maximalHorizonAngleD_for_title, compassCrvs, legend, titleDescriptionLabelMeshes)
-                    printOutput(north_, locationLatitudeD, locationLongitudeD, locationName, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType)
+                    printOutput(north_, locationLatitudeD, locationLongitudeD, locationName, scale, outputGeometryIndex, workingSubFolderPath, horizonFileType, horizonEngine)
                     azimuths = azimuthsD; horizonAngles = horizonAnglesD; horizonAnglesRose = horizonAnglesRoseMesh; maximalHorizonAngle = maximalHorizonAngleD; maximalAzimuth = maximalAzimuthD; originPt = srfCentroid; title = titleDescriptionLabelMeshes; 
                 else:
                     print "All inputs are ok. Please set \"_runIt\" to True, in order to run the Horizon angles component"
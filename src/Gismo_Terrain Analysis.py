@@ -28,10 +28,14 @@ Use this component to perform the following terrain analysis types:
 - SRF (Surface Roughness Factor by Hobson)
 - TPI (Topographic Position Index)
 - Mean curvature
+- Sky view factor
+- Cumulative visibility
 ------
 Component mainly based on:
 
 "DEM Surface Tools for ArcGIS", Jenness Enterprises, 2013.
+"Fast horizon computation at all points of a terrain with visibility and shading applications", A. J. Stewart, IEEE Transactions on Visualization and Computer Graphics, 1998
+"Higher isn't necessarily better: visibility algorithms and experiments", W. R. Franklin, C. Ray, Advances in GIS Research: Sixth International Symposium on Spatial Data Handling, 1994
 "How Hillshade works" article from Esri Developer Network
 "How to calculate Topographic Ruggedness Index in ArcGIS Desktop" article from gis.stackexchange.com
 "Terrain Roughness – 13 Ways" article from gis4geomorphology.com
@@ -58,6 +62,11 @@ Provided by Gismo 0.0.3
                        8 - SRF (Surface Roughness Factor by Hobson)
                        9 - TPI (Topographic Position Index)
                        10 - Mean curvature
+                       11 - Sky view factor
+                       12 - Cumulative visibility
+                       -
+                       Slope, Grade, Aspect and Hillshade are calculated together in a single pass (and so are TRI, TRI categories, SRF and TPI). The results are kept until the "_terrain", "context_" or "refine_" inputs change.
+                       So switching between already calculated analysis types only recolors the "analysedTerrain" mesh, without analysing the terrain again.
         _terrain: A terrain surface or polysurface.
                   Add it by supplying the "terrain" output from the Ladybug "Terrain Generator" or Gismo "Terrain Generator" components.
                   -
@@ -93,6 +102,56 @@ Provided by Gismo 0.0.3
                         This input is only used for _analysisType = 5 (Hillshade).
                         -
                         If not supplied, default hypsoStrength of 50 will be used.
+        horizonSectors_: Number of azimuth sectors (equally spaced, starting from the north_) in which the horizon angles of each terrain cell are calculated.
+                         Horizon angles of all cells are calculated at once by sweeping the terrain grid along each sector direction. Sky view factor is then derived from them.
+                         -
+                         This input is only used for _analysisType = 11 (Sky view factor).
+                         -
+                         If not supplied, default value of 16 sectors will be used.
+        observers_: Observer points (for example: points along a planned road, or building windows) from which the visibility of the terrain is analysed.
+                    Observer points are used as they are (they are not lifted for the height of the human eyesight, as the "_origin" is for _analysisType = 4).
+                    -
+                    Viewsheds of all observers are calculated on the same terrain grid, on all processor cores.
+                    -
+                    This input is only used (and it is required) for _analysisType = 12 (Cumulative visibility).
+        windowRadius_: Radius of the square window of surrounding terrain vertices, from which the TRI, TRI categories, SRF and TPI are calculated.
+                       Window statistics are calculated from summed-area tables, so even large windows (for multi-scale landform analysis) do not increase the component runtime.
+                       -
+                       This input is only used for _analysisType = 6, 7, 8, 9.
+                       -
+                       If not supplied, 3x3 cells window will be used (1 surrounding vertex in each direction).
+                       -
+                       In meters.
+        innerRadius_: Radius of the inner square window, whose terrain vertices are excluded from the windowRadius_ window. This turns the window into an annulus (ring) of surrounding terrain vertices.
+                      Annulus statistics are calculated from the same summed-area tables (as the difference between the windowRadius_ and innerRadius_ windows). The minimal and maximal elevations used for the TPI are still taken from the whole windowRadius_ window.
+                      -
+                      This input is only used for _analysisType = 6, 7, 8, 9.
+                      -
+                      It needs to be smaller than windowRadius_. Supply 0 to exclude only the central vertex itself.
+                      If not supplied, the whole window (including the central vertex) will be used.
+                      -
+                      In meters.
+        observerHeight_: Height of the observer's eyes above the terrain at the "_origin".
+                         -
+                         This input is only used for _analysisType = 4 (Visibility).
+                         -
+                         If not supplied, 1.6 meters (5.25 feet, the average height of the human eyesight) will be used.
+                         -
+                         In meters.
+        targetHeight_: Height above the terrain at which each terrain mesh vertex is checked for visibility. For example: supply 1.6 to find out from where the observer's head could be seen.
+                       -
+                       This input is only used for _analysisType = 4, 12 (Visibility, Cumulative visibility).
+                       -
+                       If not supplied, 0.01 meters will be used.
+                       -
+                       In meters.
+        maxDistance_: Maximal distance from the observer (the "_origin", or each of the "observers_") at which the terrain can still be seen. Terrain mesh vertices further away are not visible.
+                      -
+                      This input is only used for _analysisType = 4, 12 (Visibility, Cumulative visibility).
+                      -
+                      If not supplied, the whole terrain will be analysed.
+                      -
+                      In meters.
         refine_: Refines the "analysedTerrain" output's mesh to finer resolution (halves the Maximum edge length of the "analysedTerrain" mesh).
                  -
                  Final "analysedTerrain" output is created with a certain mesh resolution.
@@ -128,6 +187,7 @@ ghenv.Component.IconDisplayMode = ghenv.Component.IconDisplayMode.application
 ghenv.Component.Category = "Gismo"
 ghenv.Component.SubCategory = "2 | Terrain"
 #compatibleGismoVersion = VER 0.0.3\nJAN_29_2019
+#requiresGismoKernels
 try: ghenv.Component.AdditionalHelpFromDocStrings = "2"
 except: pass
 
@@ -142,14 +202,14 @@ import math
 import gc
 
 
-def checkInputData(analysisType, terrainId, originPt, originPtElevation, north, sunVector, hypsometricStrength, refine):
+def checkInputData(analysisType, terrainId, originPt, originPtElevation, north, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM, refine):
     
     # check inputs
-    if (analysisType == None) or ((analysisType  < 0) or (analysisType  > 10)):
-        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+    if (analysisType == None) or ((analysisType  < 0) or (analysisType  > 12)):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
         validInputData = False
-        printMsg = "Please supply a number from 0 to 10 to the \"_analysisGeometry\" input based on the analysis you would like to perform."
-        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+        printMsg = "Please supply a number from 0 to 12 to the \"_analysisGeometry\" input based on the analysis you would like to perform."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
     if (analysisType == 0):
         analysisTypeLabel = "Slope"
     elif (analysisType == 1):
@@ -172,16 +232,20 @@ def checkInputData(analysisType, terrainId, originPt, originPtElevation, north,
         analysisTypeLabel = "Topographic Position Index"
     elif (analysisType == 10):
         analysisTypeLabel = "Mean curvature"
+    elif (analysisType == 11):
+        analysisTypeLabel = "Sky view factor"
+    elif (analysisType == 12):
+        analysisTypeLabel = "Cumulative visibility"
     
     
     if (terrainId == None):
-        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
         validInputData = False
         printMsg = "Please supply the \"terrain\" output data from the Gismo \"Terrain Generator\" component, to this component's \"_terrain\" input.\n" + \
                    "It needs to be a surface/polysurface: set the:\n" + \
                    "\"type_\" input of the Ladybug \"Terrain Generator\" component to \"1\", or\n" + \
                    "\"type_\" input of the Gismo \"Terrain Generator\" component to \"2\" or \"3\"."
-        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
     else:
         terrainObj = rs.coercegeometry(terrainId)
         if isinstance(terrainObj, Rhino.Geometry.Brep):
@@ -189,28 +253,28 @@ def checkInputData(analysisType, terrainId, originPt, originPtElevation, north,
             pass
         else:
             #isinstance(terrainObj, Rhino.Geometry.Mesh) or any other geometry type
-            analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+            analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
             validInputData = False
             printMsg = "The data you supplied to the \"_terrain\" input is not a surface nor a polysurface.\n" + \
                        "Please supply the \"terrain\" output data from the Ladybug \"Terrain Generator\" or Gismo \"Terrain Generator\" component, to this component's \"_terrain\" input.\n" + \
                        "It needs to be a surface/polysurface: set the:\n" + \
                        "\"type_\" input of the Ladybug \"Terrain Generator\" component to \"1\", or\n" + \
                        "\"type_\" input of the Gismo \"Terrain Generator\" component to \"2\" or \"3\"."
-            return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+            return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
     
     
     if (originPt == None):
-        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
         validInputData = False
         printMsg = "Please supply the \"origin\" output data from Ladybug \"Terrain Generator\" or Gismo \"Terrain Generator\" component, to this component's \"_origin\" input.."
-        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
     
     
     if (originPtElevation == None):
-        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
         validInputData = False
         printMsg = "Please supply the \"elevation\" output data from Ladybug \"Terrain Generator\" or Gismo \"Terrain Generator\" component, to this component's \"_elevation\" input.."
-        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
     
     
     if (north == None):
@@ -220,10 +284,10 @@ def checkInputData(analysisType, terrainId, originPt, originPtElevation, north,
         try:  # check if it's a number
             north = float(north)
             if north < 0 or north > 360:
-                analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+                analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
                 validInputData = False
                 printMsg = "Please input north_ angle value from 0 to 360."
-                return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+                return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
         except Exception, e:  # check if it's a vector
             north.Unitize()
         
@@ -244,6 +308,44 @@ def checkInputData(analysisType, terrainId, originPt, originPtElevation, north,
     if (hypsometricStrength == None):
         hypsometricStrength = 50  # default
     
+    if (numOfSectors == None):
+        numOfSectors = 16  # default
+    elif (numOfSectors < 4):
+        numOfSectors = 4
+        print "horizonSectors_ input only supports values equal or larger than 4.\n" + \
+              "horizonSectors_ input set to 4."
+    numOfSectors = int(numOfSectors)
+    
+    if (windowRadiusM != None) and (windowRadiusM <= 0):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        validInputData = False
+        printMsg = "windowRadius_ input only supports values larger than 0."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    
+    if (innerRadiusM != None) and ((innerRadiusM < 0) or ((windowRadiusM != None) and (innerRadiusM >= windowRadiusM))):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        validInputData = False
+        printMsg = "innerRadius_ input only supports values equal or larger than 0, and smaller than windowRadius_."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    
+    if ((observerHeightM != None) and (observerHeightM < 0)) or ((targetHeightM != None) and (targetHeightM < 0)):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        validInputData = False
+        printMsg = "observerHeight_ and targetHeight_ inputs only support values equal or larger than 0."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    
+    if (maxDistanceM != None) and (maxDistanceM <= 0):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        validInputData = False
+        printMsg = "maxDistance_ input only supports values larger than 0."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    
+    if (analysisType == 12) and (len(observers) == 0):
+        analysisType = analysisTypeLabel = originPt = originPtElevation = northRad = northD = sunVector = hypsometricStrength = numOfSectors = refine = exportValues = unitSystem = unitConversionFactor = legendUnit = None
+        validInputData = False
+        printMsg = "Please supply at least one point to the \"observers_\" input, for _analysisType = 12 (Cumulative visibility)."
+        return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    
     if (refine == None):
         refine = False  # default
     
@@ -270,15 +372,17 @@ def checkInputData(analysisType, terrainId, originPt, originPtElevation, north,
         legendUnit = "HSH"
     elif (analysisType == 7):
         legendUnit = "TRI category"
-    elif (analysisType == 8):
+    elif (analysisType == 8) or (analysisType == 11):
         legendUnit = "unitless‎"
     elif (analysisType == 10):
         legendUnit = "1/%s" % unitSystem
+    elif (analysisType == 12):
+        legendUnit = "observers"
     
     validInputData = True
     printMsg = "ok"
     
-    return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
+    return analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg
 
 
 def createOutputDescriptions(analysisType, unitSystem):
@@ -333,7 +437,7 @@ def createOutputDescriptions(analysisType, unitSystem):
         
         "Terrain Visibility values.\n" + \
         "Each value represents the distance between the lifted _origin and each terrain mesh vertex.\n" + \
-        "_origin is always lifted for 1.6 meters (5.25 feet) to depict the average height of the human eyesight.\n" + \
+        "_origin is lifted for observerHeight_ (by default 1.6 meters (5.25 feet), to depict the average height of the human eyesight).\n" + \
         "If mesh vertex is not visible from the _origin (these are gray colored areas), then the distance will be: 0.\n" + \
         "-\n" + \
         "In %s." % unitSystem]  #values
@@ -393,7 +497,7 @@ def createOutputDescriptions(analysisType, unitSystem):
         "TPI is another index used to depict terrain ruggedness.",  #analysedTerrain
         
         "Topographic Position Index (TPI) values.\n" + \
-        "Each value represents the difference between vertex elevation and mean elevation of its surrounding 8 vertices in 3x3 cells (vertex) window.\n" + \
+        "Each value represents the difference between vertex elevation and mean elevation of its surrounding vertices in windowRadius_ window (3x3 cells (vertex) window by default), or in the annulus between innerRadius_ and windowRadius_.\n" + \
         "-\n" + \
         "In %s." % unitSystem]  #values
         
@@ -407,6 +511,27 @@ def createOutputDescriptions(analysisType, unitSystem):
         "Each value represents mean curvature value at each terrain mesh vertex.\n" + \
         "-\n" + \
         "In 1/%s." % unitSystem]  #values
+        
+        ,
+        
+        ["Terrain Sky view factor analysis mesh.\n" + \
+        "Sky view factor is the portion of the sky visible from the terrain. It depicts valleys and other areas obstructed by the surrounding terrain and context_.",  #analysedTerrain
+        
+        "Terrain Sky view factor values.\n" + \
+        "Each value represents the sky view factor of a horizontal surface at each terrain mesh vertex, calculated from the horizon angles of the horizonSectors_.\n" + \
+        "It ranges from 0 to 1 (1 being an unobstructed sky).\n" + \
+        "-\n" + \
+        "Unitless."]  #values
+        
+        ,
+        
+        ["Terrain Cumulative visibility analysis mesh.",  #analysedTerrain
+        
+        "Terrain Cumulative visibility values.\n" + \
+        "Each value represents the number of observers_ from which each terrain mesh vertex is visible.\n" + \
+        "It ranges from 0 to the number of observers_.\n" + \
+        "-\n" + \
+        "Number of observers."]  #values
         ]
         
         chosenOutputDescription = outputDescriptions[analysisType]
@@ -430,7 +555,125 @@ def correctSrfAzimuthDforNorth(northRad, srfAzimuthD):
     return correctedSrfAzimuthD
 
 
-def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevation, contextIdL, northRad, sunVector, hypsometricStrength, refine, exportValues, unitConversionFactor):
+def geometryChecksum(obj):
+    # checksum of the geometry content: mesh vertices and faces, or control points of the brep faces and edges. The ids of the _terrain and context_ objects are not used, as they change on each solution
+    if type(obj) == Rhino.Geometry.Mesh:
+        coordinatesL = [(vertex.X, vertex.Y, vertex.Z) for vertex in obj.Vertices]
+        coordinatesL.extend([(face.A, face.B, face.C, face.D) for face in obj.Faces])
+    elif type(obj) == Rhino.Geometry.Brep:
+        coordinatesL = []
+        for face in obj.Faces:
+            for controlPt in face.UnderlyingSurface().ToNurbsSurface().Points:
+                coordinatesL.append((controlPt.Location.X, controlPt.Location.Y, controlPt.Location.Z, controlPt.Weight))
+        for edge in obj.Edges:
+            for controlPt in edge.ToNurbsCurve().Points:
+                coordinatesL.append((controlPt.Location.X, controlPt.Location.Y, controlPt.Location.Z, controlPt.Weight))
+    else:
+        return None
+    
+    return (type(obj).__name__, len(coordinatesL), hash(tuple(coordinatesL)))
+
+
+def terrainAnalysisGeometryKey(terrainId, contextIdL, refine):
+    # _terrain and context_ objects are identified by the checksums of their geometry, so the analysis is repeated if any of them has been modified
+    geometryKey = [refine]
+    for objId in [terrainId] + list(contextIdL):
+        obj = rs.coercegeometry(objId)
+        geometryKey.append(geometryChecksum(obj))
+    
+    return tuple(geometryKey)
+
+
+def releaseAnalysisResults(stickyKey):
+    # remove the analysis results (analysed meshes) of this component from sc.sticky, once the component is deleted from the Grasshopper document
+    ghDocument = ghenv.Component.OnPingDocument()
+    if (ghDocument == None) or sc.sticky.has_key(stickyKey + "_releaseHandler"):
+        return
+    componentGuid = ghenv.Component.InstanceGuid
+    def objectsDeleted(sender, e):
+        for deletedObj in e.Objects:
+            if deletedObj.InstanceGuid == componentGuid:
+                if sc.sticky.has_key(stickyKey): del sc.sticky[stickyKey]
+                del sc.sticky[stickyKey + "_releaseHandler"]
+                sender.ObjectsDeleted -= objectsDeleted
+                break
+    ghDocument.ObjectsDeleted += objectsDeleted
+    sc.sticky[stickyKey + "_releaseHandler"] = objectsDeleted
+
+
+def analysisResultKey(analysisType, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM):
+    # inputs (other than _terrain, context_ and refine_) which the values of each analysis type depend on
+    if (analysisType == 2):
+        return (analysisType, northRad)
+    elif (analysisType == 3):
+        return (analysisType, originPt.Z, originPtElevation)
+    elif (analysisType == 4):
+        return (analysisType, originPt.X, originPt.Y, originPt.Z, observerHeightM, targetHeightM, maxDistanceM)
+    elif (analysisType == 5):
+        return (analysisType, northRad, sunVector.X, sunVector.Y, sunVector.Z, hypsometricStrength)
+    elif (analysisType == 6) or (analysisType == 7) or (analysisType == 8) or (analysisType == 9):
+        return (analysisType, windowRadiusM, innerRadiusM)
+    elif (analysisType == 11):
+        return (analysisType, northRad, numOfSectors)
+    elif (analysisType == 12):
+        return (analysisType, targetHeightM, maxDistanceM) + tuple([(pt.X, pt.Y, pt.Z) for pt in observers])
+    else:
+        return (analysisType,)
+
+
+def viewshedTargetHeightMaxDistance(targetHeightM, maxDistanceM, unitConversionFactor):
+    # targetHeight_ and maxDistance_ inputs (in meters) converted to Rhino document units, for _analysisType = 4 and 12
+    if targetHeightM == None:
+        targetHeightM = 0.01  # default, lift each mesh vertex
+    targetHeight = targetHeightM / unitConversionFactor
+    if maxDistanceM == None:
+        maxDistance = None  # default, no limit
+    else:
+        maxDistance = maxDistanceM / unitConversionFactor
+    
+    return targetHeight, maxDistance
+
+
+def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevation, contextIdL, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM, refine, exportValues, unitConversionFactor):
+    
+    # analysis results are kept for the last _terrain, context_ and refine_ inputs. Switching between the analysis types (or changing the legendBakePar_) then only recolors the already analysed mesh
+    # each Terrain Analysis component keeps its own results, so that two components with different _terrain inputs do not overwrite each other's results
+    stickyKey = "gismo_terrainAnalysisResults_" + str(ghenv.Component.InstanceGuid)
+    geometryKey = terrainAnalysisGeometryKey(terrainId, contextIdL, refine)
+    if sc.sticky.has_key(stickyKey) and (sc.sticky[stickyKey]["geometryKey"] == geometryKey):
+        analysisResults = sc.sticky[stickyKey]
+    else:
+        # the results of the previous inputs are released
+        analysisResults = {"geometryKey": geometryKey}
+        sc.sticky[stickyKey] = analysisResults
+        releaseAnalysisResults(stickyKey)
+    
+    resultKey = analysisResultKey(analysisType, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)
+    if not analysisResults.has_key(resultKey):
+        analyseTerrain(analysisType, terrainId, originPt, originPtElevation, contextIdL, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM, refine, unitConversionFactor, analysisResults)
+    analysedMesh, values, legendValues, visibleVertexIndices = analysisResults[resultKey]
+    
+    # deconstruct legendBakePar_
+    legendStyle, legendPlane, maxValue, minValue, customColors, numLegendCells, fontName, fontSize, numDecimals, legendUnit, customTitle, scale, layerName, layerColor, layerCategoryName = gismo_preparation.read_legendBakePar(legendBakePar_)
+    
+    if visibleVertexIndices == None:
+        colors = gismo_preparation.numberToColor(values, customColors, minValue, maxValue)
+    else:
+        # visibility: vertices which can not be seen are gray
+        colors = [System.Drawing.Color.FromArgb(70,70,70)]*len(values)
+        colors_notHitted = gismo_preparation.numberToColor(legendValues, customColors, minValue, maxValue)
+        for dummyIndex, notHittedVertexIndex in enumerate(visibleVertexIndices):
+            colors[notHittedVertexIndex] = colors_notHitted[dummyIndex]
+    
+    terrainMesh = analysedMesh.DuplicateMesh()  # the analysedMesh is kept uncolored in analysisResults
+    gismo_geometry.colorMeshVertices(terrainMesh, colors)
+    
+    return terrainMesh, values, legendValues
+
+
+def analyseTerrain(analysisType, terrainId, originPt, originPtElevation, contextIdL, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM, refine, unitConversionFactor, analysisResults):
+    # analyse the terrain for the analysisType, and add the (analysedMesh, values, legendValues, visibleVertexIndices) to analysisResults
+    # analysis types which share the same neighborhood window (slope, grade, aspect, hillshade and TRI, TRI categories, SRF, TPI) are all calculated in a single pass
     
     terrainBrep = rs.coercegeometry(terrainId)
     # shrink the upper terrain brepface in case it is not shrinked (for example: the terrain surface inputted to _terrain input is not created by Gismo "Terrain Generator" component)
@@ -461,6 +704,34 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
     
     terrainMesh = Rhino.Geometry.Mesh.CreateFromBrep(terrainBrep, meshParam)[0]
     
+    # for analysisType 0, 1, 2, 4, 5, 11 and 12: cell size of the elevation grid
+    cellSize = distanceBetweenFirstSecondControlPt
+    if refine:
+        cellSize = cellSize / 2
+    
+    if (analysisType == 0) or (analysisType == 1) or (analysisType == 2) or (analysisType == 5):
+        # rasterize the terrainMesh (without context_) to an elevation grid, and calculate the elevation gradients of all its cells at once
+        verticesL, trianglesL = gismo_geometry.meshToArrays(terrainMesh)
+        elevationsLL, startX, startY, numOfGridRows, numOfGridColumns = gismo_terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+        dzdxLL, dzdyLL = gismo_terrain.gradientsGrid(elevationsLL, cellSize)
+        del verticesL; del trianglesL; del elevationsLL
+    
+    def vertexSlopeAndDirection(vertex):
+        # slope angle (in radians) and slope direction (in degrees) at a mesh vertex, from the gradients interpolated between the grid cells
+        columnF = (vertex.X-startX)/cellSize
+        rowF = (startY-vertex.Y)/cellSize
+        dzdx = gismo_terrain.elevationAt(dzdxLL, columnF, rowF)
+        dzdy = gismo_terrain.elevationAt(dzdyLL, columnF, rowF)
+        if (dzdx == None) or (dzdy == None):
+            # vertex outside of the elevation grid (for example: of the context_). Use the normal of the terrain surface instead
+            success, u, v = terrainSrf.ClosestPoint(vertex)
+            surfaceNormal = terrainSrf.NormalAt(u,v)
+            normalX, normalY, normalZ = (surfaceNormal.X, surfaceNormal.Y, surfaceNormal.Z) if (surfaceNormal.Z >= 0) else (-surfaceNormal.X, -surfaceNormal.Y, -surfaceNormal.Z)
+            normalZ = max(normalZ, 0.001)  # fix for vertical surfaces
+            dzdx = -normalX/normalZ
+            dzdy = -normalY/normalZ
+        return gismo_terrain.slopeAndDirection(dzdx, dzdy)
+    
     
     # add "context_" to "terrainMesh" unless in casses of TRI, TRI categories, SRF, TPI because they use the surface terrain instead of mesh terrain to analyse the terrain
     if (analysisType != 6) or (analysisType != 7) or (analysisType != 8) or (analysisType != 9):
@@ -479,77 +750,65 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
     terrainMesh_vertices = list(terrainMesh.Vertices)
     
     
-    # deconstruct legendBakePar_
-    legendStyle, legendPlane, maxValue, minValue, customColors, numLegendCells, fontName, fontSize, numDecimals, legendUnit, customTitle, scale, layerName, layerColor, layerCategoryName = gismo_preparation.read_legendBakePar(legendBakePar_)
-    
     originPtZ = originPt.Z
     # for _analysisStyle == 3,6,7 (not needed for 5)
     def calculateVertexElevation(vertexZ):
         vertexElevation = (vertexZ-originPtZ)+originPtElevation
         return vertexElevation
     
-    if (analysisType == 0):
-        # slope
+    if (analysisType == 0) or (analysisType == 1) or (analysisType == 2) or (analysisType == 5):
+        # slope, grade, aspect (slope direction) and hillshade, from the same slope angle and slope direction of each vertex
+        # hillshade based on: http://edndoc.esri.com/arcobjects/9.2/net/shared/geoprocessing/spatial_analyst_tools/how_hillshade_works.htm
+        # http://www.jennessent.com/downloads/DEM%20Surface%20Tools%20for%20ArcGIS_A4.pdf
+        
+        # deconstruct sunVector to sunAltitudeR, sunZenithR, sunAzimuthR
+        projectedSunvector = Rhino.Geometry.Vector3d(sunVector.X, sunVector.Y, 0)
+        sunAltitudeR = Rhino.Geometry.Vector3d.VectorAngle(sunVector, projectedSunvector)
+        sunZenithR = (math.pi/2) - sunAltitudeR
+        
+        Yaxis = Rhino.Geometry.Vector3d(0,1,0)
+        # clockwise
+        sunAzimuthR = Rhino.Geometry.Vector3d.VectorAngle(projectedSunvector, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,1)))
+        # counter clockwise
+        #sunAzimuthR = Rhino.Geometry.Vector3d.VectorAngle(projectedSunvector, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,-1)))
+        
+        # for shadingFactor
+        # (there is no need to use "calculateVertexElevation" function because the ratio between vertices actual elevations and their Rhino Z coordinates is the same)
+        vertexZ = [vertex.Z  for vertex in terrainMesh_vertices]
+        vertexZmin = min(vertexZ)
+        vertexZmax = max(vertexZ)
+        hypsometricStrength2 = -hypsometricStrength
+        
         slopeAngles = []
-        for vertex in terrainMesh_vertices:
-            success, u, v = terrainSrf.ClosestPoint(vertex)
-            surfaceNormal = terrainSrf.NormalAt(u,v)
-            # check if slopeAngleD = 0
-            vectorsParallel = Rhino.Geometry.Vector3d.IsParallelTo(surfaceNormal, Rhino.Geometry.Vector3d(0,0,1), 0.01)
-            if vectorsParallel == 1:  # surfaceNormal and Rhino.Geometry.Vector3d(0,0,1) are parallel
-                slopeAngleD = 0
-            else:
-                projectedSurfaceNormal = Rhino.Geometry.Vector3d(surfaceNormal.X, surfaceNormal.Y, 0)
-                surfaceNormal_projectedSurfaceNormal_AngleR = Rhino.Geometry.Vector3d.VectorAngle(surfaceNormal, projectedSurfaceNormal)
-                if surfaceNormal_projectedSurfaceNormal_AngleR < 0.001: surfaceNormal_projectedSurfaceNormal_AngleR = 0
-                slopeAngleR = math.radians(90) - surfaceNormal_projectedSurfaceNormal_AngleR
-                slopeAngleD = math.degrees(slopeAngleR)  # in degrees
-            slopeAngles.append(slopeAngleD)
-        colors = gismo_preparation.numberToColor(slopeAngles, customColors, minValue, maxValue)
-    
-    
-    elif (analysisType == 1):
-        # grade
         gradePercents = []
-        for vertex in terrainMesh_vertices:
-            success, u, v = terrainSrf.ClosestPoint(vertex)
-            surfaceNormal = terrainSrf.NormalAt(u,v)
-            # check if slopeAngleD = 0
-            vectorsParallel = Rhino.Geometry.Vector3d.IsParallelTo(surfaceNormal, Rhino.Geometry.Vector3d(0,0,1), 0.01)
-            if vectorsParallel == 1:  # surfaceNormal and Rhino.Geometry.Vector3d(0,0,1) are parallel
-                gradePercent = 0
-            else:
-                projectedSurfaceNormal = Rhino.Geometry.Vector3d(surfaceNormal.X, surfaceNormal.Y, 0)
-                surfaceNormal_projectedSurfaceNormal_AngleR = Rhino.Geometry.Vector3d.VectorAngle(surfaceNormal, projectedSurfaceNormal)
-                if surfaceNormal_projectedSurfaceNormal_AngleR < 0.001: surfaceNormal_projectedSurfaceNormal_AngleR = 0
-                slopeAngleR = math.radians(90) - surfaceNormal_projectedSurfaceNormal_AngleR
-                gradePercent = math.tan(slopeAngleR)*100  # in percent
-            gradePercents.append(gradePercent)
-        colors = gismo_preparation.numberToColor(gradePercents, customColors, minValue, maxValue)
-    
-    
-    elif (analysisType == 2):
-        # aspect (slope direction)
-        Yaxis = Rhino.Geometry.Vector3d(0,1,0)
         slopeDirections = []
+        hypsometricallyShadedHillshadeL = []
         for vertex in terrainMesh_vertices:
-            success, u, v = terrainSrf.ClosestPoint(vertex)
-            surfaceNormal = terrainSrf.NormalAt(u,v)
-            # check if surfaceNormal == +Z axis
-            vectorsParallel = Rhino.Geometry.Vector3d.IsParallelTo(surfaceNormal, Rhino.Geometry.Vector3d(0,0,1), 0.01)
-            if vectorsParallel == 1:  # surfaceNormal and Rhino.Geometry.Vector3d(0,0,1) are parallel
-                slopeDirectionD = 0
-            else:
-                projectedSurfaceNormal = Rhino.Geometry.Vector3d(surfaceNormal.X, surfaceNormal.Y, 0)
-                # clockwise
-                slopeDirectionR = Rhino.Geometry.Vector3d.VectorAngle(projectedSurfaceNormal, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,1)))
-                # counter clockwise
-                #slopeDirectionR = Rhino.Geometry.Vector3d.VectorAngle(projectedSurfaceNormal, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,-1)))
-                if slopeDirectionR < 0.001: slopeDirectionR = 0
-                slopeDirectionD = math.degrees(slopeDirectionR)  # in degrees
+            slopeAngleR, slopeDirectionD = vertexSlopeAndDirection(vertex)  # clockwise
+            slopeAngleD = math.degrees(slopeAngleR)  # in degrees
+            slopeAngles.append(slopeAngleD)
+            
+            gradePercent = math.tan(slopeAngleR)*100  # in percent
+            gradePercents.append(gradePercent)
+            
             correctedSlopeDirectionD_forNorth = correctSrfAzimuthDforNorth(northRad, slopeDirectionD)
             slopeDirections.append(correctedSlopeDirectionD_forNorth)
-        colors = gismo_preparation.numberToColor(slopeDirections, customColors, minValue, maxValue)
+            correctedSlopeDirectionR_forNorth = math.radians(correctedSlopeDirectionD_forNorth)
+            
+            hillshade = 255 * ( ( math.cos(sunZenithR) * math.cos(slopeAngleR) ) + ( math.sin(sunZenithR) * math.sin(slopeAngleR) * math.cos(sunAzimuthR - correctedSlopeDirectionR_forNorth) ) )
+            if hillshade < 0: hillshade = 0
+            
+            if vertexZmax > vertexZmin:
+                vertexZratio = (vertex.Z - vertexZmin)/(vertexZmax-vertexZmin)
+            else:
+                vertexZratio = 0  # flat terrain
+            shadingFactor = 1 - vertexZratio*(hypsometricStrength2/100)-((100-hypsometricStrength2)/100)
+            hypsometricallyShadedHillshade = (1-shadingFactor) * hillshade   # also called HSH
+            hypsometricallyShadedHillshadeL.append(hypsometricallyShadedHillshade)
+        
+        for analysisType2, values in ((0, slopeAngles), (1, gradePercents), (2, slopeDirections), (5, hypsometricallyShadedHillshadeL)):
+            resultKey = analysisResultKey(analysisType2, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)
+            analysisResults[resultKey] = (terrainMesh, values, values, None)
     
     
     elif (analysisType == 3):
@@ -558,18 +817,14 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
         for vertex in terrainMesh_vertices:
             vertexElevation = calculateVertexElevation(vertex.Z)  # in rhino document units
             elevations.append(vertexElevation)
-        colors = gismo_preparation.numberToColor(elevations, customColors, minValue, maxValue)
+        analysisResults[analysisResultKey(3, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)] = (terrainMesh, elevations, elevations, None)
     
     
     elif (analysisType == 4):
         # visibility
-        hittedPts = []
-        hittedLines = []
-        
         distanceToEachMeshVertex_notHitted = []
         distanceToEachMeshVertex_all = []
         eachMeshVertexIndex_notHitted = []
-        colors = [None]*len(terrainMesh_vertices)
         
         # project _origin to terrainMesh. This is done due to inconsistency between "origin" output for "type = 0 or 1", and "origin" output for "type = 2 or 3" for Gismo "Terrain Generator" component
         safeHeightDummy = 10000/unitConversionFactor  # in meters
@@ -578,18 +833,28 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
         rayIntersectParam = Rhino.Geometry.Intersect.Intersection.MeshRay(terrainMesh, ray)
         locationPt = ray.PointAt(rayIntersectParam)
         # lift the locationPt for average eye height
-        eyeHeightRhinoUnits = 1.6 / unitConversionFactor  # (1.6 meters, 5.25 feet)
+        if observerHeightM == None:
+            eyeHeightRhinoUnits = 1.6 / unitConversionFactor  # default (1.6 meters, 5.25 feet)
+        else:
+            eyeHeightRhinoUnits = observerHeightM / unitConversionFactor
         liftedOriginPt = Rhino.Geometry.Point3d(locationPt.X, locationPt.Y, locationPt.Z + eyeHeightRhinoUnits)
         
+        # rasterize the terrainMesh (with context_) to an elevation grid, and calculate the viewshed of all its cells at once
+        verticesL, trianglesL = gismo_geometry.meshToArrays(terrainMesh)
+        elevationsLL, startX, startY, numOfGridRows, numOfGridColumns = gismo_terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+        del verticesL; del trianglesL
+        observerColumn = int(round((liftedOriginPt.X-startX)/cellSize))
+        observerRow = int(round((startY-liftedOriginPt.Y)/cellSize))
+        targetHeight, maxDistance = viewshedTargetHeightMaxDistance(targetHeightM, maxDistanceM, unitConversionFactor)
+        visibleCells = gismo_terrain.viewshed(elevationsLL, cellSize, observerColumn, observerRow, liftedOriginPt.Z, targetHeight, maxDistance)
+        del elevationsLL
+        
         for index,vertex in enumerate(terrainMesh_vertices):
-            liftedVertex = Rhino.Geometry.Point3d(vertex.X, vertex.Y, vertex.Z + 0.01)  # lift each mesh vertex due to Intersection.MeshLine
-            line = Rhino.Geometry.Line(liftedOriginPt, liftedVertex)
-            intersectionPts, intersectionFaceIndex = Rhino.Geometry.Intersect.Intersection.MeshLine(terrainMesh,line)
-            if len(intersectionPts) != 0:
+            # grid cell nearest to the vertex
+            column = min(max(int(round((vertex.X-startX)/cellSize)), 0), numOfGridColumns-1)
+            row = min(max(int(round((startY-vertex.Y)/cellSize)), 0), numOfGridRows-1)
+            if visibleCells[row*numOfGridColumns+column] == 0:
                 # terrainMesh hitted
-                #hittedPts.append(liftedVertex)
-                #hittedLines.append(line)
-                colors[index] = System.Drawing.Color.FromArgb(70,70,70)  # set it to gray color
                 distanceToEachMeshVertex_all.append(0)  # if vertex can not be seen from liftedOriginPt, then set the distance between a vertex and liftedOriginPt to 0
             else:
                 # nothing hitted
@@ -599,70 +864,8 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
                 distanceToEachMeshVertex_all.append(distanceRhinoUnits)  # will be used for "values" output
         if len(distanceToEachMeshVertex_notHitted) == 0:  # fix when all vertices can not be seen
             distanceToEachMeshVertex_notHitted = [System.Drawing.Color.FromArgb(70,70,70)]*len(terrainMesh_vertices)
-        
-        colors_notHitted = gismo_preparation.numberToColor(distanceToEachMeshVertex_notHitted, customColors, minValue, maxValue)
-        
-        for dummyIndex, notHittedVertexIndex in enumerate(eachMeshVertexIndex_notHitted):
-            colors[notHittedVertexIndex] = colors_notHitted[dummyIndex]
-    
-    
-    elif (analysisType == 5):
-        # hillshade
-        # based on: http://edndoc.esri.com/arcobjects/9.2/net/shared/geoprocessing/spatial_analyst_tools/how_hillshade_works.htm
-        # http://www.jennessent.com/downloads/DEM%20Surface%20Tools%20for%20ArcGIS_A4.pdf
-        
-        # deconstruct sunVector to sunAltitudeR, sunZenithR, sunAzimuthR
-        projectedSunvector = Rhino.Geometry.Vector3d(sunVector.X, sunVector.Y, 0)
-        sunAltitudeR = Rhino.Geometry.Vector3d.VectorAngle(sunVector, projectedSunvector)
-        sunZenithR = (math.pi/2) - sunAltitudeR
-        
-        Yaxis = Rhino.Geometry.Vector3d(0,1,0)
-        # clockwise
-        sunAzimuthR = Rhino.Geometry.Vector3d.VectorAngle(projectedSunvector, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,1)))
-        # counter clockwise
-        #sunAzimuthR = Rhino.Geometry.Vector3d.VectorAngle(projectedSunvector, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,-1)))
-        
-        # for shadingFactor
-        # (there is no need to use "calculateVertexElevation" function because the ratio between vertices actual elevations and their Rhino Z coordinates is the same)
-        vertexZ = [vertex.Z  for vertex in terrainMesh_vertices]
-        vertexZmin = min(vertexZ)
-        vertexZmax = max(vertexZ)
-        
-        hypsometricallyShadedHillshadeL = []
-        for vertex in terrainMesh_vertices:
-            success, u, v = terrainSrf.ClosestPoint(vertex)
-            surfaceNormal = terrainSrf.NormalAt(u,v)
-            # check if slopeAngleD = 0 and slopeDirectionD = 0
-            vectorsParallel = Rhino.Geometry.Vector3d.IsParallelTo(surfaceNormal, Rhino.Geometry.Vector3d(0,0,1), 0.01)
-            if vectorsParallel == 1:  # surfaceNormal and Rhino.Geometry.Vector3d(0,0,1) are parallel
-                slopeAngleR = 0
-                slopeAngleD = 0
-                slopeDirectionD = 0
-            else:
-                projectedSurfaceNormal = Rhino.Geometry.Vector3d(surfaceNormal.X, surfaceNormal.Y, 0)
-                surfaceNormal_projectedSurfaceNormal_AngleR = Rhino.Geometry.Vector3d.VectorAngle(surfaceNormal, projectedSurfaceNormal)
-                if surfaceNormal_projectedSurfaceNormal_AngleR < 0.001: surfaceNormal_projectedSurfaceNormal_AngleR = 0
-                slopeAngleR = math.radians(90) - surfaceNormal_projectedSurfaceNormal_AngleR
-                slopeAngleD = math.degrees(slopeAngleR)  # in degrees
-                
-                # clockwise
-                slopeDirectionR = Rhino.Geometry.Vector3d.VectorAngle(projectedSurfaceNormal, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,1)))
-                # counter clockwise
-                #slopeDirectionR = Rhino.Geometry.Vector3d.VectorAngle(projectedSurfaceNormal, Yaxis, Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0), Rhino.Geometry.Vector3d(0,0,-1)))
-                if slopeDirectionR < 0.001: slopeDirectionR = 0
-                slopeDirectionD = math.degrees(slopeDirectionR)  # in degrees
-            
-            correctedSlopeDirectionD_forNorth = correctSrfAzimuthDforNorth(northRad, slopeDirectionD)
-            correctedSlopeDirectionR_forNorth = math.radians(correctedSlopeDirectionD_forNorth)
-            
-            hillshade = 255 * ( ( math.cos(sunZenithR) * math.cos(slopeAngleR) ) + ( math.sin(sunZenithR) * math.sin(slopeAngleR) * math.cos(sunAzimuthR - correctedSlopeDirectionR_forNorth) ) )
-            if hillshade < 0: hillshade = 0
-            
-            hypsometricStrength2 = -hypsometricStrength
-            shadingFactor = 1 - ((vertex.Z - vertexZmin)/(vertexZmax-vertexZmin))*(hypsometricStrength2/100)-((100-hypsometricStrength2)/100)
-            hypsometricallyShadedHillshade = (1-shadingFactor) * hillshade   # also called HSH
-            hypsometricallyShadedHillshadeL.append(hypsometricallyShadedHillshade)
-        colors = gismo_preparation.numberToColor(hypsometricallyShadedHillshadeL, customColors, minValue, maxValue)
+        # vertices which can not be seen from liftedOriginPt will be gray
+        analysisResults[analysisResultKey(4, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)] = (terrainMesh, distanceToEachMeshVertex_all, distanceToEachMeshVertex_notHitted, eachMeshVertexIndex_notHitted)
     
     
     elif (analysisType == 6) or (analysisType == 7) or (analysisType == 8) or (analysisType == 9):
@@ -734,86 +937,76 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
         # end of generation of points on terrainSrf (ptsOnTerrainSrf) and its elevation values (vertexElevations)
         
         
-        # calculation of surrounding set of neighboring indices in a matrix. equations by: http://math.stackexchange.com/users/71915/dolma
-        def rowOfIndexFunc(index):
-            rowOfIndex = int(math.floor(index/numberOfColumns)+1)
-            return rowOfIndex
+        # neighborhood window radius and the radius of the excluded inner window (-1 for no inner window), in number of grid cells
+        cellSpacing = bb_bottom_Xdirection_edge.Length/(numberOfColumns-1)  # in rhino document units
+        if windowRadiusM == None:
+            windowRadius = 1  # 3x3 cells window
+        else:
+            windowRadius = max(1, int(round((windowRadiusM/unitConversionFactor)/cellSpacing)))
+        if innerRadiusM == None:
+            innerWindowRadius = -1
+        else:
+            innerWindowRadius = min(int(round((innerRadiusM/unitConversionFactor)/cellSpacing)), windowRadius-1)
+        
+        # window sums are calculated from summed-area tables, and window minimums and maximums by sliding the window. So the runtime does not depend on the windowRadius
+        # elevations are taken relative to the first vertex, to keep the sums of squared elevations precise
+        referenceElevation = vertexElevations[0]
+        elevationsLL = [[vertexElevations[i*numberOfColumns+k] - referenceElevation  for k in xrange(numberOfColumns)]  for i in xrange(numberOfRows)]
+        tablesL = [gismo_terrain.summedAreaTable(elevationsLL),
+                   gismo_terrain.summedAreaTable([[z*z  for z in elevationsRow]  for elevationsRow in elevationsLL]),
+                   gismo_terrain.summedAreaTable([[vertexNormals[i*numberOfColumns+k].X  for k in xrange(numberOfColumns)]  for i in xrange(numberOfRows)]),
+                   gismo_terrain.summedAreaTable([[vertexNormals[i*numberOfColumns+k].Y  for k in xrange(numberOfColumns)]  for i in xrange(numberOfRows)]),
+                   gismo_terrain.summedAreaTable([[vertexNormals[i*numberOfColumns+k].Z  for k in xrange(numberOfColumns)]  for i in xrange(numberOfRows)])]
+        elevationsMinLL, elevationsMaxLL = gismo_terrain.windowMinMax(elevationsLL, windowRadius)
+        del vertexElevations; del vertexNormals
         
         TRI_List = []
         SRF_List = []
         TPI_List = []
         TRI_category_List = []
-        TPI_category_List = []
-        for wantedIndex in xrange(len(vertexElevations)):
-            rowOfWantedIndex = rowOfIndexFunc(wantedIndex)
-            
-            indicesInRowBeforeWantedIndex = [wantedIndex-numberOfColumns-1, wantedIndex-numberOfColumns, wantedIndex-numberOfColumns+1]
-            indicesInRowOfWantedIndex = [wantedIndex-1, wantedIndex+1]
-            indicesInRowAfterWantedIndex = [wantedIndex+numberOfColumns-1, wantedIndex+numberOfColumns, wantedIndex+numberOfColumns+1]
-            
-            kept_indicesInRowBeforeWantedIndex = [index  for index in indicesInRowBeforeWantedIndex  if rowOfIndexFunc(index) ==  rowOfWantedIndex-1]
-            kept_indicesInRowOfWantedIndex = [index2  for index2 in indicesInRowOfWantedIndex  if rowOfIndexFunc(index2) ==  rowOfWantedIndex]
-            kept_indicesInRowAfterWantedIndex = [index3  for index3 in indicesInRowAfterWantedIndex  if rowOfIndexFunc(index3) ==  rowOfWantedIndex+1]
-            mergedThreeLists_kept_indices = kept_indicesInRowBeforeWantedIndex + kept_indicesInRowOfWantedIndex + kept_indicesInRowAfterWantedIndex
-            
-            indicesRange = range(0, numberOfRows*numberOfColumns)
-            neighborIndices = [index4  for index4 in mergedThreeLists_kept_indices  if index4 in indicesRange]
-            neighboringVertexElevations = [vertexElevations[index] for index in neighborIndices]
-            neighboringVertexNormals = [vertexNormals[index] for index in neighborIndices]
-            centralVertexElevation = vertexElevations[wantedIndex]
-            centralVertexNormal = vertexNormals[wantedIndex]
-            neighboringVertexElevations_plus_centralVertexElevation = neighboringVertexElevations + [centralVertexElevation]
-            neighboringVertexNormals_plus_centralVertexNormal = neighboringVertexNormals + [centralVertexNormal]
-            
-            TRI_rhinoUnits = math.sqrt( sum([(centralVertexElevation-ptsZ)**2  for ptsZ in neighboringVertexElevations]) )  # in rhino document units
-            TRI_List.append(TRI_rhinoUnits)
-            
-            TRI_category = calculate_TRI_category(TRI_rhinoUnits)  # unitless
-            TRI_category_List.append(TRI_category)
-            
-            SRF_unitless = math.sqrt( (sum([normal.X  for normal in neighboringVertexNormals_plus_centralVertexNormal]))**2 + (sum([normal.Y  for normal in neighboringVertexNormals_plus_centralVertexNormal]))**2 + (sum([normal.Z  for normal in neighboringVertexNormals_plus_centralVertexNormal]))**2 ) / len(neighboringVertexElevations_plus_centralVertexElevation)  # unitless
-            SRF_List.append(SRF_unitless)
-            
-            TPI_rhinoUnits = centralVertexElevation - sum(neighboringVertexElevations)/len(neighboringVertexElevations)  # in rhino document units
-            averageVertexElevations = sum(neighboringVertexElevations_plus_centralVertexElevation) / len(neighboringVertexElevations_plus_centralVertexElevation)
-            TPI2 = (averageVertexElevations - min(neighboringVertexElevations_plus_centralVertexElevation)) / (max(neighboringVertexElevations_plus_centralVertexElevation) - min(neighboringVertexElevations_plus_centralVertexElevation))  # unitless, also called ERR (Elevation–Relief Ratio (Pike and Wilson, 1971)), source: Olaya, V. 2009: Basic land-surface parameters. In: Geomorphometry, Hengl, T. & Reuter, H. I.
-            #TPI_List.append(TPI_rhinoUnits)
-            TPI_List.append(TPI2)
-            """
-            # TPI cagories
-            averageElevationOfCellsWindow = sum(neighboringVertexElevations_plus_centralVertexElevation) / len(neighboringVertexElevations_plus_centralVertexElevation)
-            SD = math.sqrt(  sum( [(elevation - averageElevationOfCellsWindow)**2  for elevation in neighboringVertexElevations_plus_centralVertexElevation] ) / (len(neighboringVertexElevations_plus_centralVertexElevation) - 1)  )  # standard deviation of the elevation, in rhino document units
-            projectedCentralVertexNormal = Rhino.Geometry.Vector3d(centralVertexNormal.X, centralVertexNormal.Y, 0)
-            slopeAngleR = math.radians(90) - Rhino.Geometry.Vector3d.VectorAngle(centralVertexNormal, projectedCentralVertexNormal)
-            slopeAngleD = math.degrees(slopeAngleR)
-            TPI_category = calculate_TPI_category(TPI_rhinoUnits, SD, slopeAngleD)  # unitless
-            TPI_category_List.append(TPI_category)
-            """
-        
-        if (analysisType == 6):
-            colors = gismo_preparation.numberToColor(TRI_List, customColors, minValue, maxValue)
-            terrainMesh_colored = gismo_geometry.meshFromPoints(numberOfRows, numberOfColumns, ptsOnTerrainSrf, colors)
-            del terrainMesh_vertices; del ptsOnTerrainSrf; del colors; del TRI_category_List; del SRF_List; del TPI_List
-            
-            return terrainMesh_colored, TRI_List, TRI_List
-        elif (analysisType == 7):
-            colors = gismo_preparation.numberToColor(TRI_category_List, customColors, minValue, maxValue)
-            terrainMesh_colored = gismo_geometry.meshFromPoints(numberOfRows, numberOfColumns, ptsOnTerrainSrf, colors)
-            del terrainMesh_vertices; del ptsOnTerrainSrf; del colors; del TRI_List; del SRF_List; del TPI_List
-            
-            return terrainMesh_colored, TRI_category_List, TRI_category_List
-        elif (analysisType == 8):
-            colors = gismo_preparation.numberToColor(SRF_List, customColors, minValue, maxValue)
-            terrainMesh_colored = gismo_geometry.meshFromPoints(numberOfRows, numberOfColumns, ptsOnTerrainSrf, colors)
-            del terrainMesh_vertices; del ptsOnTerrainSrf; del colors; del TRI_List; del TRI_category_List; del TPI_List
-            
-            return terrainMesh_colored, SRF_List, SRF_List
-        elif (analysisType == 9):
-            colors = gismo_preparation.numberToColor(TPI_List, customColors, minValue, maxValue)
-            terrainMesh_colored = gismo_geometry.meshFromPoints(numberOfRows, numberOfColumns, ptsOnTerrainSrf, colors)
-            del terrainMesh_vertices; del ptsOnTerrainSrf; del colors; del TRI_List; del TRI_category_List; del SRF_List
-            
-            return terrainMesh_colored, TPI_List, TPI_List
+        for i in xrange(numberOfRows):
+            row0 = max(i-windowRadius, 0); row1 = min(i+windowRadius, numberOfRows-1)
+            for k in xrange(numberOfColumns):
+                column0 = max(k-windowRadius, 0); column1 = min(k+windowRadius, numberOfColumns-1)
+                numOfWindowCells = (row1-row0+1) * (column1-column0+1)  # central vertex included
+                elevationsSum, elevationsSquaresSum, normalsXsum, normalsYsum, normalsZsum = gismo_terrain.windowSums(tablesL, numberOfColumns, row0, column0, row1, column1)
+                if innerWindowRadius >= 0:
+                    # annulus: subtract the inner window sums
+                    innerRow0 = max(i-innerWindowRadius, 0); innerRow1 = min(i+innerWindowRadius, numberOfRows-1)
+                    innerColumn0 = max(k-innerWindowRadius, 0); innerColumn1 = min(k+innerWindowRadius, numberOfColumns-1)
+                    numOfInnerWindowCells = (innerRow1-innerRow0+1) * (innerColumn1-innerColumn0+1)
+                    if numOfInnerWindowCells < numOfWindowCells:  # otherwise the whole window is clipped by the grid edges, and it is used instead
+                        innerSums = gismo_terrain.windowSums(tablesL, numberOfColumns, innerRow0, innerColumn0, innerRow1, innerColumn1)
+                        elevationsSum -= innerSums[0]; elevationsSquaresSum -= innerSums[1]; normalsXsum -= innerSums[2]; normalsYsum -= innerSums[3]; normalsZsum -= innerSums[4]
+                        numOfWindowCells -= numOfInnerWindowCells
+                centralVertexElevation = elevationsLL[i][k]
+                
+                # sum of (centralVertexElevation-ptsZ)**2 of the window vertices
+                TRI_rhinoUnits = math.sqrt( max(elevationsSquaresSum - 2*centralVertexElevation*elevationsSum + numOfWindowCells*centralVertexElevation**2, 0) )  # in rhino document units
+                TRI_List.append(TRI_rhinoUnits)
+                
+                TRI_category = calculate_TRI_category(TRI_rhinoUnits)  # unitless
+                TRI_category_List.append(TRI_category)
+                
+                SRF_unitless = math.sqrt( normalsXsum**2 + normalsYsum**2 + normalsZsum**2 ) / numOfWindowCells  # unitless
+                SRF_List.append(SRF_unitless)
+                
+                averageVertexElevations = elevationsSum / numOfWindowCells
+                elevationsMin = elevationsMinLL[i][k]; elevationsMax = elevationsMaxLL[i][k]
+                if elevationsMax > elevationsMin:
+                    TPI2 = (averageVertexElevations - elevationsMin) / (elevationsMax - elevationsMin)  # unitless, also called ERR (Elevation–Relief Ratio (Pike and Wilson, 1971)), source: Olaya, V. 2009: Basic land-surface parameters. In: Geomorphometry, Hengl, T. & Reuter, H. I.
+                else:
+                    TPI2 = 0  # flat window
+                TPI_List.append(TPI2)
+        del elevationsLL; del tablesL; del elevationsMinLL; del elevationsMaxLL
+        
+        gridMesh = gismo_geometry.meshFromPoints(numberOfRows, numberOfColumns, ptsOnTerrainSrf)
+        for analysisType2, values in ((6, TRI_List), (7, TRI_category_List), (8, SRF_List), (9, TPI_List)):
+            if refine and ((analysisType2 == 7) != (analysisType == 7)):
+                continue  # "refine_ == True" does not affect the TRI categories, so they are calculated on a different grid than TRI, SRF, TPI
+            resultKey = analysisResultKey(analysisType2, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)
+            analysisResults[resultKey] = (gridMesh, values, values, None)
+        del ptsOnTerrainSrf
     
     
     elif (analysisType == 10):
@@ -824,38 +1017,54 @@ def createAnalysedTerrainMesh(analysisType, terrainId, originPt, originPtElevati
             surfaceCurvatureParameters = terrainSrf.CurvatureAt(u,v)
             meanCurvature = surfaceCurvatureParameters.Mean
             MeanCurvatures.append(meanCurvature)
-        colors = gismo_preparation.numberToColor(MeanCurvatures, customColors, minValue, maxValue)
-    
-    
-    
-    # color the terrainMesh with generated colors for every analysisType except 6,7,8,9 types
-    terrainMesh.VertexColors.Clear()
-    for i in xrange(len(terrainMesh_vertices)):
-        terrainMesh.VertexColors.Add(colors[i])
+        analysisResults[analysisResultKey(10, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)] = (terrainMesh, MeanCurvatures, MeanCurvatures, None)
     
     
-    #terrainMesh, values, legend values
-    if (analysisType == 0):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, slopeAngles, slopeAngles
-    elif (analysisType == 1):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, gradePercents, gradePercents
-    elif (analysisType == 2):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, slopeDirections, slopeDirections
-    elif (analysisType == 3):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, elevations, elevations
-    elif (analysisType == 4):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, distanceToEachMeshVertex_all, distanceToEachMeshVertex_notHitted
-    elif (analysisType == 5):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, hypsometricallyShadedHillshadeL, hypsometricallyShadedHillshadeL
-    elif (analysisType == 10):
-        del terrainMesh_vertices; del colors
-        return terrainMesh, MeanCurvatures, MeanCurvatures
+    elif (analysisType == 11):
+        # sky view factor
+        # rasterize the terrainMesh (with context_) to an elevation grid, and calculate the horizon angles of all its cells at once
+        verticesL, trianglesL = gismo_geometry.meshToArrays(terrainMesh)
+        elevationsLL, startX, startY, numOfGridRows, numOfGridColumns = gismo_terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+        del verticesL; del trianglesL
+        
+        directions = gismo_terrain.azimuthDirections([sectorIndex*360.0/numOfSectors for sectorIndex in xrange(numOfSectors)], northRad)
+        horizonAnglesL = gismo_terrain.horizonAnglesGrid(elevationsLL, cellSize, directions)
+        skyViewFactors = gismo_terrain.skyViewFactors(horizonAnglesL)
+        skyViewFactorsLL = [skyViewFactors[row*numOfGridColumns:(row+1)*numOfGridColumns].tolist() for row in xrange(numOfGridRows)]
+        del horizonAnglesL; del skyViewFactors
+        
+        # sky view factors at terrainMesh vertices
+        skyViewFactorsL = []
+        for vertex in terrainMesh_vertices:
+            skyViewFactor = gismo_terrain.elevationAt(skyViewFactorsLL, (vertex.X-startX)/cellSize, (startY-vertex.Y)/cellSize)
+            if skyViewFactor == None:
+                skyViewFactor = 1
+            skyViewFactorsL.append(skyViewFactor)
+        analysisResults[analysisResultKey(11, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)] = (terrainMesh, skyViewFactorsL, skyViewFactorsL, None)
+        del elevationsLL; del skyViewFactorsLL
+    
+    
+    elif (analysisType == 12):
+        # cumulative visibility
+        # rasterize the terrainMesh (with context_) to an elevation grid, shared by the viewsheds of all observers
+        verticesL, trianglesL = gismo_geometry.meshToArrays(terrainMesh)
+        elevationsLL, startX, startY, numOfGridRows, numOfGridColumns = gismo_terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+        del verticesL; del trianglesL
+        gridObservers = [(int(round((pt.X-startX)/cellSize)), int(round((startY-pt.Y)/cellSize)), pt.Z) for pt in observers]
+        targetHeight, maxDistance = viewshedTargetHeightMaxDistance(targetHeightM, maxDistanceM, unitConversionFactor)
+        observersCounts, observerBitsetsDummy = gismo_terrain.cumulativeViewshed(elevationsLL, cellSize, gridObservers, targetHeight, maxDistance)
+        del elevationsLL
+        
+        observersCountsL = []
+        for vertex in terrainMesh_vertices:
+            # grid cell nearest to the vertex
+            column = min(max(int(round((vertex.X-startX)/cellSize)), 0), numOfGridColumns-1)
+            row = min(max(int(round((startY-vertex.Y)/cellSize)), 0), numOfGridRows-1)
+            observersCountsL.append(observersCounts[row*numOfGridColumns+column])
+        analysisResults[analysisResultKey(12, originPt, originPtElevation, northRad, sunVector, hypsometricStrength, numOfSectors, observers, windowRadiusM, innerRadiusM, observerHeightM, targetHeightM, maxDistanceM)] = (terrainMesh, observersCountsL, observersCountsL, None)
+        del observersCounts
+    
+    del terrainMesh_vertices
 
 
 def joinTerrainStand_withTerrainMesh(terrainId, terrainMesh):
@@ -910,7 +1119,7 @@ def joinTerrainStand_withTerrainMesh(terrainId, terrainMesh):
         return terrainMesh
 
 
-def createTitleLegend(analysisType, terrainMesh_withWithoutStand, legendValues, analysisTypeLabel, northD, sunVector, hypsometricStrength, refine, unitSystem, legendUnit):
+def createTitleLegend(analysisType, terrainMesh_withWithoutStand, legendValues, analysisTypeLabel, northD, sunVector, hypsometricStrength, numOfSectors, windowRadiusM, innerRadiusM, refine, unitSystem, legendUnit):
     
     # extract data from legendBakePar_
     legendStyle, legendPlane, maxValue, minValue, customColors, numLegendCells, fontName, fontSize, numDecimals, customLegendUnit, customTitle, scale, layerName, layerColor, layerCategoryName = gismo_preparation.read_legendBakePar(legendBakePar_)
@@ -919,7 +1128,15 @@ def createTitleLegend(analysisType, terrainMesh_withWithoutStand, legendValues,
     if (analysisType == 5):
         titleLabelText = "Terrain %s analysis\nsunVector: (%0.2f,%0.2f,%0.2f), hypsoStrength: %s\nnorth: %s, refine: %s" % (analysisTypeLabel, sunVector.X, sunVector.Y, sunVector.Z, str(hypsometricStrength), str(northD), refine)
     elif (analysisType == 6) or (analysisType == 7) or (analysisType == 8) or (analysisType == 9):
-        titleLabelText = "%s analysis\nnorth: %s, refine: %s, for fixed 3x3 cells window" % (analysisTypeLabel, northD, refine)
+        if windowRadiusM == None:
+            windowLabel = "for 3x3 cells window"
+        else:
+            windowLabel = "window radius: %s m" % windowRadiusM
+        if innerRadiusM != None:
+            windowLabel += ", inner radius: %s m" % innerRadiusM
+        titleLabelText = "%s analysis\nnorth: %s, refine: %s, %s" % (analysisTypeLabel, northD, refine, windowLabel)
+    elif (analysisType == 11):
+        titleLabelText = "Terrain %s analysis\nnorth: %s, refine: %s, horizon sectors: %s" % (analysisTypeLabel, northD, refine, numOfSectors)
     else:
         titleLabelText = "Terrain %s analysis\nnorth: %s, refine: %s" % (analysisTypeLabel, northD, refine)
     
@@ -964,7 +1181,7 @@ def bakingGrouping(analysisType, analysisTypeLabel, terrainMesh_withWithoutStand
     groupIndex2 = gismo_preparation.groupGeometry(layerName + "_terrainAnalysis_" + analysisTypeLabel, geometryIds2)
 
 
-def printOutput(analysisType, analysisTypeLabel, originPt, originPtElevation, northD, sunVector, hypsometricStrength, refine, unitSystem):
+def printOutput(analysisType, analysisTypeLabel, originPt, originPtElevation, northD, sunVector, hypsometricStrength, numOfSectors, refine, unitSystem):
     if bakeIt_ == True:
         bakedOrNot = "and baked "
     elif bakeIt_ == False:
@@ -981,8 +1198,9 @@ North (deg.): %s
 
 SunVector: %s
 Hypsometric strength: %s
+Horizon sectors: %s
 Refine: %s
-    """ % (analysisType, analysisTypeLabel, originPt, unitSystem, originPtElevation, northD, sunVector, hypsometricStrength, refine)
+    """ % (analysisType, analysisTypeLabel, originPt, unitSystem, originPtElevation, northD, sunVector, hypsometricStrength, numOfSectors, refine)
     print resultsCompletedMsg
     print printOutputMsg
 
@@ -994,16 +1212,17 @@ if sc.sticky.has_key("gismoGismo_released"):
         gismo_mainComponent = sc.sticky["gismo_mainComponent"]()
         gismo_preparation = sc.sticky["gismo_Preparation"]()
         gismo_geometry = sc.sticky["gismo_CreateGeometry"]()
+        gismo_terrain = sc.sticky["gismo_Terrain"]()
         
-        analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg = checkInputData(_analysisType, _terrain, _origin, _elevation, north_, sunVector_, hypsoStrength_, refine_)
+        analysisType, analysisTypeLabel, originPt, originPtElevation, northRad, northD, sunVector, hypsometricStrength, numOfSectors, refine, exportValues, unitSystem, unitConversionFactor, legendUnit, validInputData, printMsg = checkInputData(_analysisType, _terrain, _origin, _elevation, north_, sunVector_, hypsoStrength_, horizonSectors_, observers_, windowRadius_, innerRadius_, observerHeight_, targetHeight_, maxDistance_, refine_)
         if validInputData:
             createOutputDescriptions(analysisType, unitSystem)
             if _runIt:
-                terrainMesh, values, legendValues = createAnalysedTerrainMesh(analysisType, _terrain, originPt, originPtElevation, context_, northRad, sunVector, hypsometricStrength, refine, exportValues, unitConversionFactor)
+                terrainMesh, values, legendValues = createAnalysedTerrainMesh(analysisType, _terrain, originPt, originPtElevation, context_, northRad, sunVector, hypsometricStrength, numOfSectors, observers_, windowRadius_, innerRadius_, observerHeight_, targetHeight_, maxDistance_, refine, exportValues, unitConversionFactor)
                 terrainMesh_withWithoutStand = joinTerrainStand_withTerrainMesh(_terrain, terrainMesh)
-                titleLabelMesh, legendMesh, legendPlane = createTitleLegend(analysisType, terrainMesh_withWithoutStand, legendValues, analysisTypeLabel, northD, sunVector, hypsometricStrength, refine, unitSystem, legendUnit)
+                titleLabelMesh, legendMesh, legendPlane = createTitleLegend(analysisType, terrainMesh_withWithoutStand, legendValues, analysisTypeLabel, northD, sunVector, hypsometricStrength, numOfSectors, windowRadius_, innerRadius_, refine, unitSystem, legendUnit)
                 if bakeIt_: bakingGrouping(analysisType, analysisTypeLabel, terrainMesh_withWithoutStand, titleLabelMesh, legendMesh, legendPlane, originPt)
-                printOutput(analysisType, analysisTypeLabel, originPt, originPtElevation, northD, sunVector, hypsometricStrength, refine, unitSystem)
+                printOutput(analysisType, analysisTypeLabel, originPt, originPtElevation, northD, sunVector, hypsometricStrength, numOfSectors, refine, unitSystem)
                 analysedTerrain = terrainMesh_withWithoutStand; origin = originPt; title = titleLabelMesh; legend = legendMesh; del legendValues;
             else:
                 print "All inputs are ok. Please set \"_runIt\" to True, in order to run the Terrain analysis component"
@@ -74,9 +74,17 @@ Provided by Gismo 0.0.3
                          -
                          In Rhino document units.
         numOfContours_: Number of elevation contours.
+                        They are evenly spaced between the lowest and the highest elevation of the terrain.
                         If you would not like the elevationContours output to be calculated, set the numOfContours_ input to 0.
                         -
                         If not supplied, default value of 10 elevation contours will be used.
+        maxError_: Maximal vertical error of the "terrain" mesh.
+                   If supplied, the terrain mesh will be an adaptive triangulation of the terrain grid: flat areas will be covered by a few large triangles, and only the vertices needed to keep every grid point within maxError_ from the mesh will be used. This can decrease the number of mesh faces tens of times.
+                   The "terrain" surface (type_ = 2 and 3) is always created from the whole grid.
+                   -
+                   If not supplied, the terrain mesh will be created with a quad for each grid cell.
+                   -
+                   In meters.
         legendBakePar_: In case your type_ input is set to 0 or 1, you can use the legendBakePar_ input to control the colors with which the final "terrain" mesh will be colored with based on elevation.
                         Use Gismo "Legend Bake Parameters" component's "customColors_" input to control these colors.
                         Also use its fontName_ and fontSize_ inputs to change the font, size of the "title" output.
@@ -111,6 +119,7 @@ ghenv.Component.IconDisplayMode = ghenv.Component.IconDisplayMode.application
 ghenv.Component.Category = "Gismo"
 ghenv.Component.SubCategory = "2 | Terrain"
 #compatibleGismoVersion = VER 0.0.3\nJAN_29_2019
+#requiresGismoKernels
 try: ghenv.Component.AdditionalHelpFromDocStrings = "1"
 except: pass
 
@@ -129,7 +138,7 @@ import os
 import gc
 
 
-def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _type, origin, north, standThickness, numOfContours, downloadTSVLink):
+def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _type, origin, north, standThickness, numOfContours, maxError, downloadTSVLink):
     
     # check if MapWinGIS is properly installed
     gismoGismoComponentNotRan = False  # initial value
@@ -137,8 +146,8 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
         mapFolder_ = sc.sticky["gismo_mapwingisFolder"]
         iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, validInputData, printMsg = gismo_mainComponent.mapWinGIS(mapFolder_)
         if not validInputData:
-            maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
-            return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+            maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+            return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
         if sc.sticky.has_key("MapWinGIS"):
             global MapWinGIS
             import MapWinGIS
@@ -148,10 +157,10 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
         gismoGismoComponentNotRan = True
     
     if (gismoGismoComponentNotRan == True):
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "The \"Gismo Gismo\" component has not been run. Run it before running this component."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     
     # check inputs
@@ -213,22 +222,28 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
               "numOfContours_ input set to 0 (no elevation contours will be created)."
     
     
+    if (maxError != None) and (maxError <= 0):
+        maxError = None
+        print "maxError_ input can only be higher than 0.\n" + \
+              "maxError_ input set to None (terrain mesh with a quad for each grid cell will be created)."
+    
+    
     if (maxVisibilityRadiusM == None):
         maxVisibilityRadiusM = 200  # default in meters
     elif (maxVisibilityRadiusM >= 20) and (maxVisibilityRadiusM < 200):
         maxVisibilityRadiusM = 200  # values less than 150m can download invalid .tif file from opentopography.org. So the .tif file will always be downloaded with the minimal radius of 200 meters
     elif (maxVisibilityRadiusM < 20):
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "radius_ input only supports values equal or larger than 20 meters."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     elif (maxVisibilityRadiusM > 100000):
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "Radii longer than 100 000 meters (100 kilometers) are not supported, due to possibility of crashing the Rhino.\n" + \
                    " \n" + \
                    "ATTENTION!!! Have in mind that even radii of a couple of thousands of meters may require stronger PC configurations and 64 bit version of Rhino 5. Otherwise Rhino 5 may crash."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     #arcAngleD = math.degrees( math.atan( maxVisibilityRadiusM / (6371000+elevation) ) )  # assumption of Earth being a sphere
     #arcLength = (arcAngleD*math.pi*R)/180
@@ -237,30 +252,30 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
     
     if (source == 0)  and  ((locationLatitudeD < -55.9) or (locationLatitudeD > 59.9)):
         # SRTMGL1 is limited to -56 to 60 latitude
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "The \"source_ = 0\" input (SRTMGL1) has range limits: from -55.9 South to 59.9 North latitude.\n" + \
                    "Defined \"_location\" exceeds these limits.\n" + \
                    "Try using either \"source_ = 1\" input or \"source_ = 2\" inputs, which have higher range limits (both from -82 South to 82 North latitude)."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     if (source == 1)  and  ((locationLatitudeD < -82) or (locationLatitudeD > 82)):
         # AW3D30 is limited to -82 to 80 latitude
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "The \"source_ = 1\" input (SRTMGL1) has range limits: from -82 South to 82 North latitude.\n" + \
                    "Defined \"_location\" exceeds these limits.\n" + \
                    "For now, no other Gismo \"source_\" supports latitude beyond this."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     if (source == 2)  and  ((locationLatitudeD < -82) or (locationLatitudeD > 82)):
         # GMRT is limited to -82 to 80 latitude
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "The \"source_ = 2\" input (GMRT) has range limits: from -82 South to 82 North latitude.\n" + \
                    "Defined \"_location\" exceeds these limits.\n" + \
                    "For now, no other Gismo \"source_\" supports latitude beyond this."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     
     if (north == None):
@@ -270,10 +285,10 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
         try:  # check if it's a number
             north = float(north)
             if north < 0 or north > 360:
-                maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+                maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
                 validInputData = False
                 printMsg = "Please input north angle value from 0 to 360."
-                return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+                return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
         except Exception, e:  # check if it's a vector
             north.Unitize()
         
@@ -288,12 +303,12 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
     workingSubFolderPath = os.path.join(gismoFolderPath, "terrain_files")
     folderCreatedSuccess = gismo_preparation.createFolder(workingSubFolderPath)
     if folderCreatedSuccess == False:
-        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
+        maxVisibilityRadiusM = gridSize = source = sourceLabel = _type = typeLabel = origin = northRad = northDeg = standThickness = numOfContours = maxError = workingSubFolderPath = downloadTSVLink = unitConversionFactor = unitConversionFactor2 = None
         validInputData = False
         printMsg = "The file path you added to \"gismoFolder_\" input of Gismo Gismo component is invalid.\n" + \
                    "Input the string in the following format (example): c:\someFolder\gismo.\n" + \
                    "Or do not input anything, in which case a default Gismo folder will be used instead: C:\gismo."
-        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+        return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
     
     if downloadTSVLink == None:
         downloadTSVLink = "https://raw.githubusercontent.com/stgeorges/terrainShadingMask/master/objFiles/0_terrain_shading_masks_download_links.tsv"
@@ -307,7 +322,7 @@ def checkInputData(locationLatitudeD, maxVisibilityRadiusM, gridSize, source, _t
     validInputData = True
     printMsg = "ok"
     
-    return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
+    return maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg
 
 
 def distanceBetweenTwoPoints(latitude1D, longitude1D, maxVisibilityRadiusM):
@@ -636,23 +651,26 @@ def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink
                     # (correctedMaskRadiusM >= maxVisibilityRadiusM)
                     latitudeTopD, dummyLongitudeTopD, latitudeBottomD, dummyLongitudeBottomD, dummyLatitudeLeftD, longitudeLeftD, dummyLatitudeRightD, longitudeRightD = gismo_gis.destinationLatLon(locationLatitudeD, locationLongitudeD, correctedMaskRadiusM)
                     # generate download link for raster region
-                    
-                    if source == 0:
-                        # based on: http://www.opentopography.org/developers
-                        #downloadRasterLink_withCorrectedMaskRadiusKM = "http://opentopo.sdsc.edu/otr/getdem?demtype=SRTMGL1&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (longitudeLeftD,latitudeBottomD,longitudeRightD,latitudeTopD)  # SRTM 1 arc second (old link)
-                        downloadRasterLink_withCorrectedMaskRadiusKM = "https://portal.opentopography.org/API/globaldem?demtype=SRTMGL1&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD)  # SRTM 1 arc second (new link)
-                    elif source == 1:
-                        # based on: http://www.opentopography.org/developers
-                        #downloadRasterLink_withCorrectedMaskRadiusKM = "http://opentopo.sdsc.edu/otr/getdem?demtype=AW3D30&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (longitudeLeftD,latitudeBottomD,longitudeRightD,latitudeTopD)  # ALOS 1 arc second (AW3D30) (old link)
-                        downloadRasterLink_withCorrectedMaskRadiusKM = "https://portal.opentopography.org/API/globaldem?demtype=AW3D30&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD)  # ALOS 1 arc second (AW3D30) (new link)
-                    elif source == 2:
-                        # based on: http://www.marine-geo.org/tools/gridserverinfo.php#!/tools/getGMRTGrid
-                        downloadRasterLink_withCorrectedMaskRadiusKM = "http://www.marine-geo.org/services/GridServer?north={}&west={}&east={}&south={}&layer=topo&format=geotiff&resolution=max".format(latitudeTopD, longitudeLeftD, longitudeRightD, latitudeBottomD)  # GMRT
+                    downloadRasterLink_withCorrectedMaskRadiusKM = rasterDownloadLink(source, latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD)
                     
                     # new rasterFileNamePlusExtension and rasterFilePath corrected according to new correctedMaskRadiusM
                     rasterFileNamePlusExtension_withCorrectedMaskRadiusKM = fileNameIncomplete + "_visibility=" + str(round(maxVisibilityRadiusM/1000, 2)) + "KM" + "_source=" + sourceLabel + ".tif"  # IMPORTANT: rasterFileNamePlusExtension_withCorrectedMaskRadiusKM will always be used instead of rasterFilePath from line 647 !!!
                     rasterFilePath_withCorrectedMaskRadiusKM = os.path.join(workingSubFolderPath, rasterFileNamePlusExtension_withCorrectedMaskRadiusKM)
-                    tifFileDownloaded = gismo_preparation.downloadFile(downloadRasterLink_withCorrectedMaskRadiusKM, rasterFilePath_withCorrectedMaskRadiusKM)
+                    
+                    # mosaic the raster from the 1x1 degree tiles cached in the "dem_tiles" folder (shared by all locations and visibility radii). Only the missing tiles are downloaded
+                    demTilesFolderPath = os.path.join(os.path.dirname(workingSubFolderPath), "dem_tiles")
+                    tifFileDownloaded = False
+                    if gismo_preparation.createFolder(demTilesFolderPath):
+                        demTileCache = gismo_demTileCache(demTilesFolderPath)
+                        try:
+                            tifFileDownloaded = demTileCache.mosaic(sourceLabel, latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD, rasterFilePath_withCorrectedMaskRadiusKM, lambda south, north, west, east: rasterDownloadLink(source, south, north, west, east), gismo_preparation.downloadFile)
+                        except (IOError, OSError, ValueError), e:
+                            # a tile could not be written, or a cached tile is not a valid GeoTIFF file
+                            print "The DEM tiles could not be mosaicked (%s). The raster of the whole region will be downloaded instead." % e
+                            tifFileDownloaded = False
+                    if not tifFileDownloaded:
+                        # the tiles could not be downloaded or read: download the raster of the whole region
+                        tifFileDownloaded = gismo_preparation.downloadFile(downloadRasterLink_withCorrectedMaskRadiusKM, rasterFilePath_withCorrectedMaskRadiusKM)
                     if tifFileDownloaded:
                         terrainShadingMask = origin_0_0_0 = None
                         valid_Obj_or_Raster_file = True
@@ -682,51 +700,98 @@ def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink
     return terrainShadingMask, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterReprojectedFileNamePlusExtension, vrtFilePath, elevationM, valid_Obj_or_Raster_file, printMsg
 
 
-def createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, maxVisibilityRadiusM, unitConversionFactor2):
+def rasterDownloadLink(source, south, north, west, east):
+    
+    # download link of the raster region (in degrees) for the chosen source
+    if source == 0:
+        # based on: http://www.opentopography.org/developers
+        #downloadRasterLink = "http://opentopo.sdsc.edu/otr/getdem?demtype=SRTMGL1&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (west,south,east,north)  # SRTM 1 arc second (old link)
+        downloadRasterLink = "https://portal.opentopography.org/API/globaldem?demtype=SRTMGL1&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(south, north, west, east)  # SRTM 1 arc second (new link)
+    elif source == 1:
+        # based on: http://www.opentopography.org/developers
+        #downloadRasterLink = "http://opentopo.sdsc.edu/otr/getdem?demtype=AW3D30&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (west,south,east,north)  # ALOS 1 arc second (AW3D30) (old link)
+        downloadRasterLink = "https://portal.opentopography.org/API/globaldem?demtype=AW3D30&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(south, north, west, east)  # ALOS 1 arc second (AW3D30) (new link)
+    elif source == 2:
+        # based on: http://www.marine-geo.org/tools/gridserverinfo.php#!/tools/getGMRTGrid
+        downloadRasterLink = "http://www.marine-geo.org/services/GridServer?north={}&west={}&east={}&south={}&layer=topo&format=geotiff&resolution=max".format(north, west, east, south)  # GMRT
+    
+    return downloadRasterLink
+
+
+def createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, maxVisibilityRadiusM, maxError, numOfContours, unitConversionFactor2):
     
     # create "terrainMesh" and "terrrainBrep" from Opentopography data
     
     # output crs data: outputCRS_UTMzone, northOrsouth
     CRS_EPSG_code, outputCRS_UTMzone, northOrsouth = gismo_gis.calculate_CRS_UTMzone(locationLatitudeD, locationLongitudeD)
     
-    # reproject raster
-    utils = MapWinGIS.UtilsClass()
-    resamplingMethod = "-r bilinear"
-    bstrOptions = '-s_srs EPSG:4326 -t_srs "+proj=utm +zone=%s +%s +datum=WGS84 +ellps=WGS84" %s' % (outputCRS_UTMzone, northOrsouth, resamplingMethod)
-    reprojectGridResult = MapWinGIS.UtilsClass.GDALWarp(utils, rasterFilePath, rasterReprojectedFilePath, bstrOptions, None)
-    if (reprojectGridResult != True):
-        convertErrorNo = MapWinGIS.GlobalSettingsClass().GdalLastErrorNo
-        convertErrorMsg = MapWinGIS.GlobalSettingsClass().GdalLastErrorMsg
-        convertErrorType = MapWinGIS.GlobalSettingsClass().GdalLastErrorType
-        print "convertErrorNo: ", convertErrorNo
-        print "convertErrorMsg: ", convertErrorMsg
-        print "convertErrorType: ", convertErrorType
-    
-    # open the reprojected raster
-    grid = MapWinGIS.GridClass()
-    dataType = MapWinGIS.GridDataType.DoubleDataType
-    fileTypeExtension = MapWinGIS.GridFileType.UseExtension
-    inRam = True
-    openGridSuccess = MapWinGIS.GridClass.Open(grid, rasterReprojectedFilePath, dataType, inRam, fileTypeExtension, None)
-    if (openGridSuccess != True):
-        gridErrorMsg = grid.ErrorMsg
-        print "gridErrorMsg: ", gridErrorMsg
-    
-    # numOfRows, numOfColumns, cellsizeX, cellsizeY
-    header = grid.Header
-    numOfRows = header.NumberRows
-    numOfColumns = header.NumberCols
+    # reproject raster in-process: the centers of the UTM grid cells are inverse projected to the downloaded EPSG:4326 raster, and its elevations are bilinearly interpolated
+    try:
+        geoTiff = gismo_geoTiff(rasterFilePath)
+        if geoTiff.epsgCode != 4326:
+            geoTiff.close()
+            geoTiff = None
+    except Exception, e:
+        geoTiff = None
+    
+    if geoTiff != None:
+        utmGrid = gismo_terrain.utmGrid(geoTiff, outputCRS_UTMzone, northOrsouth)
+        upperLeftCornerXcoord, upperLeftCornerYcoord, cellsizeX, numOfRows, numOfColumns = utmGrid
+        cellsizeY = cellsizeX
+        lowerLeftCornerXcoord = upperLeftCornerXcoord
+        lowerLeftCornerYcoord = upperLeftCornerYcoord - numOfRows*cellsizeY
+        
+        elevations = []
+        for k in xrange(numOfRows):
+            elevations.extend( gismo_terrain.reprojectedRow(geoTiff, utmGrid, k, outputCRS_UTMzone, northOrsouth, "bilinear") )
+        geoTiff.close()
+    
+    else:
+        # the raster is not supported by the GeoTiff reader. Reproject it with GDALWarp
+        utils = MapWinGIS.UtilsClass()
+        resamplingMethod = "-r bilinear"
+        bstrOptions = '-s_srs EPSG:4326 -t_srs "+proj=utm +zone=%s +%s +datum=WGS84 +ellps=WGS84" %s' % (outputCRS_UTMzone, northOrsouth, resamplingMethod)
+        reprojectGridResult = MapWinGIS.UtilsClass.GDALWarp(utils, rasterFilePath, rasterReprojectedFilePath, bstrOptions, None)
+        if (reprojectGridResult != True):
+            convertErrorNo = MapWinGIS.GlobalSettingsClass().GdalLastErrorNo
+            convertErrorMsg = MapWinGIS.GlobalSettingsClass().GdalLastErrorMsg
+            convertErrorType = MapWinGIS.GlobalSettingsClass().GdalLastErrorType
+            print "convertErrorNo: ", convertErrorNo
+            print "convertErrorMsg: ", convertErrorMsg
+            print "convertErrorType: ", convertErrorType
+        
+        # open the reprojected raster (read from the disk, row by row, instead of loading it into memory twice)
+        grid = MapWinGIS.GridClass()
+        dataType = MapWinGIS.GridDataType.DoubleDataType
+        fileTypeExtension = MapWinGIS.GridFileType.UseExtension
+        inRam = False
+        openGridSuccess = MapWinGIS.GridClass.Open(grid, rasterReprojectedFilePath, dataType, inRam, fileTypeExtension, None)
+        if (openGridSuccess != True):
+            gridErrorMsg = grid.ErrorMsg
+            print "gridErrorMsg: ", gridErrorMsg
+        
+        # numOfRows, numOfColumns, cellsizeX, cellsizeY
+        header = grid.Header
+        numOfRows = header.NumberRows
+        numOfColumns = header.NumberCols
+        cellsizeX = header.dX
+        cellsizeY = header.dY
+        lowerLeftCornerCellCentroidXcoord = header.XllCenter
+        lowerLeftCornerCellCentroidYcoord = header.YllCenter
+        lowerLeftCornerXcoord = lowerLeftCornerCellCentroidXcoord - (cellsizeX/2)
+        lowerLeftCornerYcoord = lowerLeftCornerCellCentroidYcoord - (cellsizeY/2)
+        
+        # read the raster in bulk, row by row
+        elevations = gismo_gis.gridValues(grid, numOfRows, numOfColumns, header.NodataValue)
+        closeGridSuccess = grid.Close()
+        os.remove(rasterReprojectedFilePath)  # reprojected .tif file
+        del grid
+    
     numOfCellsInX = numOfColumns
     numOfCellsInY = numOfRows
-    cellsizeX = header.dX
-    cellsizeY = header.dY
     
     # calculate the starting point (upper left corner) of terrain mesh
     scaleFactor = 0.01  # scale terrainMesh 100 times (should never be changed), meaning 1 meter in real life is 0.01 meters in Rhino document
-    lowerLeftCornerCellCentroidXcoord = header.XllCenter
-    lowerLeftCornerCellCentroidYcoord = header.YllCenter
-    lowerLeftCornerXcoord = lowerLeftCornerCellCentroidXcoord - (cellsizeX/2)
-    lowerLeftCornerYcoord = lowerLeftCornerCellCentroidYcoord - (cellsizeY/2)
     
     originPtProjected = gismo_gis.projectedLocationCoordinates(locationLatitudeD, locationLongitudeD)  # find the "origin" projected in Rhino document units for specific UTMzone
     
@@ -736,27 +801,50 @@ def createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLat
     terrainMeshStartPtX = ( terrainMeshLeftBottomPtX )*scaleFactor
     terrainMeshStartPtY = ( terrainMeshLeftBottomPtY + ((abs(cellsizeX)/unitConversionFactor2)*numOfRows) )*scaleFactor
     
-    pts = []
-    # create terrainMesh from 1 arc-second format
-    for k in xrange(numOfCellsInY):
-        for i in xrange(numOfCellsInX):
-            ptZ = grid.Value(i,k)
-            if math.isnan(ptZ):  # ptZ is float("nan")
-                ptZ = 0
-            pt = Rhino.Geometry.Point3d(terrainMeshStartPtX+(i*abs(cellsizeX/unitConversionFactor2)*scaleFactor), terrainMeshStartPtY-(k*abs(cellsizeY/unitConversionFactor2)*scaleFactor), ptZ/unitConversionFactor2*scaleFactor)
-            pts.append(pt)
-    
-    closeGridSuccess = grid.Close()
+    # create terrainMesh from 1 arc-second format: coordinates of the columns, rows and elevations
+    meshCellSizeX = abs(cellsizeX/unitConversionFactor2)*scaleFactor
+    meshCellSizeY = abs(cellsizeY/unitConversionFactor2)*scaleFactor
+    xL = [terrainMeshStartPtX + i*meshCellSizeX for i in xrange(numOfCellsInX)]
+    yL = [terrainMeshStartPtY - k*meshCellSizeY for k in xrange(numOfCellsInY)]
+    zFactor = scaleFactor/unitConversionFactor2
+    
+    # cut the grid to the terrain's square (type_ = 0 and 2), or to the square around the terrain's circle (type_ = 1 and 3) enlarged by a cell, so that the circle does not touch the edges of the grid
+    cuttingRadiusScaled = cuttingRadius(unitConversionFactor2)
+    if (_type == 0) or (_type == 2):
+        halfSide = cuttingRadiusScaled
+    elif (_type == 1) or (_type == 3):
+        halfSide = cuttingRadiusScaled + max(meshCellSizeX, meshCellSizeY)
+    xL, yL, elevations = gismo_terrain.clipGridToRectangle(xL, yL, elevations, -halfSide, halfSide, -halfSide, halfSide)
+    numOfCellsInX = len(xL)
+    numOfCellsInY = len(yL)
+    zL = [0 if (ptZ == None) or (ptZ != ptZ) else ptZ*zFactor for ptZ in elevations]  # ptZ is None or float("nan") (not equal to itself) for no data
+    
+    # elevation contours are calculated on the grid, before the elevations are replaced with the terrain mesh
+    if (numOfContours > 0):
+        elevationContours = createElevationContours(elevations, xL, yL, zFactor, cuttingRadiusScaled, numOfContours)
+    else:
+        # no elevationContours will be created
+        elevationContours = []
+    del elevations
     
     # always create a terrain mesh regardless of type_ input so that "elevationM" can be calculated on a mesh
-    terrainMesh = gismo_geometry.meshFromPoints(numOfRows, numOfColumns, pts)
-    
-    # always create a terrain brep
-    uDegree = min(3, numOfCellsInY - 1)
-    vDegree = min(3, numOfCellsInX - 1)
-    uClosed = False; vClosed = False
-    terrainSurface = Rhino.Geometry.NurbsSurface.CreateThroughPoints(pts, numOfCellsInY, numOfCellsInX, uDegree, vDegree, uClosed, vClosed)
-    terrainBrep = terrainSurface.ToBrep()
+    if (maxError == None) and ((_type == 0) or (_type == 2)):
+        terrainMesh = gismo_geometry.meshFromGrid(xL, yL, zL)
+    else:
+        if (maxError == None):
+            # a quad for each grid cell
+            verticesL = [(x, y, zL[k*numOfCellsInX + i]) for k,y in enumerate(yL) for i,x in enumerate(xL)]
+            facesL = [((k-1)*numOfCellsInX+i-1, k*numOfCellsInX+i-1, k*numOfCellsInX+i, (k-1)*numOfCellsInX+i) for k in xrange(1, numOfCellsInY) for i in xrange(1, numOfCellsInX)]
+        else:
+            # adaptive triangulation: only the grid points needed to keep the terrain within maxError (converted from meters to zL units) are used as vertices
+            gridIndicesL, facesL = gismo_terrain.rtinTriangles(zL, numOfCellsInY, numOfCellsInX, maxError*zFactor)
+            verticesL = [(xL[gridIndex % numOfCellsInX], yL[gridIndex // numOfCellsInX], zL[gridIndex]) for gridIndex in gridIndicesL]
+            del gridIndicesL
+        if (_type == 1) or (_type == 3):
+            # cut the faces crossing the terrain's circle at their edges
+            verticesL, facesL = gismo_terrain.clipFacesToCircle(verticesL, facesL, 0, 0, cuttingRadiusScaled)
+        terrainMesh = gismo_geometry.meshFromArrays(verticesL, facesL)
+        del verticesL; del facesL
     
     
     # project origin_0_0_0 (locationPt) to terrainMesh
@@ -771,13 +859,49 @@ def createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLat
     elevationM = round(elevationM,2)
     
     
+    # create a terrain brep from all the grid points, only if the terrain will be a surface
+    if (_type == 2) or (_type == 3):
+        pts = [Rhino.Geometry.Point3d(x, y, zL[k*numOfCellsInX + i]) for k,y in enumerate(yL) for i,x in enumerate(xL)]
+        uDegree = min(3, numOfCellsInY - 1)
+        vDegree = min(3, numOfCellsInX - 1)
+        uClosed = False; vClosed = False
+        terrainSurface = Rhino.Geometry.NurbsSurface.CreateThroughPoints(pts, numOfCellsInY, numOfCellsInX, uDegree, vDegree, uClosed, vClosed)
+        terrainBrep = terrainSurface.ToBrep()
+        del pts
+        
+        if (_type == 3):
+            # trim the surface with the outline of the terrainMesh, already clipped to the terrain's circle on the grid, and keep the face below the locationPt
+            tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance/(1/scaleFactor)  # divide the "tol" with "1/scaleFactor" to account for the 100 times scalling in "title_scalingRotating" function
+            trimmedTerrainBrep = None
+            terrainMeshOutlines = terrainMesh.GetNakedEdges()
+            if (terrainMeshOutlines != None) and (len(terrainMeshOutlines) > 0):
+                terrainMeshOutline = max(terrainMeshOutlines, key=lambda polyline: polyline.Length)
+                trimmingCrvs = terrainMeshOutline.ToNurbsCurve().PullToBrepFace(terrainBrep.Faces[0], tol)
+                if (trimmingCrvs != None) and (len(trimmingCrvs) > 0):
+                    splittedBrep = terrainBrep.Faces[0].Split(trimmingCrvs, tol)
+                    if splittedBrep != None:
+                        for face in splittedBrep.Faces:
+                            success, u, v = face.ClosestPoint(locationPt)
+                            if success and (face.IsPointOnFace(u, v) != Rhino.Geometry.PointFaceRelation.Exterior):
+                                trimmedTerrainBrep = face.DuplicateFace(False)
+                                break
+            if trimmedTerrainBrep != None:
+                terrainBrep = trimmedTerrainBrep
+            else:
+                # the surface could not be trimmed: keep the terrain's square surface
+                printMsg = "The terrain surface could not be trimmed to the circle of radius_. The square terrain surface (the same as for _type = 2) is used instead."
+                print printMsg
+                ghenv.Component.AddRuntimeMessage(Grasshopper.Kernel.GH_RuntimeMessageLevel.Warning, printMsg)
+    else:
+        terrainBrep = None
+    del zL
+    
+    
     # deleting
     #os.remove(rasterFilePath)  # downloaded .tif file
-    os.remove(rasterReprojectedFilePath)  # reprojected .tif file
-    del pts
     gc.collect()
     
-    return terrainMesh, terrainBrep, locationPt, elevationM
+    return terrainMesh, terrainBrep, locationPt, elevationM, elevationContours
 
 
 def colorMesh(terrainMesh):
@@ -798,10 +922,10 @@ def colorMesh(terrainMesh):
     return terrainMesh  # colored mesh
 
 
-def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin, standThickness, unitConversionFactor2):
+def cuttingRadius(unitConversionFactor2):
     
+    # radius of the circle (type_ = 1 and 3), or half of the side of the square (type_ = 0 and 2) to which the terrain is cut
     scaleFactor = 0.01  # scale terrainMesh 100 times (should never be changed), meaning 1 meter in real life is 0.01 meters in Rhino document
-    tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance
     
     #if (radius_ < (200/unitConversionFactor2)):
     if (radius_ < 200):
@@ -810,62 +934,19 @@ def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin,
     else:
         cuttingRadiusScaled = (radius_*0.9) / unitConversionFactor2 * scaleFactor  # 0.9 to avoid the cutting sphere getting out of the terrainMesh/terrainBrep edges
     
-    # always perform the cutting of either a mesh or surface regardless if type_ is 0,1,2,3
-    if (_type == 0) or (_type == 1):
-        # splitting of mesh
-        if (_type == 0):
-           # split with a cuboid
-            boxInterval = Rhino.Geometry.Interval(-cuttingRadiusScaled, cuttingRadiusScaled)
-            boxIntervalZ = Rhino.Geometry.Interval(-cuttingRadiusScaled*8, cuttingRadiusScaled*8)  # always use "8"
-            boxBrep = Rhino.Geometry.Box(Rhino.Geometry.Plane(locationPt, Rhino.Geometry.Vector3d(0,0,1)), boxInterval, boxInterval, boxIntervalZ).ToBrep()
-            boxMeshes = Rhino.Geometry.Mesh.CreateFromBrep(boxBrep)
-            boxMesh = Rhino.Geometry.Mesh();
-            for mesh in boxMeshes:
-                boxMesh.Append(mesh)
-            terrainMeshesSplitted = terrainMesh.Split(boxMesh)
-        
-        elif (_type == 1):
-            # split with a sphere
-            meshSphere = Rhino.Geometry.Mesh.CreateFromSphere(Rhino.Geometry.Sphere(locationPt, cuttingRadiusScaled), 48, 40)
-            terrainMeshesSplitted = terrainMesh.Split(meshSphere)
-    
-    
-    elif (_type == 2) or (_type == 3):
-        # splitting of surface
-        if (_type == 2):
-            # split with a cuboid
-            boxInterval = Rhino.Geometry.Interval(-cuttingRadiusScaled, cuttingRadiusScaled)
-            boxIntervalZ = Rhino.Geometry.Interval(-cuttingRadiusScaled*5, cuttingRadiusScaled*5)  # always use "5"
-            boxBrep = Rhino.Geometry.Box(Rhino.Geometry.Plane(locationPt, Rhino.Geometry.Vector3d(0,0,1)), boxInterval, boxInterval, boxIntervalZ).ToBrep()
-            terrainBrepsSplitted = terrainBrep.Split(boxBrep, tol/(1/scaleFactor))  # divide the "tol" with "1/scaleFactor" to account for the 100 times scalling in "title_scalingRotating" function
-        
-        elif (_type == 3):
-            # split with a sphere
-            brepSphere = Rhino.Geometry.Sphere(locationPt, cuttingRadiusScaled).ToBrep()
-            terrainBrepsSplitted = terrainBrep.Split(brepSphere, tol/(1/scaleFactor))  # divide the "tol" with "1/scaleFactor" to account for the 100 times scalling in "title_scalingRotating" function
-        
-        [splittedBrep.Faces.ShrinkFaces() for splittedBrep in terrainBrepsSplitted]
-        terrainMeshesSplitted = [Rhino.Geometry.Mesh.CreateFromBrep(splittedBrep)[0]  for splittedBrep in terrainBrepsSplitted]  # convert terrainBrepsSplitted to meshes for quicker calculation
-    
-    
-    # calculate the distance from projected centroids of the meshes from terrainMeshesSplitted to locationPt
-    tupleDistanceToLocationPtL = []
-    for i,splittedMesh in enumerate(terrainMeshesSplitted):
-        meshCentroid = Rhino.Geometry.AreaMassProperties.Compute(splittedMesh).Centroid
-        meshCentroid_closestPt = splittedMesh.ClosestPoint(meshCentroid)
-        distance = meshCentroid_closestPt.DistanceTo(locationPt)
-        tupleDistanceToLocationPt = (distance, i)
-        tupleDistanceToLocationPtL.append(tupleDistanceToLocationPt)
-    tupleDistanceToLocationPtL.sort()
+    return cuttingRadiusScaled
+
+
+def createStand_colorTerrain(terrainMesh, terrainBrep, origin, standThickness):
     
+    # terrainMesh and terrainBrep are already cut to the terrain's square or circle, on the grid
     if (_type == 0) or (_type == 1):
-        terrain_MeshOrBrep_Splitted = terrainMeshesSplitted[tupleDistanceToLocationPtL[0][1]]
-        terrainOutlines = [polyline.ToNurbsCurve() for polyline in terrain_MeshOrBrep_Splitted.GetNakedEdges()]
+        terrain_MeshOrBrep = terrainMesh
+        terrainOutlines = [polyline.ToNurbsCurve() for polyline in terrain_MeshOrBrep.GetNakedEdges()]
     elif (_type == 2) or (_type == 3):
-        terrain_MeshOrBrep_Splitted = terrainBrepsSplitted[tupleDistanceToLocationPtL[0][1]]
+        terrain_MeshOrBrep = terrainBrep
         nakedOnly = True
-        terrainOutlines = terrain_MeshOrBrep_Splitted.DuplicateEdgeCurves(nakedOnly)
-    
+        terrainOutlines = terrain_MeshOrBrep.DuplicateEdgeCurves(nakedOnly)
     
     
     # stand
@@ -874,19 +955,19 @@ def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin,
         # stand should not be created
         if (_type == 0) or (_type == 1):
             # just color the mesh
-            terrain_Mesh_colored = colorMesh(terrain_MeshOrBrep_Splitted)
+            terrain_Mesh_colored = colorMesh(terrain_MeshOrBrep)
             del terrainBrep
             
             return terrain_Mesh_colored
         elif (_type == 2) or (_type == 3):
             del terrainMesh
             
-            return terrain_MeshOrBrep_Splitted
+            return terrain_MeshOrBrep
     
     elif (standThickness > 0):
         # create stand
         accurate = True
-        terrainBB = terrain_MeshOrBrep_Splitted.GetBoundingBox(accurate)
+        terrainBB = terrain_MeshOrBrep.GetBoundingBox(accurate)
         lowestZcoordinatePt = terrainBB.Min  # point with the lowest Z coordinate
         terrainLowestVertexPlane = Rhino.Geometry.Plane(lowestZcoordinatePt, Rhino.Geometry.Vector3d(0,0,1))
         terrainLowestVertexPlane2 = Rhino.Geometry.Plane(terrainLowestVertexPlane.Origin, Rhino.Geometry.Vector3d(0,0,1))
@@ -904,7 +985,7 @@ def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin,
         
         if (_type == 2) or (_type == 3):
             # surface, no coloring should be performed
-            loftedTerrain_Outline_and_OutlineProjected_Brep__and__terrainOutlineProjected_Brep__and__terrain = Rhino.Geometry.Brep.JoinBreps([terrain_MeshOrBrep_Splitted, loftedTerrain_Outline_and_OutlineProjected_Brep, terrainOutlineProjected_Brep],0.001)[0]
+            loftedTerrain_Outline_and_OutlineProjected_Brep__and__terrainOutlineProjected_Brep__and__terrain = Rhino.Geometry.Brep.JoinBreps([terrain_MeshOrBrep, loftedTerrain_Outline_and_OutlineProjected_Brep, terrainOutlineProjected_Brep],0.001)[0]
             del terrainMesh
             
             return loftedTerrain_Outline_and_OutlineProjected_Brep__and__terrainOutlineProjected_Brep__and__terrain
@@ -933,7 +1014,7 @@ def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin,
             terrain_withStand = Rhino.Geometry.Mesh()  # for scaling of terrainShadingMask
             for meshMaskPart in loftedTerrain_Outline_and_OutlineProjected_Brep__and__terrainOutlineProjected_Brep_Mesh:
                 terrain_withStand.Append(meshMaskPart)
-            terrain_withStand.Append(terrain_MeshOrBrep_Splitted)
+            terrain_withStand.Append(terrain_MeshOrBrep)
             
             terrain_withStand_colored = colorMesh(terrain_withStand)
             del terrainBrep
@@ -941,36 +1022,52 @@ def split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin,
             return terrain_withStand_colored
 
 
-def createElevationContours(terrainUnoriginUnscaledUnrotated, numOfContours, _type):
-    
-    scaleFactor = 0.01
-    tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance
-    
-    # create intersection planes
-    accurate = True
-    terrainBB_edges = terrainUnoriginUnscaledUnrotated.GetBoundingBox(accurate).GetEdges()
-    terrainBB_verticalEdge = terrainBB_edges[8]  # "Rhino.Geometry.Line" type
-    includeEnds = False
-    terrainBB_edges_t_parameters = terrainBB_verticalEdge.ToNurbsCurve().DivideByCount(numOfContours, includeEnds)
-    elevationContours_planeOrigins = [Rhino.Geometry.Line.PointAt(terrainBB_verticalEdge, t)  for t in terrainBB_edges_t_parameters]
-    elevationContours_planes = [Rhino.Geometry.Plane(origin, Rhino.Geometry.Vector3d(0,0,1))  for origin in elevationContours_planeOrigins]
-    
-    if (_type == 0) or (_type == 1):
-        elevationContours_Polylines = list(Rhino.Geometry.Intersect.Intersection.MeshPlane(terrainUnoriginUnscaledUnrotated, elevationContours_planes))
-        elevationContours = [crv.ToNurbsCurve()  for crv in elevationContours_Polylines]  # curves
-    elif (_type == 2) or (_type == 3):
-        elevationContours = []
-        for plane in elevationContours_planes:
-            success, elevationContoursSubList, elevationContourPointsSubList = Rhino.Geometry.Intersect.Intersection.BrepPlane(terrainUnoriginUnscaledUnrotated, plane, tol/(1/scaleFactor))  # divide the "tol" with "1/scaleFactor" to account for the 100 times scalling in "title_scalingRotating" function
-            #elevationContoursSubList_closedCrvs = [crv  for crv in elevationContoursSubList  if crv.IsClosed] # remove elevationContours crvs which are not closed
-            elevationContoursSubList_closedCrvs = [crv  for crv in elevationContoursSubList]
-            if len(elevationContoursSubList_closedCrvs) > 0:  # or success == True
-                elevationContours.extend(elevationContoursSubList_closedCrvs)
+def createElevationContours(elevations, xL, yL, zFactor, cuttingRadiusScaled, numOfContours):
+    
+    # marching squares contours of the cut elevation grid (in meters)
+    numOfColumns = len(xL)
+    numOfRows = len(yL)
+    
+    # contour levels evenly divide the elevation range of the cut terrain
+    validElevationsL = []
+    for k,y in enumerate(yL):
+        rowElevations = elevations[k*numOfColumns:(k+1)*numOfColumns]
+        if (_type == 0) or (_type == 2):
+            # square
+            validElevationsL.extend([z for z in rowElevations if (z != None) and (z == z)])
+        elif (_type == 1) or (_type == 3):
+            # circle
+            validElevationsL.extend([z for x,z in zip(xL, rowElevations) if (z != None) and (z == z) and (x*x + y*y <= cuttingRadiusScaled*cuttingRadiusScaled)])
+    if len(validElevationsL) == 0:
+        return []
+    minElevation = min(validElevationsL)
+    maxElevation = max(validElevationsL)
+    del validElevationsL
+    levelsL = [minElevation + (maxElevation - minElevation) * i / float(numOfContours + 1) for i in xrange(1, numOfContours + 1)]
+    
+    contoursL = gismo_terrain.contourPolylines(elevations, numOfRows, numOfColumns, levelsL)
+    
+    def gridCoordinate(coordinatesL, indexF):
+        # fractional column or row index to Rhino document coordinate (the first and the last columns and rows of the cut grid can be narrower)
+        index = min(int(indexF), len(coordinatesL)-2)
+        return coordinatesL[index] + (coordinatesL[index+1] - coordinatesL[index])*(indexF - index)
+    
+    elevationContours = []
+    for level, pointsL in contoursL:
+        contourPtsL = [(gridCoordinate(xL, columnF), gridCoordinate(yL, rowF), level*zFactor)  for columnF,rowF in pointsL]
+        if (_type == 0) or (_type == 2):
+            contourPartsL = [contourPtsL]
+        elif (_type == 1) or (_type == 3):
+            # cut the contours to the terrain's circle
+            contourPartsL = gismo_terrain.clipPolylineToCircle(contourPtsL, 0, 0, cuttingRadiusScaled)
+        for contourPartPtsL in contourPartsL:
+            if len(contourPartPtsL) > 1:
+                elevationContours.append(Rhino.Geometry.PolylineCurve([Rhino.Geometry.Point3d(x,y,z)  for x,y,z in contourPartPtsL]))
     
     return elevationContours
 
 
-def title_scalingRotating(terrainUnoriginUnscaledUnrotated, locationName, locationLatitudeD, locationLongitudeD, locationPt, maxVisibilityRadiusM, _type, sourceLabel, origin, northDeg, northRad, numOfContours, unitConversionFactor):
+def title_scalingRotating(terrainUnoriginUnscaledUnrotated, elevationContours_UnoriginUnscaledUnrotated, locationName, locationLatitudeD, locationLongitudeD, locationPt, maxVisibilityRadiusM, _type, sourceLabel, origin, northDeg, northRad, unitConversionFactor):
     
     # scaling, rotating
     originTransformMatrix = Rhino.Geometry.Transform.PlaneToPlane(  Rhino.Geometry.Plane(locationPt, Rhino.Geometry.Vector3d(0,0,1)), Rhino.Geometry.Plane(origin, Rhino.Geometry.Vector3d(0,0,1)) )  # move the terrain from "locationPt" to "origin"
@@ -979,12 +1076,6 @@ def title_scalingRotating(terrainUnoriginUnscaledUnrotated, locationName, locati
     #transformMatrixRotate = Rhino.Geometry.Transform.Rotation(-northRad, Rhino.Geometry.Vector3d(0,0,1), origin)  # counter-clockwise
     rotateTransformMatrix = Rhino.Geometry.Transform.Rotation(northRad, Rhino.Geometry.Vector3d(0,0,1), origin)  # clockwise
     
-    if numOfContours_ > 0:
-        # create elevationContours
-        elevationContours_UnoriginUnscaledUnrotated = createElevationContours(terrainUnoriginUnscaledUnrotated, numOfContours, _type)
-    else:
-        # no elevationContours will be created
-        elevationContours_UnoriginUnscaledUnrotated = []
     geometry = [terrainUnoriginUnscaledUnrotated] + elevationContours_UnoriginUnscaledUnrotated
     for g in geometry:
         if g != None:  # exclude the elevationContours which are invalid (equal to None)
@@ -1032,7 +1123,7 @@ def bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, maxVisib
     groupIndex2 = gismo_preparation.groupGeometry(layerName + "_terrainGenerator", geometryIds2)
 
 
-def printOutput(northDeg, latitude, longitude, locationName, maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, workingSubFolderPath, standThickness, numOfContours):
+def printOutput(northDeg, latitude, longitude, locationName, maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, workingSubFolderPath, standThickness, numOfContours, maxError):
     if bakeIt_ == True:
         bakedOrNot = "and baked "
     elif bakeIt_ == False:
@@ -1053,9 +1144,10 @@ Type: %s (%s)
 Origin: %s
 Stand thickness (rhino doc. units): %s
 Number of elevation contours: %s
+Maximal terrain mesh error (m): %s
 
 Working folder: %s
-    """ % (locationName, latitude, longitude, northDeg, maxVisibilityRadiusM, source, sourceLabel, _type, typeLabel, origin, standThickness, numOfContours, workingSubFolderPath)
+    """ % (locationName, latitude, longitude, northDeg, maxVisibilityRadiusM, source, sourceLabel, _type, typeLabel, origin, standThickness, numOfContours, maxError, workingSubFolderPath)
     print resultsCompletedMsg
     print printOutputMsg
 
@@ -1068,22 +1160,25 @@ if sc.sticky.has_key("gismoGismo_released"):
         gismo_preparation = sc.sticky["gismo_Preparation"]()
         gismo_geometry = sc.sticky["gismo_CreateGeometry"]()
         gismo_gis = sc.sticky["gismo_GIS"]()
+        gismo_terrain = sc.sticky["gismo_Terrain"]()
+        gismo_geoTiff = sc.sticky["gismo_GeoTiff"]
+        gismo_demTileCache = sc.sticky["gismo_DEMTileCache"]
         
         locationName, locationLatitudeD, locationLongitudeD, timeZone, elevation, validLocationData, printMsg = gismo_preparation.checkLocationData(_location)
         if validLocationData:
             fileNameIncomplete = locationName + "_" + str(locationLatitudeD) + "_" + str(locationLongitudeD) + "_TERRAIN"  # incomplete due to missing "_visibility=2KM_source=AW3D30" part (for example)
             heightM = 0; minVisibilityRadiusM = 0; maskStyle = 0; maskStyleLabel = "sph"; downloadUrl_ = None; downloadTSVLink = None;   gridSize_ = 10  # dummy value
-            maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg = checkInputData(locationLatitudeD, radius_, gridSize_, source_, type_, origin_, north_, standThickness_, numOfContours_, downloadTSVLink)
+            maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, northRad, northDeg, standThickness, numOfContours, maxError, workingSubFolderPath, downloadTSVLink, unitConversionFactor, unitConversionFactor2, validInputData, printMsg = checkInputData(locationLatitudeD, radius_, gridSize_, source_, type_, origin_, north_, standThickness_, numOfContours_, maxError_, downloadTSVLink)
             if validInputData:
                 if _runIt:
                     terrainShadingMaskUnscaledUnrotated, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterReprojectedFileNamePlusExtension, vrtFilePath, elevationM, valid_Obj_or_Raster_file, printMsg = checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyleLabel, source, sourceLabel)
                     if valid_Obj_or_Raster_file:
                         if (rasterFilePath != "needless") and (rasterFilePath != "download failed"):  # terrain shading mask NEEDS to be created
-                            terrainMesh, terrainBrep, locationPt, elevationM = createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, maxVisibilityRadiusM, unitConversionFactor2)
-                            terrainUnoriginUnscaledUnrotated = split_createStand_colorTerrain(terrainMesh, terrainBrep, locationPt, origin, standThickness, unitConversionFactor2)
-                        terrain, title, elevationContours = title_scalingRotating(terrainUnoriginUnscaledUnrotated, locationName, locationLatitudeD, locationLongitudeD, locationPt, maxVisibilityRadiusM, _type, sourceLabel, origin, northDeg, northRad, numOfContours, unitConversionFactor)
+                            terrainMesh, terrainBrep, locationPt, elevationM, elevationContours = createTerrainMeshBrep(rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, maxVisibilityRadiusM, maxError, numOfContours, unitConversionFactor2)
+                            terrainUnoriginUnscaledUnrotated = createStand_colorTerrain(terrainMesh, terrainBrep, origin, standThickness)
+                        terrain, title, elevationContours = title_scalingRotating(terrainUnoriginUnscaledUnrotated, elevationContours, locationName, locationLatitudeD, locationLongitudeD, locationPt, maxVisibilityRadiusM, _type, sourceLabel, origin, northDeg, northRad, unitConversionFactor)
                         if bakeIt_: bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, maxVisibilityRadiusM, sourceLabel, typeLabel, standThickness, terrain, title, elevationContours, origin)
-                        printOutput(northDeg, locationLatitudeD, locationLongitudeD, locationName, maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, workingSubFolderPath, standThickness, numOfContours)
+                        printOutput(northDeg, locationLatitudeD, locationLongitudeD, locationName, maxVisibilityRadiusM, gridSize, source, sourceLabel, _type, typeLabel, origin, workingSubFolderPath, standThickness, numOfContours, maxError)
                         elevation = elevationM
                     else:
                         print printMsg
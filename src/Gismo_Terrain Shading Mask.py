@@ -80,10 +80,7 @@ Provided by Gismo 0.0.3
                     0 - spherical terrain shading mask - the terrain shading mask "is cut" from a half sphere.
                     1 - extruded (vertical) terrain shading mask - the terrain shading mask "is cut" from a cylinder.
                     -
-                    !!! NOTICE !!!   Changing maskStyle_ input will result in reruning the component from the very start, and creating a new Terrain shading mask. This can be time consuming.
-                    It could be better, in order to see how extruded(1) maskStyle_ looks like, to lower the value of the maxVisibilityRadius_ input to 10, for example.
-                    In this way, the time needed for reruning the component and creating a new Terrain shading mask will vastly be reduced.
-                    Once you see the effect of extruded maskStyle_, in case you prefer it over the spherical(0) maskStyle_, simply edit the maxVisibilityRadius_ input to the value it had before you lowered it to 10.
+                    Both mask styles are created from the same horizon profile. Once the horizon profile for the _location has been created, changing the maskStyle_ input will not require the terrain to be analysed again.
                     -
                     If not supplied, 0 will be used as a default (spherical terrain shading mask).
         workingFolder_: Folder path where downloaded and created terrain shading mask files will be located.
@@ -91,7 +88,29 @@ Provided by Gismo 0.0.3
                         This component may download topography files up to 600 MB in size from the Internet, and then create the Terrain shading masks from them.
                         Make sure that the "workingFolder_" you choose is a hard disk partition with enough space on it.
                         -
+                        Horizon profiles (one elevation angle per azimuth) of all created Terrain shading masks are kept in the "horizon_profiles" subfolder, from which the masks are recreated when the component is run again. Least recently used horizon profiles are deleted once the subfolder exceeds 50 MB.
+                        -
                         If not supplied, the default Gismo folder path will be used: "c:\gismo\terrain_shading_masks".
+        rayTolerance_: Angular tolerance of the terrain silhouette, used while shooting the rays from the _location towards the sky dome.
+                       -
+                       For each of the 3600 azimuths, the rays are shot from the zenith downward (or around the silhouette of the neighbouring azimuth) until the terrain silhouette is found. The transition between the rays which hit the terrain and the ones which did not is then bisected until it is narrower than rayTolerance_.
+                       This requires up to a hundred times less rays than shooting all 1200 rays per each azimuth. The number of shot rays and the time needed are printed in the "readMe!" output.
+                       Set it to 0 to shoot all 1200 rays per each azimuth (exhaustive scan).
+                       -
+                       !!! NOTICE !!!   Already created Terrain shading masks will not be recreated when this input is changed.
+                       -
+                       If not supplied, the default value of 0.075 degrees (vertical spacing of the rays) will be used.
+                       -
+                       In degrees.
+        parallel_: Set to "True" to shoot the rays on all processor cores at the same time.
+                   The 3600 azimuths are split into 72 sectors, which are then processed in parallel. The rays of the terrain shading mask radius search (when "context_" is supplied) are shot in parallel as well. The results are the same as with "False".
+                   -
+                   If not supplied default value "False" will be used.
+        benchmark_: Set to "True" to shoot the rays twice: with the rayTolerance_ input, and with all 1200 rays per each azimuth (exhaustive scan).
+                    The number of shot rays and the time needed by each of the two scans, and the differences between their horizon profiles are then printed in the "readMe!" output.
+                    The created Terrain shading mask is always the one of the rayTolerance_ input.
+                    -
+                    If not supplied default value "False" will be used.
         downloadUrl_: Address of a web page which contains download links of already created Terrain shading masks.
                       -
                       This component downloads a topography data first, then creates a terrain model from it, and in the end creates a Terrain shading mask.
@@ -152,6 +171,7 @@ ghenv.Component.IconDisplayMode = ghenv.Component.IconDisplayMode.application
 ghenv.Component.Category = "Gismo"
 ghenv.Component.SubCategory = "2 | Terrain"
 #compatibleGismoVersion = VER 0.0.3\nJAN_29_2019
+#requiresGismoKernels
 try: ghenv.Component.AdditionalHelpFromDocStrings = "2"
 except: pass
 
@@ -169,7 +189,7 @@ import os
 import gc
 
 
-def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyle, workingFolderPath, downloadTSVLink):
+def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyle, workingFolderPath, downloadTSVLink, rayToleranceD):
     
     # check if MapWinGIS is properly installed
     gismoGismoComponentNotRan = False  # initial value
@@ -177,8 +197,8 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         mapFolder_ = sc.sticky["gismo_mapwingisFolder"]
         iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, validInputData, printMsg = gismo_mainComponent.mapWinGIS(mapFolder_)
         if not validInputData:
-            heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
-            return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+            heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
+            return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
         if sc.sticky.has_key("MapWinGIS"):
             global MapWinGIS
             import MapWinGIS
@@ -188,10 +208,10 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         gismoGismoComponentNotRan = True
     
     if (gismoGismoComponentNotRan == True):
-        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
         validInputData = False
         printMsg = "The \"Gismo Gismo\" component has not been run. Run it before running this component."
-        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
     
     
     
@@ -212,17 +232,17 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         print "minVisibilityRadius_ input only supports values equal or larger than 0 kilometer.\n" + \
               "minVisibilityRadius_ input set to 0 kilometer."
     elif (minVisibilityRadiusKM > 10):
-        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
         validInputData = False
         printMsg = "minVisibilityRadius_ values longer than 10 are not supported.\n" + \
                    "Please set the minVisibilityRadius_ to some value from 0 to 10 (0 being recommended unless you are doing an analysis of big parts of a city)."
-        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
     if (3 * minVisibilityRadiusKM > maxVisibilityRadiusKM):
-        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
         validInputData = False
         printMsg = "minVisibilityRadius_ value can not be longer than one third of maxVisibilityRadius_.\n" + \
                    "Please set the minVisibilityRadius_ to some value from 0 to 10 so that the minVisibilityRadius_ is equal or less than 0.3*maxVisibilityRadius_."
-        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
     minVisibilityRadiusKM_rounded = round(minVisibilityRadiusKM,1)  # round the "minVisibilityRadius_" input to 0.1 value
     minVisibilityRadiusM = minVisibilityRadiusKM_rounded * 1000  # convert to meters
     
@@ -236,7 +256,7 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         print "maxVisibilityRadius_ input only supports values equal or larger than 1 kilometer.\n" + \
               "maxVisibilityRadius_ input set to 1 kilometer."
     elif (maxVisibilityRadiusKM > 400):
-        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = iteropMapWinGIS_dll_folderPath = gdalDataPath_folderPath = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
         validInputData = False
         printMsg = "Radii longer than 400 are not supported, due to the following reason:\n" + \
                    "The longest recorded horizontal visibility distance (which is the maxVisibilityRadius_ in our case) during daylight is 388 km.\n" + \
@@ -248,7 +268,7 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
                    "ATTENTION!!! Have in mind that even radii above 100 km may require stronger PC configurations and 64 bit version of Rhino 5. Otherwise Rhino 5 may crash.\n" + \
                    "If this happens (Rhino 5 crashes) get back to the \"maxVisibilityRadius_\" input of 100."
         
-        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
     maxVisibilityRadiusM = maxVisibilityRadiusKM * 1000  # convert to meters
     #arcAngleD = math.degrees( math.atan( maxVisibilityRadiusM / (6371000+elevation) ) )  # assumption of Earth being a sphere
     #arcLength = (arcAngleD*math.pi*R)/180
@@ -262,10 +282,10 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         try:  # check if it's a number
             north = float(north)
             if north < 0 or north > 360:
-                heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+                heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
                 validInputData = False
                 printMsg = "Please input north angle value from 0 to 360."
-                return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, GDAL_librariesFolderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+                return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, GDAL_librariesFolderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
         except Exception, e:  # check if it's a vector
             north.Unitize()
         
@@ -294,16 +314,23 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
         workingSubFolderPath = os.path.join(workingFolderPath, "terrain_shading_masks")
     folderCreated = gismo_preparation.createFolder(workingSubFolderPath)
     if folderCreated == False:
-        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = workingSubFolderPath = downloadTSVLink = unitConversionFactor = None
+        heightM = minVisibilityRadiusM = maxVisibilityRadiusM = northRad = northVec = maskStyle = maskStyleLabel = workingSubFolderPath = downloadTSVLink = rayToleranceD = unitConversionFactor = None
         validInputData = False
         printMsg = "workingFolder_ input is invalid.\n" + \
                    "Input the string in the following format (example): c:\someFolder.\n" + \
                    "Or do not input anything, in which case a default Gismo folder will be used instead: \"c:\gismo\\terrain_shading_masks\"."
-        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+        return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
     
     if downloadTSVLink == None:
         downloadTSVLink = "https://raw.githubusercontent.com/stgeorges/terrainShadingMask/master/objFiles/0_terrain_shading_masks_download_links.tsv"
     
+    if (rayToleranceD == None):
+        rayToleranceD = 0.075  # default in degrees, equal to the vertical spacing of the rays
+    elif (rayToleranceD < 0):
+        rayToleranceD = 0.075
+        print "rayTolerance_ input only supports values equal or larger than 0 degrees.\n" + \
+              "rayTolerance_ input set to 0.075 degrees."
+    
     #unitConversionFactor, unitSystemLabel = gismo_preparation.checkUnits()  # factor to convert Rhino document units to meters.
     unitConversionFactor = 1  # unitConversionFactor is always fixed to "1" to avoid problems when .obj files are exported from Rhino document (session) in one Units, and then imported in some other Rhino document (session) with different Units
     
@@ -311,7 +338,7 @@ def checkInputData(minVisibilityRadiusKM, maxVisibilityRadiusKM, north, maskStyl
     validInputData = True
     printMsg = "ok"
     
-    return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg
+    return heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg
 
 
 def distanceBetweenTwoPoints(latitude1D, longitude1D, maxVisibilityRadiusM):
@@ -495,7 +522,7 @@ def import_export_origin_0_0_0_and_terrainShadingMask_from_objFile(importExportO
         return terrainShadingMask, origin_0_0_0
 
 
-def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyleLabel):
+def checkObjRasterFile(horizonProfiles, fileNameIncomplete, workingSubFolderPath, downloadTSVLink, locationLatitudeD, locationLongitudeD, demSource, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, maskStyleLabel, unitConversionFactor):
     
     # convert the float to integer if minVisibilityRadiusM == 0 (to avoid "0.0" in the .obj fileName)
     if minVisibilityRadiusM == 0:
@@ -508,17 +535,24 @@ def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink
     objFileNamePlusExtension = fileName + "_" + maskStyleLabel + ".obj"
     rasterFileNamePlusExtension = fileName2 + ".tif"
     rasterReprojectedFileNamePlusExtension = fileName2 + "_reprojected" + ".tif"
-    rasterTranslatedFileNamePlusExtension = fileName2 + "_translated" + ".tif"
     tsvFileNamePlusExtension = "0_terrain_shading_masks_download_links" + ".tsv"
     
     objFilePath = os.path.join(workingSubFolderPath, objFileNamePlusExtension)
     rasterFilePath = os.path.join(workingSubFolderPath, rasterFileNamePlusExtension)
     rasterReprojectedFilePath = os.path.join(workingSubFolderPath, rasterReprojectedFileNamePlusExtension)
-    rasterTranslatedFilePath = os.path.join(workingSubFolderPath, rasterTranslatedFileNamePlusExtension)
     tsvFilePath = os.path.join(workingSubFolderPath, tsvFileNamePlusExtension)
     
     
-    # chronology labels:  I, II, 1, 2, A, B, a, b
+    # chronology labels:  0, I, II, 1, 2, A, B, a, b
+    
+    ##### 0) check if the horizon profile has already been created (it is the same for both maskStyle_ values). Recreate the mask from it
+    elevationM, profileAnglesR = horizonProfiles.read(locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, demSource)
+    if profileAnglesR != None:
+        terrainShadingMask, origin_0_0_0 = terrainShadingMaskFromProfile(profileAnglesR, maskStyle, unitConversionFactor)
+        rasterFilePath = "needless"
+        valid_Obj_or_Raster_file = True
+        printMsg = "ok"
+        return terrainShadingMask, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, elevationM, valid_Obj_or_Raster_file, printMsg
     
     ##### I) check if .obj file exist:
     objFileAlreadyExists = os.path.exists(objFilePath)
@@ -649,14 +683,26 @@ def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink
                     # (correctedMaskRadiusM >= maxVisibilityRadiusM)
                     # generate download link for raster region
                     latitudeTopD, dummyLongitudeTopD, latitudeBottomD, dummyLongitudeBottomD, dummyLatitudeLeftD, longitudeLeftD, dummyLatitudeRightD, longitudeRightD = gismo_gis.destinationLatLon(locationLatitudeD, locationLongitudeD, correctedMaskRadiusM)
-                    # based on: http://www.opentopography.org/developers
-                    #downloadRasterLink_withCorrectedMaskRadiusKM = "http://opentopo.sdsc.edu/otr/getdem?demtype=SRTMGL3&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (longitudeLeftD,latitudeBottomD,longitudeRightD,latitudeTopD)  # 3 arc-second SRTMGL3 (old link)
-                    downloadRasterLink_withCorrectedMaskRadiusKM = "https://portal.opentopography.org/API/globaldem?demtype=SRTMGL3&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD)  # 3 arc-second SRTMGL3 (new link)
+                    downloadRasterLink_withCorrectedMaskRadiusKM = rasterDownloadLink(latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD, demSource)
                     
                     # new rasterFileNamePlusExtension and rasterFilePath corrected according to new correctedMaskRadiusM
                     rasterFileNamePlusExtension_withCorrectedMaskRadiusKM = fileNameIncomplete + "_visibility=" + str(int(maxVisibilityRadiusM/1000)) + "KM" + ".tif"  # rasterFileNamePlusExtension_withCorrectedMaskRadiusKM will always be used instead of rasterFilePath from line 647 !!!
                     rasterFilePath_withCorrectedMaskRadiusKM = os.path.join(workingSubFolderPath, rasterFileNamePlusExtension_withCorrectedMaskRadiusKM)
-                    tifFileDownloaded = gismo_preparation.downloadFile(downloadRasterLink_withCorrectedMaskRadiusKM, rasterFilePath_withCorrectedMaskRadiusKM)
+                    
+                    # mosaic the raster from the 1x1 degree tiles cached in the "dem_tiles" folder (shared by all locations and visibility radii). Only the missing tiles are downloaded
+                    demTilesFolderPath = os.path.join(os.path.dirname(workingSubFolderPath), "dem_tiles")
+                    tifFileDownloaded = False
+                    if gismo_preparation.createFolder(demTilesFolderPath):
+                        demTileCache = gismo_demTileCache(demTilesFolderPath)
+                        try:
+                            tifFileDownloaded = demTileCache.mosaic(demSource, latitudeBottomD, latitudeTopD, longitudeLeftD, longitudeRightD, rasterFilePath_withCorrectedMaskRadiusKM, lambda south, north, west, east: rasterDownloadLink(south, north, west, east, demSource), gismo_preparation.downloadFile)
+                        except (IOError, OSError, ValueError), e:
+                            # a tile could not be written, or a cached tile is not a valid GeoTIFF file
+                            print "The DEM tiles could not be mosaicked (%s). The raster of the whole region will be downloaded instead." % e
+                            tifFileDownloaded = False
+                    if not tifFileDownloaded:
+                        # the tiles could not be downloaded or read: download the raster of the whole region
+                        tifFileDownloaded = gismo_preparation.downloadFile(downloadRasterLink_withCorrectedMaskRadiusKM, rasterFilePath_withCorrectedMaskRadiusKM)
                     if tifFileDownloaded:
                         terrainShadingMask = origin_0_0_0 = None
                         valid_Obj_or_Raster_file = True
@@ -683,110 +729,272 @@ def checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink
                     #printMsg - from distanceBetweenTwoPoints function
     
     
-    return terrainShadingMask, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterTranslatedFilePath, elevationM, valid_Obj_or_Raster_file, printMsg
+    return terrainShadingMask, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, elevationM, valid_Obj_or_Raster_file, printMsg
 
 
-def ptZcorrectedHeight(locationPt, meshPt, scaleFactor):
-    # Correcting mesh vertices for Earth's curvature and refraction  
+def ptsZcorrectedHeights(elevationsRow, xSquaredL, ySquared, scaleFactor):
+    # Correcting a row of mesh vertices for Earth's curvature and refraction: 0.0675 * distanceKM^2 meters
     # source: "Surveying And Levelling" second edition, N.N. Basak, McGraw Hill Education (India) Private Limited, p161
+    # xSquaredL and ySquared are the squared X, Y coordinates of the vertices (in scaled Rhino units, origin_0_0_0 being the location). Returns scaled Z coordinates (None for no elevation data)
+    
+    curvatureFactor = 0.0675 / ((scaleFactor*1000)**2)  # distanceKM = distance/scaleFactor/1000
+    ptsZ = [None if ptZ == None else (ptZ - curvatureFactor*(xSquared+ySquared))*scaleFactor for ptZ,xSquared in zip(elevationsRow, xSquaredL)]
+    
+    return ptsZ
+
+
+def terrainShadingMaskFromProfile(profileAnglesR, maskStyle, unitConversionFactor):
+    # create the terrain shading mask from the horizon profile: elevation angles of equally spaced azimuths, starting from the X axis counterclockwise
     
-    meshPtDistanceFromOriginMeters = locationPt.DistanceTo(meshPt)  # in Rhino units (meters if Rhino document is set to meters)
-    meshPtDistanceFromOriginMeters = meshPtDistanceFromOriginMeters/scaleFactor
-    meshPtDistanceFromOriginKM = meshPtDistanceFromOriginMeters/1000  # in km
-    ptZCorrection = (0.0675 * (meshPtDistanceFromOriginKM**2))  # refraction and curvature correction (in meters)
+    origin_0_0_0 = Rhino.Geometry.Point3d(0,0,0)  # the terrain shading mask is always centered to 0,0,0 point
     
-    return ptZCorrection
+    # create skyDome
+    skyDomeRadius = 200 / unitConversionFactor  # in meters
+    skyDomeSphere = Rhino.Geometry.Sphere(origin_0_0_0, skyDomeRadius)
+    skyDomeSrf = skyDomeSphere.ToBrep().Faces[0]
+    halvedSkyDomeSrf = skyDomeSrf.Trim(Rhino.Geometry.Interval(skyDomeSrf.Domain(0)[0], skyDomeSrf.Domain(0)[1]), Rhino.Geometry.Interval(0, skyDomeSrf.Domain(1)[1])) # split the skyDome sphere in half
+    halvedSkyDomeSrf.SetDomain(1, Rhino.Geometry.Interval(0, halvedSkyDomeSrf.Domain(1)[1]))  # shrink the halvedSkyDomeSrf V start domain
+    skyDomeDomainUmin, skyDomeDomainUmax = halvedSkyDomeSrf.Domain(0)
+    stepU = (skyDomeDomainUmax - skyDomeDomainUmin)/len(profileAnglesR)
+    
+    lastRowPoints = [halvedSkyDomeSrf.PointAt(skyDomeDomainUmin + stepU*i, profileAngleR) for i,profileAngleR in enumerate(profileAnglesR)]
+    lines = [Rhino.Geometry.Line(origin_0_0_0, lastRowPt).ToNurbsCurve() for lastRowPt in lastRowPoints]
+    
+    tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance
+    if maskStyle == 0:  # spherical terrain shading mask
+        loftType = Rhino.Geometry.LoftType.Loose
+        loftedLinesBrep = Rhino.Geometry.Brep.CreateFromLoft(lines, Rhino.Geometry.Point3d.Unset, Rhino.Geometry.Point3d.Unset, loftType, True)[0]
+        loftedLinesSrf = loftedLinesBrep.Faces[0]
+        extendedLoftedLinesSrf = loftedLinesSrf.Extend(Rhino.Geometry.IsoStatus.North, skyDomeRadius, False)
+        splittedHalvedSkyDomeSrfs = halvedSkyDomeSrf.ToBrep().Split(extendedLoftedLinesSrf.ToBrep(), tol)[:-1]
+        shadingMaskBreps = splittedHalvedSkyDomeSrfs
+    elif maskStyle == 1:  # extruded (vertical) terrain shading mask
+        curveLastRowPoints = Rhino.Geometry.Curve.CreateControlPointCurve(lastRowPoints+[lastRowPoints[0]], 3)
+        extrudedShadingMaskSrf = Rhino.Geometry.Surface.CreateExtrusion(curveLastRowPoints, Rhino.Geometry.Vector3d(0,0,-skyDomeRadius)).ToBrep()
+        shadingMaskBreps = extrudedShadingMaskSrf.Trim(Rhino.Geometry.Plane(origin_0_0_0, Rhino.Geometry.Vector3d(0,0,-1)), tol)
+    [brep.Faces.ShrinkFaces() for brep in shadingMaskBreps]  # shrinking the breps in-place
+    
+    
+    if len(shadingMaskBreps) == 0:
+        # no intersection between rays and mesh
+        terrainShadingMaskUnscaledUnrotated = None
+        level = Grasshopper.Kernel.GH_RuntimeMessageLevel.Warning
+        printMsg = "There is no shading from terrain. This could be due to two reasons:\n" + \
+                   " \n" + \
+                   "1) There really is no shading from the surrounding terrain: For example, you chose your _location to be on a peak point of an island, without any terrain or islands around it.\n" + \
+                   "2) There might be shading from a terrain, but the \"maxVisibilityRadius_\" you inputted is too short to show this. Try increasing the size of the \"maxVisibilityRadius_\"."
+        ghenv.Component.AddRuntimeMessage(level, printMsg)
+        print printMsg
+    else:
+        # there is an intersection between rays and mesh
+        terrainShadingMaskUnscaledUnrotated = Rhino.Geometry.Brep.MergeBreps(shadingMaskBreps, tol)  # merge the shadingMaskBreps into a single brep
+    
+    return terrainShadingMaskUnscaledUnrotated, origin_0_0_0
+
+
+def rasterDownloadLink(south, north, west, east, demSource):
+    
+    # download link of the raster region (in degrees), for the "demSource" global DEM (OpenTopography "demtype")
+    # based on: http://www.opentopography.org/developers
+    #downloadRasterLink = "http://opentopo.sdsc.edu/otr/getdem?demtype=SRTMGL3&west=%s&south=%s&east=%s&north=%s&outputFormat=GTiff" % (west,south,east,north)  # 3 arc-second SRTMGL3 (old link)
+    downloadRasterLink = "https://portal.opentopography.org/API/globaldem?demtype={}&south={}&north={}&west={}&east={}&outputFormat=GTiff".format(demSource, south, north, west, east)  # new link
+    
+    return downloadRasterLink
+
+
+def terrainMeshFromElevationPyramid(pyramidL, startX, startY, cellSize, baseBandRadius, scaleFactor):
+    # create the terrainMesh (centered to 0,0,0 point) from distance bands: the full resolution elevation grid is used up to baseBandRadius, and each next band (twice as wide as the previous one) uses twice as coarse pyramid level
+    # quads of the neighbouring bands overlap a bit, so that there are no gaps between the bands
+    # pyramid levels are ElevationTiles files, and only the window of each level covering its band is read
+    
+    verticesL = []
+    facesL = []
+    for level,levelTiles in enumerate(pyramidL):
+        blockSize = 2**level  # number of the full resolution cells in a single level cell, in each direction
+        levelCellSize = cellSize*blockSize
+        levelStartX = startX + cellSize*(blockSize-1)/2.0  # center of the first block of cells
+        levelStartY = startY - cellSize*(blockSize-1)/2.0
+        numOfRows = levelTiles.numOfRows
+        numOfColumns = levelTiles.numOfColumns
+        
+        if level == 0:
+            bandInnerRadius = 0
+        else:
+            bandInnerRadius = baseBandRadius * 2**(level-1)
+        if level < len(pyramidL)-1:
+            bandOuterRadius = baseBandRadius * 2**level
+            # only the rows and columns within the bandOuterRadius
+            rowStart = max(0, int(math.floor((levelStartY-bandOuterRadius)/levelCellSize)))
+            rowEnd = min(numOfRows-1, int(math.ceil((levelStartY+bandOuterRadius)/levelCellSize)))
+            columnStart = max(0, int(math.floor((-bandOuterRadius-levelStartX)/levelCellSize)))
+            columnEnd = min(numOfColumns-1, int(math.ceil((bandOuterRadius-levelStartX)/levelCellSize)))
+        else:
+            # the last band covers the rest of the grid
+            bandOuterRadius = None
+            rowStart = columnStart = 0
+            rowEnd = numOfRows-1
+            columnEnd = numOfColumns-1
+        
+        # vertices of the level's window of rows and columns, corrected for Earth's curvature and refraction row by row
+        windowLL = levelTiles.readWindow(rowStart, columnStart, rowEnd-rowStart+1, columnEnd-columnStart+1)
+        xL = [levelStartX + c*levelCellSize for c in xrange(columnStart, columnEnd+1)]
+        xSquaredL = [x*x for x in xL]
+        yL = []
+        ptsZLL = []
+        for r in xrange(rowStart, rowEnd+1):
+            y = levelStartY - r*levelCellSize
+            yL.append(y)
+            ptsZLL.append(ptsZcorrectedHeights(windowLL[r-rowStart], xSquaredL, y*y, scaleFactor))
+        del windowLL
+        windowNumOfColumns = len(xL)
+        vertexIndices = [-1] * (len(yL)*windowNumOfColumns)  # window vertex: verticesL index
+        
+        for i in xrange(len(yL)-1):
+            for j in xrange(windowNumOfColumns-1):
+                # quad with its upper left vertex at window row i, column j. Check its closest and farthest distance from the origin_0_0_0
+                quadLeftX = xL[j];  quadRightX = xL[j+1]
+                quadTopY = yL[i];  quadBottomY = yL[i+1]
+                quadMinDistance = math.hypot(min(max(0, quadLeftX), quadRightX), min(max(0, quadBottomY), quadTopY))
+                quadMaxDistance = math.hypot(max(abs(quadLeftX), abs(quadRightX)), max(abs(quadTopY), abs(quadBottomY)))
+                if (quadMaxDistance < bandInnerRadius) or ((bandOuterRadius != None) and (quadMinDistance >= bandOuterRadius)):
+                    continue
+                
+                quadCorners = ((i,j), (i+1,j), (i+1,j+1), (i,j+1))
+                if None in [ptsZLL[r][c] for r,c in quadCorners]:
+                    # no elevation data
+                    continue
+                faceIndices = []
+                for r,c in quadCorners:
+                    windowIndex = r*windowNumOfColumns + c
+                    if vertexIndices[windowIndex] == -1:
+                        vertexIndices[windowIndex] = len(verticesL)
+                        verticesL.append((xL[c], yL[r], ptsZLL[r][c]))
+                    faceIndices.append(vertexIndices[windowIndex])
+                facesL.append(faceIndices)
+    
+    # add vertices and faces to the terrainMesh in bulk
+    terrainMesh = gismo_geometry.meshFromArrays(verticesL, facesL)
+    
+    return terrainMesh
 
 
-def createTerrainShadingMask(objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterTranslatedFilePath, locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, context, unitConversionFactor):
+def createTerrainShadingMask(horizonProfiles, demSource, rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, rayToleranceD, benchmark, parallel, context, unitConversionFactor):
     
     # output crs data: outputCRS_UTMzone, northOrsouth
     CRS_EPSG_code, outputCRS_UTMzone, northOrsouth = gismo_gis.calculate_CRS_UTMzone(locationLatitudeD, locationLongitudeD)
     
-    # reproject raster
-    utils = MapWinGIS.UtilsClass()
-    resamplingMethod = "-r bilinear"
-    bstrOptions = '-s_srs EPSG:4326 -t_srs "+proj=utm +zone=%s +%s +datum=WGS84 +ellps=WGS84" %s' % (outputCRS_UTMzone, northOrsouth, resamplingMethod)
-    reprojectGridResult = MapWinGIS.UtilsClass.GDALWarp(utils, rasterFilePath, rasterReprojectedFilePath, bstrOptions, None)
-    if (reprojectGridResult != True):
-        convertErrorNo = MapWinGIS.GlobalSettingsClass().GdalLastErrorNo
-        convertErrorMsg = MapWinGIS.GlobalSettingsClass().GdalLastErrorMsg
-        convertErrorType = MapWinGIS.GlobalSettingsClass().GdalLastErrorType
-        print "convertErrorNo: ", convertErrorNo
-        print "convertErrorMsg: ", convertErrorMsg
-        print "convertErrorType: ", convertErrorType
-    
-    # resample the raster to 50 size%
-    utils2 = MapWinGIS.UtilsClass()
-    bstrOptions2 = "-outsize 50% 50%"
-    translateGridResult = MapWinGIS.UtilsClass.TranslateRaster(utils2, rasterReprojectedFilePath, rasterTranslatedFilePath, bstrOptions2, None)
-    if (translateGridResult != True):
-        convertErrorNo = MapWinGIS.GlobalSettingsClass().GdalLastErrorNo
-        convertErrorMsg = MapWinGIS.GlobalSettingsClass().GdalLastErrorMsg
-        convertErrorType = MapWinGIS.GlobalSettingsClass().GdalLastErrorType
-        print "convertErrorNo: ", convertErrorNo
-        print "convertErrorMsg: ", convertErrorMsg
-        print "convertErrorType: ", convertErrorType
-    
-    # open the reprojected raster
-    grid = MapWinGIS.GridClass()
-    dataType = MapWinGIS.GridDataType.DoubleDataType
-    fileTypeExtension = MapWinGIS.GridFileType.UseExtension
-    inRam = True
-    #openGridSuccess = MapWinGIS.GridClass.Open(grid, rasterReprojectedFilePath, dataType, inRam, fileTypeExtension, None)
-    openGridSuccess = MapWinGIS.GridClass.Open(grid, rasterTranslatedFilePath, dataType, inRam, fileTypeExtension, None)
-    if (openGridSuccess != True):
-        gridErrorMsg = grid.ErrorMsg
-        print "gridErrorMsg: ", gridErrorMsg
-    
-    # numOfRows, numOfColumns, cellsizeX, cellsizeY
-    header = grid.Header
-    numOfRows = header.NumberRows
-    numOfColumns = header.NumberCols
-    numOfCellsInX = numOfColumns
-    numOfCellsInY = numOfRows
-    cellsizeX = header.dX
-    cellsizeY = header.dY
-    
-    # calculate the starting point (upper left corner) of terrain mesh
-    scaleFactor = 0.01  # scale terrainMesh 100 times (should never be changed), meaning 1 meter in real life is 0.01 meters in Rhino document
-    origin_0_0_0 = Rhino.Geometry.Point3d(0,0,0)  # always center the terrainMesh to 0,0,0 point
-    lowerLeftCornerCellCentroidXcoord = header.XllCenter
-    lowerLeftCornerCellCentroidYcoord = header.YllCenter
-    lowerLeftCornerXcoord = lowerLeftCornerCellCentroidXcoord - (cellsizeX/2)
-    lowerLeftCornerYcoord = lowerLeftCornerCellCentroidYcoord - (cellsizeY/2)
-    
-    originPtProjected = gismo_gis.projectedLocationCoordinates(locationLatitudeD, locationLongitudeD)  # find the "origin" projected in Rhino document units for specific UTMzone
-    
-    #terrainMeshLeftBottomPtX = (lowerLeftCornerXcoord/unitConversionFactor2) - (originPtProjected.X/unitConversionFactor2)
-    #terrainMeshLeftBottomPtY = (lowerLeftCornerYcoord/unitConversionFactor2) - (originPtProjected.Y/unitConversionFactor2)
-    terrainMeshLeftBottomPtX = lowerLeftCornerXcoord - originPtProjected.X
-    terrainMeshLeftBottomPtY = lowerLeftCornerYcoord - originPtProjected.Y
-    
-    terrainMeshStartPtX = ( terrainMeshLeftBottomPtX )*scaleFactor
-    #terrainMeshStartPtY = ( terrainMeshLeftBottomPtY + ((abs(cellsizeX)/unitConversionFactor2)*numOfRows) )*scaleFactor
-    terrainMeshStartPtY = ( terrainMeshLeftBottomPtY + (abs(cellsizeX)*numOfRows) )*scaleFactor
-    
-    pts = []
-    # create terrainMesh from 1 arc-second format
-    for k in xrange(numOfCellsInY):
-        for i in xrange(numOfCellsInX):
-            ptZ = grid.Value(i,k)
-            pt_ZcoordZero = Rhino.Geometry.Point3d(terrainMeshStartPtX+(i*abs(cellsizeX)*scaleFactor), terrainMeshStartPtY-(k*abs(cellsizeY)*scaleFactor), 0)
-            ptZCorrection = ptZcorrectedHeight(origin_0_0_0, pt_ZcoordZero, scaleFactor)  # in meters, unscaled
-            ptCorrected = Rhino.Geometry.Point3d(pt_ZcoordZero.X, pt_ZcoordZero.Y, (ptZ-ptZCorrection)*scaleFactor)
-            pts.append(ptCorrected)
-    
-    closeGridSuccess = grid.Close()
-    
-    terrainMesh = gismo_geometry.meshFromPoints(numOfCellsInY, numOfCellsInX, pts)
-    
-    # deleting
-    #os.remove(rasterFilePath)  # downloaded .tif file
-    os.remove(rasterReprojectedFilePath)
-    os.remove(rasterTranslatedFilePath)
-    del grid
-    del pts
+    # reproject raster in-process: the centers of the UTM grid cells are inverse projected to the downloaded EPSG:4326 raster, and its elevations are bilinearly interpolated
+    try:
+        geoTiff = gismo_geoTiff(rasterFilePath)
+        if geoTiff.epsgCode != 4326:
+            geoTiff.close()
+            geoTiff = None
+    except Exception, e:
+        geoTiff = None
+    
+    # the elevation tiles files of all the pyramid levels are deleted even if the terrainMesh could not be created
+    pyramidL = []
+    try:
+        if geoTiff != None:
+            utmGrid = gismo_terrain.utmGrid(geoTiff, outputCRS_UTMzone, northOrsouth)
+            upperLeftCornerXcoord, upperLeftCornerYcoord, cellsizeX, numOfRows, numOfColumns = utmGrid
+            cellsizeY = cellsizeX
+            lowerLeftCornerXcoord = upperLeftCornerXcoord
+            lowerLeftCornerYcoord = upperLeftCornerYcoord - numOfRows*cellsizeY
+            
+            # stream the elevations into a memory-mapped tiles file, so that the whole raster is never held in memory
+            elevationTiles = gismo_elevationTiles(rasterReprojectedFilePath + "_level0.getf", numOfRows, numOfColumns)
+            pyramidL.append(elevationTiles)
+            for k in xrange(numOfRows):
+                elevationTiles.writeWindow(k, 0, [gismo_terrain.reprojectedRow(geoTiff, utmGrid, k, outputCRS_UTMzone, northOrsouth, "bilinear")])
+            geoTiff.close()
+        
+        else:
+            # the raster is not supported by the GeoTiff reader. Reproject it with GDALWarp
+            utils = MapWinGIS.UtilsClass()
+            resamplingMethod = "-r bilinear"
+            bstrOptions = '-s_srs EPSG:4326 -t_srs "+proj=utm +zone=%s +%s +datum=WGS84 +ellps=WGS84" %s' % (outputCRS_UTMzone, northOrsouth, resamplingMethod)
+            reprojectGridResult = MapWinGIS.UtilsClass.GDALWarp(utils, rasterFilePath, rasterReprojectedFilePath, bstrOptions, None)
+            if (reprojectGridResult != True):
+                convertErrorNo = MapWinGIS.GlobalSettingsClass().GdalLastErrorNo
+                convertErrorMsg = MapWinGIS.GlobalSettingsClass().GdalLastErrorMsg
+                convertErrorType = MapWinGIS.GlobalSettingsClass().GdalLastErrorType
+                print "convertErrorNo: ", convertErrorNo
+                print "convertErrorMsg: ", convertErrorMsg
+                print "convertErrorType: ", convertErrorType
+            
+            # open the reprojected raster in its full resolution (coarser resolutions are used for distant terrain). The raster is read from the disk, row by row
+            grid = MapWinGIS.GridClass()
+            dataType = MapWinGIS.GridDataType.DoubleDataType
+            fileTypeExtension = MapWinGIS.GridFileType.UseExtension
+            inRam = False
+            openGridSuccess = MapWinGIS.GridClass.Open(grid, rasterReprojectedFilePath, dataType, inRam, fileTypeExtension, None)
+            if (openGridSuccess != True):
+                gridErrorMsg = grid.ErrorMsg
+                print "gridErrorMsg: ", gridErrorMsg
+            
+            # numOfRows, numOfColumns, cellsizeX, cellsizeY
+            header = grid.Header
+            numOfRows = header.NumberRows
+            numOfColumns = header.NumberCols
+            cellsizeX = header.dX
+            cellsizeY = header.dY
+            noDataValue = header.NodataValue
+            lowerLeftCornerCellCentroidXcoord = header.XllCenter
+            lowerLeftCornerCellCentroidYcoord = header.YllCenter
+            lowerLeftCornerXcoord = lowerLeftCornerCellCentroidXcoord - (cellsizeX/2)
+            lowerLeftCornerYcoord = lowerLeftCornerCellCentroidYcoord - (cellsizeY/2)
+            
+            # stream the elevations into a memory-mapped tiles file, so that the whole raster is never held in memory
+            elevationTiles = gismo_elevationTiles(rasterReprojectedFilePath + "_level0.getf", numOfRows, numOfColumns)
+            pyramidL.append(elevationTiles)
+            for k in xrange(numOfRows):
+                elevationsRow = []
+                for i in xrange(numOfColumns):
+                    ptZ = grid.Value(i,k)
+                    if ptZ == noDataValue:
+                        ptZ = None
+                    elevationsRow.append(ptZ)
+                elevationTiles.writeWindow(k, 0, [elevationsRow])
+            
+            closeGridSuccess = grid.Close()
+            os.remove(rasterReprojectedFilePath)
+            del grid
+        
+        # calculate the starting point (upper left corner) of terrain mesh
+        scaleFactor = 0.01  # scale terrainMesh 100 times (should never be changed), meaning 1 meter in real life is 0.01 meters in Rhino document
+        origin_0_0_0 = Rhino.Geometry.Point3d(0,0,0)  # always center the terrainMesh to 0,0,0 point
+        
+        originPtProjected = gismo_gis.projectedLocationCoordinates(locationLatitudeD, locationLongitudeD)  # find the "origin" projected in Rhino document units for specific UTMzone
+        
+        #terrainMeshLeftBottomPtX = (lowerLeftCornerXcoord/unitConversionFactor2) - (originPtProjected.X/unitConversionFactor2)
+        #terrainMeshLeftBottomPtY = (lowerLeftCornerYcoord/unitConversionFactor2) - (originPtProjected.Y/unitConversionFactor2)
+        terrainMeshLeftBottomPtX = lowerLeftCornerXcoord - originPtProjected.X
+        terrainMeshLeftBottomPtY = lowerLeftCornerYcoord - originPtProjected.Y
+        
+        terrainMeshStartPtX = ( terrainMeshLeftBottomPtX )*scaleFactor
+        #terrainMeshStartPtY = ( terrainMeshLeftBottomPtY + ((abs(cellsizeX)/unitConversionFactor2)*numOfRows) )*scaleFactor
+        terrainMeshStartPtY = ( terrainMeshLeftBottomPtY + (abs(cellsizeX)*numOfRows) )*scaleFactor
+        
+        # create terrainMesh from the elevation pyramid: full resolution up to 20 km from the location, then twice as coarse resolution for each next distance band (20-40 km, 40-80 km...), up to the corners of the raster
+        # each coarser pyramid level is downsampled tile by tile from the previous one
+        baseBandRadiusM = 20000  # in meters
+        numOfLevels = 1
+        while (baseBandRadiusM * 2**(numOfLevels-1)) < (maxVisibilityRadiusM * math.sqrt(2)):
+            numOfLevels += 1
+        tileSize = 512  # number of cells in each direction of a tile
+        for level in xrange(1, numOfLevels):
+            if (pyramidL[-1].numOfRows < 2) or (pyramidL[-1].numOfColumns < 2):
+                break
+            pyramidL.append( pyramidL[-1].mapTiles(gismo_terrain.downsampledGrid, rasterReprojectedFilePath + "_level%s.getf" % level, tileSize, 0, 2) )
+        terrainMesh = terrainMeshFromElevationPyramid(pyramidL, terrainMeshStartPtX, terrainMeshStartPtY, abs(cellsizeX)*scaleFactor, baseBandRadiusM*scaleFactor, scaleFactor)
+        
+    finally:
+        # deleting
+        #os.remove(rasterFilePath)  # downloaded .tif file
+        for levelTiles in pyramidL:
+            levelTiles.close(True)
+        del pyramidL
     
     
     # project origin_0_0_0 (locationPt) to terrainMesh
@@ -829,82 +1037,92 @@ def createTerrainShadingMask(objFilePath, rasterFilePath, rasterReprojectedFileP
     stepV = (skyDomeDomainVmax - skyDomeDomainVmin)/precisionV
     
     # check for intersection between the terrainMesh and rays
-    lines = []
-    lastRowPoints = []
+    toleranceRows = max(1, int(round(rayToleranceD / (90.0/precisionV))))  # 90/precisionV = 0.075 degrees
     
-    hitted = False  # initial switch
-    for i in xrange(0,precisionU):
-        for k in xrange(0,precisionV):
-            u = skyDomeDomainUmin + stepU*i
+    def columnHitRow(u, startRow, numOfRaysL, exhaustive):
+        # the highest row of the column which hits the terrainMeshSplitted (-1 if none)
+        def rayHit(k):
+            numOfRaysL[0] += 1
             v = skyDomeDomainVmin + stepV*k
-            skyDomePt = halvedSkyDomeSrf.PointAt(u,v)
-            rayVector = skyDomePt-locationPt
-            ray = Rhino.Geometry.Ray3d(locationPt, rayVector)
-            rayIntersectParam = Rhino.Geometry.Intersect.Intersection.MeshRay(terrainMeshSplitted,ray)
-            if rayIntersectParam >= 0:
-                # ray hitted something in that column
-                hitted = True
-                lastRowPt = skyDomePt
-                continue
+            ray = Rhino.Geometry.Ray3d(locationPt, halvedSkyDomeSrf.PointAt(u,v)-locationPt)
+            return Rhino.Geometry.Intersect.Intersection.MeshRay(terrainMeshSplitted,ray) >= 0
+        
+        if exhaustive:
+            # exhaustive scan: shoot all precisionV rays in the column
+            hitRow = -1
+            for k in xrange(0,precisionV):
+                if rayHit(k):
+                    # ray hitted something in that column
+                    hitRow = k
+            return hitRow
+        else:
+            # adaptive scan: search for the highest hitted row, starting from the one of the previous column
+            return gismo_terrain.highestHitRow(rayHit, precisionV, startRow, toleranceRows=toleranceRows)
+    
+    def sectorProfileAngles(sectorIndex, exhaustive):
+        # horizon profile angles of a sector of neighbouring columns
+        numOfRaysL = [0]
+        sectorProfileAnglesR = []
+        hitRow = None
+        for i in xrange(sectorIndex*sectorSize, min((sectorIndex+1)*sectorSize, precisionU)):
+            u = skyDomeDomainUmin + stepU*i
+            hitRow = columnHitRow(u, hitRow, numOfRaysL, exhaustive)
+            if hitRow >= 0:
+                profileAngleR = skyDomeDomainVmin + stepV*hitRow
             else:
                 # ray did not hit anything in that column
-                pass
-        if hitted == False:
-            lastRowPt = halvedSkyDomeSrf.PointAt(u,0)
-        line = Rhino.Geometry.Line(locationPt, lastRowPt)
-        lines.append(line.ToNurbsCurve())
-        lastRowPoints.append(lastRowPt)
-        hitted = False  # reset the hitted switch
-    
-    del terrainMesh
-    del terrainMeshSplitted
-    
-    tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance
-    if maskStyle == 0:  # spherical terrain shading mask
-        loftType = Rhino.Geometry.LoftType.Loose
-        loftedLinesBrep = Rhino.Geometry.Brep.CreateFromLoft(lines, Rhino.Geometry.Point3d.Unset, Rhino.Geometry.Point3d.Unset, loftType, True)[0]
-        loftedLinesSrf = loftedLinesBrep.Faces[0]
-        extendedLoftedLinesSrf = loftedLinesSrf.Extend(Rhino.Geometry.IsoStatus.North, skyDomeRadius, False)
-        splittedHalvedSkyDomeSrfs = halvedSkyDomeSrf.ToBrep().Split(extendedLoftedLinesSrf.ToBrep(), tol)[:-1]
-        shadingMaskBreps = splittedHalvedSkyDomeSrfs
-    elif maskStyle == 1:  # extruded (vertical) terrain shading mask
-        curveLastRowPoints = Rhino.Geometry.Curve.CreateControlPointCurve(lastRowPoints+[lastRowPoints[0]], 3)
-        extrudedShadingMaskSrf = Rhino.Geometry.Surface.CreateExtrusion(curveLastRowPoints, Rhino.Geometry.Vector3d(0,0,-skyDomeRadius)).ToBrep()
-        shadingMaskBreps = extrudedShadingMaskSrf.Trim(Rhino.Geometry.Plane(locationPt, Rhino.Geometry.Vector3d(0,0,-1)), tol)
-    [brep.Faces.ShrinkFaces() for brep in shadingMaskBreps]  # shrinking the breps in-place, so that they can be exported to an .obj file
-    
-    
-    if len(shadingMaskBreps) == 0:
-        # no intersection between rays and mesh (low precisionU and precisionV values may result in this too)
-        terrainShadingMaskUnscaledUnrotated = None
-        level = Grasshopper.Kernel.GH_RuntimeMessageLevel.Warning
-        printMsg = "There is no shading from terrain. This could be due to two reasons:\n" + \
-                   " \n" + \
-                   "1) There really is no shading from the surrounding terrain: For example, you chose your _location to be on a peak point of an island, without any terrain or islands around it.\n" + \
-                   "2) There might be shading from a terrain, but the \"maxVisibilityRadius_\" you inputted is too short to show this. Try increasing the size of the \"maxVisibilityRadius_\"."
-        ghenv.Component.AddRuntimeMessage(level, printMsg)
-        print printMsg
-    else:
-        # there is an intersection between rays and mesh
-        terrainShadingMaskUnscaledUnrotated = Rhino.Geometry.Brep.MergeBreps(shadingMaskBreps, tol)  # merge the shadingMaskBreps into a single brep
-        # allign the terrainShadingMaskUnscaledUnrotated to "origin_0_0_0" point, instead of locationPt
-        translationVec = origin_0_0_0 - locationPt
-        transformMatrix = Rhino.Geometry.Transform.Translation(translationVec)
-        transformSuccess = terrainShadingMaskUnscaledUnrotated.Transform(transformMatrix)
+                profileAngleR = 0
+            sectorProfileAnglesR.append(profileAngleR)
+        return sectorProfileAnglesR, numOfRaysL[0]
+    
+    # columns are always split into the same sectors, so that the results do not depend on parallel_ input
+    numOfSectors = 72  # 5 degrees sectors
+    sectorSize = int(math.ceil(precisionU/float(numOfSectors)))
+    
+    def scanProfileAngles(exhaustive):
+        # horizon profile angles of all the columns, number of shot rays and the time needed
+        time1 = time.time()
+        sectorsResults = gismo_kernels.runInParallel(lambda sectorIndex: sectorProfileAngles(sectorIndex, exhaustive), numOfSectors, parallel)
         
-        # export the created Terrain shading mask to .obj
-        terrainShadingMaskDummy, origin_0_0_0Dummy = import_export_origin_0_0_0_and_terrainShadingMask_from_objFile("exportObj", objFilePath, fileNameIncomplete, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, elevationM, terrainShadingMaskUnscaledUnrotated, origin_0_0_0)
+        # merge the sectors in the order of columns
+        profileAnglesR = []
+        numOfRays = 0
+        for sectorProfileAnglesR, sectorNumOfRays in sectorsResults:
+            profileAnglesR.extend(sectorProfileAnglesR)
+            numOfRays += sectorNumOfRays
+        return profileAnglesR, numOfRays, time.time()-time1
+    
+    profileAnglesR, numOfRays, scanTime = scanProfileAngles(rayToleranceD == 0)
+    print "Terrain shading mask rays shot: %s (exhaustive scan: %s), in %0.2f seconds" % (numOfRays, precisionU*precisionV, scanTime)
+    
+    if benchmark and (rayToleranceD != 0):
+        # shoot the rays again with the exhaustive scan, on the same terrainMeshSplitted, and compare the two horizon profiles
+        exhaustiveProfileAnglesR, exhaustiveNumOfRays, exhaustiveScanTime = scanProfileAngles(True)
+        differencesD = [abs(math.degrees(angleR - exhaustiveAngleR)) for angleR, exhaustiveAngleR in zip(profileAnglesR, exhaustiveProfileAnglesR)]
+        numOfDifferentAzimuths = len([differenceD for differenceD in differencesD if differenceD > rayToleranceD + 1e-9])
+        print "Benchmark against the exhaustive scan:\n" + \
+              "  rays shot: %s (rayTolerance_ = %s degrees) / %s (exhaustive), %0.1f times less\n" % (numOfRays, rayToleranceD, exhaustiveNumOfRays, exhaustiveNumOfRays/float(max(numOfRays, 1))) + \
+              "  time: %0.2f / %0.2f seconds, %0.1f times faster\n" % (scanTime, exhaustiveScanTime, exhaustiveScanTime/max(scanTime, 1e-6)) + \
+              "  horizon profile differences: maximal %0.3f degrees, mean %0.4f degrees. Azimuths different for more than rayTolerance_: %s of %s" % (max(differencesD), sum(differencesD)/len(differencesD), numOfDifferentAzimuths, len(differencesD))
+        del exhaustiveProfileAnglesR; del differencesD
+    
+    # terrainMeshSplitted is used by the nested rayHit function, so it can not be deleted
+    terrainMesh = None
+    terrainMeshSplitted = None
+    
+    # save the horizon profile instead of the terrain shading mask geometry, and create the mask from it
+    horizonProfiles.write(locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, demSource, elevationM, profileAnglesR)
+    terrainShadingMaskUnscaledUnrotated, origin_0_0_0 = terrainShadingMaskFromProfile(profileAnglesR, maskStyle, unitConversionFactor)
     
     
     # final deleting
-    del lines
-    del lastRowPoints
+    del profileAnglesR
     gc.collect()
     
     return terrainShadingMaskUnscaledUnrotated, origin_0_0_0, elevationM
 
 
-def scaleTerrainShadingMask(context, terrainShadingMaskUnscaledUnrotated, origin_0_0_0, latitude):
+def scaleTerrainShadingMask(context, terrainShadingMaskUnscaledUnrotated, origin_0_0_0, latitude, parallel):
     
     # remove "None" from context_
     contextMeshesFiltered = []
@@ -968,11 +1186,12 @@ def scaleTerrainShadingMask(context, terrainShadingMaskUnscaledUnrotated, origin
         for meshMaskPart in shadingTerrainMaskMeshes:
             terrainShadingMaskMesh.Append(meshMaskPart)
         
-        skyDomeRadius = 200/unitConversionFactor2  # fixed to 200 meters always
         objFileRadius = 200  # in Rhino units
         precision = 100  # low "precision" values can result in low "terrainShadingMaskScaled_radius" values
         skyDomeMeshes = []
         scaledTerrainShadingMaskMeshL = []
+        time1 = time.time()
+        numOfSteps = 0
         for terrainShadingMaskScaled_radius in rs.frange(terrainShadingMaskScaled_startingRadius, int(10100/unitConversionFactor2), int(300/unitConversionFactor2)):  # iterrate terrainShadingMaskScaled_radius from 300 to 10000
             scale = terrainShadingMaskScaled_radius/objFileRadius
             
@@ -983,9 +1202,9 @@ def scaleTerrainShadingMask(context, terrainShadingMaskUnscaledUnrotated, origin
             scaledTerrainShadingMaskMeshL.append(scaledTerrainShadingMaskMesh)
             
             conditionSum = 0
-            for i,cornerPt in enumerate(contextBBoxBottom4points):
-                skyExposureFactor = gismo_environmentalAnalysis.calculateSkyExposureFactor(cornerPt, [scaledTerrainShadingMaskMesh], latitude, skyDomeRadius, precision)
-                
+            numOfSteps += 1
+            skyExposureFactors = gismo_environmentalAnalysis.calculateSkyExposureFactors(contextBBoxBottom4points, [scaledTerrainShadingMaskMesh], latitude, precision, chunkSize=1, parallel=parallel)  # one task per corner point
+            for i,skyExposureFactor in enumerate(skyExposureFactors):
                 if i == 0:
                     skyExposureFactor0 = skyExposureFactor  # for the first step, both skyExposureFactor0 and skyExposureFactor1 equal to skyExposureFactor
                 skyExposureFactor1 = skyExposureFactor
@@ -1001,6 +1220,8 @@ def scaleTerrainShadingMask(context, terrainShadingMaskUnscaledUnrotated, origin
                 break
             else:
                 conditionSum = 0
+        numOfPatches = len(gismo_environmentalAnalysis.skyPatches("uv", precision)[1])
+        print "Terrain shading mask radius found in %s steps (%s rays) in %0.2f seconds" % (numOfSteps, numOfSteps*len(contextBBoxBottom4points)*numOfPatches, time.time()-time1)
         
         # the 1% skyExposureFactorDifference may be fulfilled, but annualShading might not. Increase the "terrainShadingMaskScaled_radius" 3 times
         terrainShadingMaskScaled_radius = 3 * terrainShadingMaskScaled_radius
@@ -1115,7 +1336,7 @@ def bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, heightM,
     groupIndex3 = gismo_preparation.groupGeometry(layerName + "_terrainShadingMask_title", geometryIds3)
 
 
-def printOutput(north, latitude, longitude, locationName, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, workingSubFolderPath, downloadTSVLink):
+def printOutput(north, latitude, longitude, locationName, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, rayToleranceD, workingSubFolderPath, downloadTSVLink):
     if maskStyle == 0:
         maskStyleLabel2 = "spherical"
     elif maskStyle == 1:
@@ -1137,9 +1358,10 @@ North (deg.): %s
 Minimal visibility radius (km): %s
 Maximal visibility radius (km): %s
 Mask style: %s (%s)
+Ray tolerance (deg.): %s
 Working folder: %s
 Download Url: %s
-    """ % (locationName, latitude, longitude, 360-math.degrees(northRad), int(minVisibilityRadiusM/1000), int(maxVisibilityRadiusM/1000), maskStyle, maskStyleLabel2, workingSubFolderPath, downloadTSVLink)
+    """ % (locationName, latitude, longitude, 360-math.degrees(northRad), int(minVisibilityRadiusM/1000), int(maxVisibilityRadiusM/1000), maskStyle, maskStyleLabel2, rayToleranceD, workingSubFolderPath, downloadTSVLink)
     print resultsCompletedMsg
     print printOutputMsg
 
@@ -1150,27 +1372,36 @@ if sc.sticky.has_key("gismoGismo_released"):
     if validVersionDate:
         gismo_mainComponent = sc.sticky["gismo_mainComponent"]()
         gismo_preparation = sc.sticky["gismo_Preparation"]()
+        gismo_kernels = sc.sticky["gismo_kernels"]
         gismo_geometry = sc.sticky["gismo_CreateGeometry"]()
         gismo_environmentalAnalysis = sc.sticky["gismo_EnvironmentalAnalysis"]()
         gismo_gis = sc.sticky["gismo_GIS"]()
+        gismo_terrain = sc.sticky["gismo_Terrain"]()
+        gismo_elevationTiles = sc.sticky["gismo_ElevationTiles"]
+        gismo_geoTiff = sc.sticky["gismo_GeoTiff"]
+        gismo_demTileCache = sc.sticky["gismo_DEMTileCache"]
         
         locationName, locationLatitudeD, locationLongitudeD, timeZone, elevation, validLocationData, printMsg = gismo_preparation.checkLocationData(_location)
         if validLocationData:
             fileNameIncomplete = locationName + "_" + str(locationLatitudeD) + "_" + str(locationLongitudeD) + "_TERRAIN_MASK"  # incomplete due to missing "_visibility=100KM_sph" part (for example)
-            heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, unitConversionFactor, validInputData, printMsg = checkInputData(minVisibilityRadius_, maxVisibilityRadius_, north_, maskStyle_, workingFolder_, downloadUrl_)
+            heightM, minVisibilityRadiusM, maxVisibilityRadiusM, northRad, northVec, maskStyle, maskStyleLabel, iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, workingSubFolderPath, downloadTSVLink, rayToleranceD, unitConversionFactor, validInputData, printMsg = checkInputData(minVisibilityRadius_, maxVisibilityRadius_, north_, maskStyle_, workingFolder_, downloadUrl_, rayTolerance_)
             if validInputData:
                 if _runIt:
                     if validInputData:
-                        terrainShadingMaskUnscaledUnrotated, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterTranslatedFilePath, elevationM, valid_Obj_or_Raster_file, printMsg = checkObjRasterFile(fileNameIncomplete, workingSubFolderPath, downloadTSVLink, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyleLabel)
+                        horizonProfilesFolderPath = os.path.join(workingSubFolderPath, "horizon_profiles")
+                        folderCreated = gismo_preparation.createFolder(horizonProfilesFolderPath)
+                        horizonProfiles = sc.sticky["gismo_HorizonProfiles"](horizonProfilesFolderPath)
+                        demSource = "SRTMGL3"  # 3 arc-second global DEM downloaded from OpenTopography. Cached horizon profiles and DEM tiles are keyed by it
+                        terrainShadingMaskUnscaledUnrotated, origin_0_0_0, fileName, objFilePath, rasterFilePath, rasterReprojectedFilePath, elevationM, valid_Obj_or_Raster_file, printMsg = checkObjRasterFile(horizonProfiles, fileNameIncomplete, workingSubFolderPath, downloadTSVLink, locationLatitudeD, locationLongitudeD, demSource, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, maskStyleLabel, unitConversionFactor)
                         if valid_Obj_or_Raster_file:
                             if (rasterFilePath != "needless") and (rasterFilePath != "download failed"):  # terrain shading mask NEEDS to be created
-                                terrainShadingMaskUnscaledUnrotated, origin_0_0_0, elevationM = createTerrainShadingMask(objFilePath, rasterFilePath, rasterReprojectedFilePath, rasterTranslatedFilePath, locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, context_, unitConversionFactor)
-                            scale, terrainShadingMaskScaled_radius, contextRadius, contextCentroid, validContextCentroid, printMsg = scaleTerrainShadingMask(context_, terrainShadingMaskUnscaledUnrotated, origin_0_0_0, locationLatitudeD)
+                                terrainShadingMaskUnscaledUnrotated, origin_0_0_0, elevationM = createTerrainShadingMask(horizonProfiles, demSource, rasterFilePath, rasterReprojectedFilePath, locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, rayToleranceD, benchmark_, parallel_, context_, unitConversionFactor)
+                            scale, terrainShadingMaskScaled_radius, contextRadius, contextCentroid, validContextCentroid, printMsg = scaleTerrainShadingMask(context_, terrainShadingMaskUnscaledUnrotated, origin_0_0_0, locationLatitudeD, parallel_)
                             originPt = contextCentroid
                             if validContextCentroid:
                                 terrainShadingMaskScaledRotated, compassCrvs, titleDescriptionLabelMeshes = compassCrvs_title_scalingRotating(origin_0_0_0, contextCentroid, scale, northVec, terrainShadingMaskUnscaledUnrotated, locationName, locationLatitudeD, locationLongitudeD, heightM, elevationM, minVisibilityRadiusM, maxVisibilityRadiusM, unitConversionFactor, rasterFilePath)
                                 if bakeIt_: bakingGrouping(locationName, locationLatitudeD, locationLongitudeD, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyleLabel, contextCentroid, terrainShadingMaskScaledRotated, compassCrvs, titleDescriptionLabelMeshes)
-                                printOutput(northRad, locationLatitudeD, locationLongitudeD, locationName, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, workingSubFolderPath, downloadTSVLink)
+                                printOutput(northRad, locationLatitudeD, locationLongitudeD, locationName, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, maskStyle, rayToleranceD, workingSubFolderPath, downloadTSVLink)
                                 terrainShadingMask = terrainShadingMaskScaledRotated; title = titleDescriptionLabelMeshes; maskRadius = terrainShadingMaskScaled_radius; elevation = elevationM
                             else:
                                 print printMsg
@@ -50,9 +50,12 @@ import shutil
 import urllib
 import Rhino
 import time
+import collections
 import math
 import sys
+import array
 import clr
+import imp
 import os
 
 
@@ -165,6 +168,13 @@ class Check(object):
                     del component
                     del componentsCodeString
                     return validVersionDate, printMsg
+                elif ("#requiresGismoKernels" in componentsCodeString) and (gismo_kernels == None):
+                    # the component uses the Rhino-free "gismo_kernels.py" module, which could not be loaded
+                    validVersionDate = False
+                    printMsg = gismoKernelsPrintMsg
+                    del component
+                    del componentsCodeString
+                    return validVersionDate, printMsg
                 else:
                     validVersionDate = True
                     printMsg = "ok"
@@ -319,6 +329,51 @@ class mainComponent(object):
                        "http://www.grasshopper3d.com/group/gismo/forum."
             iteropMapWinGIS_dll_folderPath = None  # set in here, to prevent the "iteropMapWinGIS_dll_folderPath" being equal to "None" when printed in upper "printMsg"
             return iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, validInputData, printMsg
+    
+    
+    def gismoKernels(self, gismoFolder):
+        """
+        load the Rhino-free "gismo_kernels.py" module, installed together with Gismo user objects (in Grasshopper's "File->Special Folders->User Object Folder" folder or its subfolders), or from the "libraries" subfolder of the gismoFolder_
+        the module is loaded again on each run of Gismo Gismo component, and only if its version and date are the same as the ones of Gismo Gismo component
+        """
+        gismoKernels_fileName = "gismo_kernels.py"
+        folderPathsL = list(Grasshopper.Folders.UserObjectFolders)
+        if gismoFolder:
+            folderPathsL.append(os.path.join(gismoFolder, "libraries"))
+        
+        gismoKernels_filePath = None
+        for folderPath in folderPathsL:
+            for subfolderPath, subfolderNames, fileNames in os.walk(folderPath):
+                if gismoKernels_fileName in fileNames:
+                    gismoKernels_filePath = os.path.join(subfolderPath, gismoKernels_fileName)
+                    break
+            if gismoKernels_filePath != None:
+                break
+        else:
+            printMsg = "Gismo terrain components (Terrain Generator, Terrain Analysis, Terrain Shading Mask, Horizon Angles) require the \"gismo_kernels.py\" file in order to work.\n" + \
+                       "The Gismo Gismo component could not find this file in your Grasshopper's User Object Folder.\n" + \
+                       " \n" + \
+                       "1) Copy the \"gismo_kernels.py\" file from the \"userObjects\" folder of the Gismo .zip file, to your Grasshopper's: \"File->Special Folders->User Object Folder\" folder (the same folder where Gismo_Gismo.ghuser file is).\n" + \
+                       "2) Rerun this .gh file (Solution->Recompute).\n" + \
+                       " \n" + \
+                       "Other Gismo components do not require this file."
+            return None, printMsg
+        
+        try:
+            gismo_kernels = imp.load_source("gismo_kernels", gismoKernels_filePath)
+        except Exception, e:
+            printMsg = "The \"gismo_kernels.py\" file from the \"%s\" folder could not be loaded:\n%s\n" % (os.path.dirname(gismoKernels_filePath), e) + \
+                       "Replace it with the \"gismo_kernels.py\" file from the \"userObjects\" folder of the same Gismo .zip file from which the Gismo_Gismo.ghuser file is, and rerun this .gh file (Solution->Recompute)."
+            return None, printMsg
+        
+        kernelsVersion = getattr(gismo_kernels, "compatibleGismoVersion", "unknown")
+        if kernelsVersion != ghenv.Component.Message:
+            printMsg = "The \"gismo_kernels.py\" file from the \"%s\" folder is of different version (%s) than the Gismo Gismo component (%s).\n" % (os.path.dirname(gismoKernels_filePath), kernelsVersion.replace("\n", " "), ghenv.Component.Message.replace("\n", " ")) + \
+                       "Replace it with the \"gismo_kernels.py\" file from the \"userObjects\" folder of the same Gismo .zip file from which the Gismo_Gismo.ghuser file is, and rerun this .gh file (Solution->Recompute)."
+            return None, printMsg
+        
+        printMsg = "ok"
+        return gismo_kernels, printMsg
 
 
 class Preparation(object):
@@ -1172,6 +1227,82 @@ class CreateGeometry():
         return mesh  # colored mesh
     
     
+    def meshToArrays(self, mesh):
+        """
+        convert a mesh to a list of vertices coordinates and a list of triangles vertices indices
+        """
+        verticesL = [(vertex.X, vertex.Y, vertex.Z) for vertex in mesh.Vertices]
+        trianglesL = []
+        for mFace in mesh.Faces:
+            trianglesL.append((mFace.A, mFace.B, mFace.C))
+            if mFace.IsQuad:
+                trianglesL.append((mFace.A, mFace.C, mFace.D))
+        
+        return verticesL, trianglesL
+    
+    
+    def meshFromArrays(self, verticesL, facesL):
+        """
+        create a mesh from a list of vertices coordinates (x,y,z) and a list of faces vertices indices (3 or 4 indices per face)
+        vertices and faces are added to the mesh in bulk
+        """
+        vertices = System.Collections.Generic.List[Rhino.Geometry.Point3f](len(verticesL))
+        for x,y,z in verticesL:
+            vertices.Add(Rhino.Geometry.Point3f(x,y,z))
+        faces = System.Collections.Generic.List[Rhino.Geometry.MeshFace](len(facesL))
+        for faceIndices in facesL:
+            if len(faceIndices) == 4:
+                faces.Add(Rhino.Geometry.MeshFace(faceIndices[0], faceIndices[1], faceIndices[2], faceIndices[3]))
+            else:
+                faces.Add(Rhino.Geometry.MeshFace(faceIndices[0], faceIndices[1], faceIndices[2]))
+        
+        mesh = self.meshFromLists(vertices, faces)
+        
+        return mesh
+    
+    
+    def meshFromLists(self, vertices, faces):
+        """
+        create a mesh from a List of Point3f vertices and a List of MeshFaces
+        Mesh.Vertices.AddVertices and Mesh.Faces.AddFaces are used when available (Rhino 6 and newer). Otherwise vertices and faces are added one by one
+        """
+        mesh = Rhino.Geometry.Mesh()
+        if hasattr(mesh.Vertices, "AddVertices"):
+            mesh.Vertices.AddVertices(vertices)
+        else:
+            for vertex in vertices:
+                mesh.Vertices.Add(vertex)
+        if hasattr(mesh.Faces, "AddFaces"):
+            mesh.Faces.AddFaces(faces)
+        else:
+            for face in faces:
+                mesh.Faces.AddFace(face)
+        
+        return mesh
+    
+    
+    def meshFromGrid(self, xL, yL, zValues):
+        """
+        create a mesh from a grid of elevations: xL are the x coordinates of the columns, yL the y coordinates of the rows, and zValues a flat list (or array) of elevations, row after row
+        vertices and faces are created row by row as flat buffers, and added to the mesh in bulk
+        """
+        numOfRows = len(yL)
+        numOfColumns = len(xL)
+        vertices = System.Collections.Generic.List[Rhino.Geometry.Point3f](numOfRows*numOfColumns)
+        for k,y in enumerate(yL):
+            rowZvalues = zValues[k*numOfColumns:(k+1)*numOfColumns]
+            vertices.AddRange([Rhino.Geometry.Point3f(x,y,z) for x,z in zip(xL, rowZvalues)])
+        faces = System.Collections.Generic.List[Rhino.Geometry.MeshFace](max(numOfRows-1, 0)*max(numOfColumns-1, 0))
+        for k in xrange(1, numOfRows):
+            upperRowStart = (k-1)*numOfColumns
+            lowerRowStart = k*numOfColumns
+            faces.AddRange([Rhino.Geometry.MeshFace(upperRowStart+i-1, lowerRowStart+i-1, lowerRowStart+i, upperRowStart+i) for i in xrange(1, numOfColumns)])
+        
+        mesh = self.meshFromLists(vertices, faces)
+        
+        return mesh
+    
+    
     def convertCrvToPolyline(self, crv, explodePolyline = False):
         """
         convert a curve to polyline. For a given single curve, it returns a list!
@@ -1755,6 +1886,11 @@ class CreateGeometry():
         return mesh
 
 
+# sky patches tables (directions and solid angle weights) of the already used sky subdivisions, shared by all EnvironmentalAnalysis instances. The least recently used tables are removed first
+skyPatchesTables = collections.OrderedDict()
+skyPatchesTablesMaxCount = 8
+
+
 class EnvironmentalAnalysis():
     """
     various environmental analysis methods
@@ -1775,7 +1911,7 @@ class EnvironmentalAnalysis():
                 elif sunWindowQuadrantIndex >= 72:
                     seasonIndex = 0  # winter/autumn
         elif criteria == "perHoy":
-            if leaflessStartHOY < leaflessEndHOY:
+            if leaflessStartHOY <= leaflessEndHOY:
                 if (sunWindowQuadrantIndex >= leaflessStartHOY) and (sunWindowQuadrantIndex <= leaflessEndHOY):
                     seasonIndex = 0  # leafless period
                 else:
@@ -1789,76 +1925,171 @@ class EnvironmentalAnalysis():
         return seasonIndex
     
     
-    def calculateSkyExposureFactor(self, testPt, contextMeshes, latitude, radius, precision, treesTransmissionIndices=[0,[0,0]], leaflessStartHOY=None, leaflessEndHOY=None):
+    def skyPatches(self, skySubdivision, precision):
         """
-        calculate sky exposure factor
+        directions (unit vectors from the center of the sky dome) and solid angle weights (summing to 1) of the sky dome patches
+        skySubdivision: "uv" - sky dome mesh of precision*5 columns and int(precision*5/3.5) rows (up to 89.55 degrees altitude), "tregenza" - 145 patches, "reinhart" - precision^2*144+1 patches (precision being the subdivision factor)
+        tables are calculated once per skySubdivision and precision, and then taken from the skyPatchesTables cache
+        """
+        if skySubdivision == "tregenza":
+            skySubdivision = "reinhart"; precision = 1  # Tregenza sky subdivision is the Reinhart's one with subdivision factor 1
+        key = (skySubdivision, precision)
+        if key in skyPatchesTables:
+            # mark the table as the most recently used one
+            directions, weights = skyPatchesTables.pop(key)
+            skyPatchesTables[key] = directions, weights
+            return directions, weights
+        
+        directions = []
+        weights = array.array("d")
+        if skySubdivision == "uv":
+            gismo_geometry = CreateGeometry()
+            precisionU = precision*5
+            precisionV = int(precisionU/3.5)
+            
+            skyDomeHalfSphere = Rhino.Geometry.Sphere(Rhino.Geometry.Plane(Rhino.Geometry.Point3d(0,0,0),Rhino.Geometry.Vector3d(0,0,1)), 1)
+            splittedSkyDomeDomainUmin, splittedSkyDomeDomainUmax = [0, 2*math.pi]  # sphere diameter
+            splittedSkyDomeDomainVmin, splittedSkyDomeDomainVmax = [0, 0.5*math.pi]  # sphere vertical arc
+            splittedSkyDomeDomainVmax = 0.995*splittedSkyDomeDomainVmax
+            
+            stepU = (splittedSkyDomeDomainUmax - splittedSkyDomeDomainUmin)/precisionU
+            stepV = (splittedSkyDomeDomainVmax - splittedSkyDomeDomainVmin)/precisionV
+            
+            skyDomePts = []
+            for i in xrange(0,precisionU):
+                for k in xrange(0,precisionV):
+                    u = splittedSkyDomeDomainUmin + stepU*i
+                    v = splittedSkyDomeDomainVmin + stepV*k
+                    skyDomePt = skyDomeHalfSphere.PointAt(u,v)
+                    skyDomePts.append(skyDomePt)
+            skyDomeMeshPts = skyDomePts + skyDomePts[:precisionV]  # increases precisionU for 1
+            skyDomeMesh = gismo_geometry.meshFromPoints(precisionU+1, precisionV, skyDomeMeshPts)
+            
+            meshFaceAreas = gismo_geometry.calculateMeshFaceAreas(skyDomeMesh)
+            skyDomeMeshArea = sum(meshFaceAreas)
+            for i in xrange(skyDomeMesh.Faces.Count):
+                directions.append(Rhino.Geometry.Vector3d(skyDomeMesh.Faces.GetFaceCenter(i)))
+                weights.append(meshFaceAreas[i]/skyDomeMeshArea)
+            del skyDomeMeshPts
+            del skyDomeMesh
+        
+        elif skySubdivision == "reinhart":
+            # based on "reinhart.cal" from Radiance: rows of equal altitude height, with the zenith patch being half a row high
+            patchesPerTregenzaRow = [30, 30, 24, 24, 18, 12, 6]
+            rowHeightR = math.radians(90.0/(7*precision + 0.5))
+            for row in xrange(7*precision):
+                numOfPatches = precision*patchesPerTregenzaRow[row//precision]
+                altitudeR = (row + 0.5)*rowHeightR
+                patchSolidAngle = 2*math.pi*(math.sin((row+1)*rowHeightR) - math.sin(row*rowHeightR)) / numOfPatches
+                for patch in xrange(numOfPatches):
+                    azimuthR = (patch + 0.5)*2*math.pi/numOfPatches  # clockwise from the Y axis
+                    directions.append(Rhino.Geometry.Vector3d(math.cos(altitudeR)*math.sin(azimuthR), math.cos(altitudeR)*math.cos(azimuthR), math.sin(altitudeR)))
+                    weights.append(patchSolidAngle / (2*math.pi))
+            # zenith patch
+            directions.append(Rhino.Geometry.Vector3d(0,0,1))
+            weights.append(1 - math.sin(7*precision*rowHeightR))
+        
+        skyPatchesTables[key] = directions, weights
+        while len(skyPatchesTables) > skyPatchesTablesMaxCount:
+            skyPatchesTables.popitem(last=False)
+        
+        return directions, weights
+    
+    
+    def calculateSkyExposureFactor(self, testPt, contextMeshes, latitude, radius, precision, treesTransmissionIndices=[0,[0,0]], leaflessStartHOY=None, leaflessEndHOY=None, skySubdivision="uv"):
+        """
+        calculate sky exposure factor of a single test point (the same as calculateSkyExposureFactors, with a single test point)
+        sky dome patches are taken from the skyPatches tables, so only the rays are calculated for each testPt ("radius" input is not used anymore)
+        """
+        skyExposureFactors = self.calculateSkyExposureFactors([testPt], contextMeshes, latitude, precision, treesTransmissionIndices, skySubdivision, leaflessStartHOY=leaflessStartHOY, leaflessEndHOY=leaflessEndHOY, parallel=False)
+        
+        return skyExposureFactors[0]
+    
+    
+    def skyHitClasses(self, testPts, contextMeshes, precision, skySubdivision="uv", chunkSize=256, parallel=True):
+        """
+        trace the rays from test points towards the sky patches, and record which mesh has been hitted first by each ray
+        testPts: list of Point3d or (x,y,z) tuples. contextMeshes: [contextMesh, coniferousTreesMesh, deciduousTreesMesh] (the same order as in calculateSkyExposureFactor). Each of them can be None
+        rays are intersected with native MeshRay, and test points are processed in chunks of "chunkSize" points (one task per chunk, on all processor cores if parallel=True), so the memory stays bounded regardless of the number of test points
+        returns an unsigned char array with number of sky patches hit classes per test point (in the order of testPts): 0 - sky, 1 - context, 2 - coniferous trees, 3 - deciduous trees
         """
-        # lifting up the testPt due to MeshRay intersection
         tol = Rhino.RhinoDoc.ActiveDoc.ModelAbsoluteTolerance
-        testPtLifted = Rhino.Geometry.Point3d(testPt.X, testPt.Y, testPt.Z+tol)
-        gismo_geometry = CreateGeometry()
-        
-        precisionU = precision*5
-        precisionV = int(precisionU/3.5)
-        
-        skyDomeHalfSphere = Rhino.Geometry.Sphere(Rhino.Geometry.Plane(Rhino.Geometry.Point3d(testPtLifted),Rhino.Geometry.Vector3d(0,0,1)), radius)
-        splittedSkyDomeDomainUmin, splittedSkyDomeDomainUmax = [0, 2*math.pi]  # sphere diameter
-        splittedSkyDomeDomainVmin, splittedSkyDomeDomainVmax = [0, 0.5*math.pi]  # sphere vertical arc
-        splittedSkyDomeDomainVmax = 0.995*splittedSkyDomeDomainVmax
-        
-        stepU = (splittedSkyDomeDomainUmax - splittedSkyDomeDomainUmin)/precisionU
-        stepV = (splittedSkyDomeDomainVmax - splittedSkyDomeDomainVmin)/precisionV
-        
-        skyDomePts = []
-        for i in xrange(0,precisionU):
-            for k in xrange(0,precisionV):
-                u = splittedSkyDomeDomainUmin + stepU*i
-                v = splittedSkyDomeDomainVmin + stepV*k
-                skyDomePt = skyDomeHalfSphere.PointAt(u,v)
-                skyDomePts.append(skyDomePt)
-        skyDomeMeshPts = skyDomePts + skyDomePts[:precisionV]  # increases precisionU for 1
-        skyDomeMesh = gismo_geometry.meshFromPoints(precisionU+1, precisionV, skyDomeMeshPts)
-        meshFacesCentroids = [skyDomeMesh.Faces.GetFaceCenter(i) for i in xrange(skyDomeMesh.Faces.Count)]
-        meshFaces = skyDomeMesh.Faces
-        meshVertices = skyDomeMesh.Vertices
-        
-        meshFaceAreas = gismo_geometry.calculateMeshFaceAreas(skyDomeMesh)
-        skyDomeMeshArea = sum(meshFaceAreas)
-        skyDomeMeshArea2 = Rhino.Geometry.AreaMassProperties.Compute(skyDomeMesh).Area
-        #print "skyDomeMeshArea: ", skyDomeMeshArea
-        #print "skyDomeMeshArea2: ", skyDomeMeshArea2
-        
-        del skyDomeMeshPts
-        del meshVertices
-        del meshFaces
-        del skyDomeMesh
-        leaflessStartHOYdummy = 0; leaflessEndHOYdummy = 1
-        skyExposureFactor = 0  # 0 equals to 100% shading, 1 equals to 0% shading
-        for i,centroid in enumerate(meshFacesCentroids):
-            raysIntensityWithoutTransmissionIndex = meshFaceAreas[i]/skyDomeMeshArea
-            vector = Rhino.Geometry.Vector3d(centroid)-Rhino.Geometry.Vector3d(testPtLifted)
-            ray = Rhino.Geometry.Ray3d(testPtLifted, vector)
-            for meshIndex,mesh in enumerate(contextMeshes):
-                intersectParam = Rhino.Geometry.Intersect.Intersection.MeshRay(mesh,ray)
-                # ray hitted something
-                if intersectParam >= 0:
-                    seasonIndexDummy = self.noLeavesPeriod("perHoy", latitude, i, leaflessStartHOYdummy, leaflessEndHOYdummy)
-                    if meshIndex == 0:  # context mesh hitted
-                        treesTransmissionIndex = 0
-                    elif meshIndex == 1:  # coniferousTrees mesh hitted
-                        treesTransmissionIndex = treesTransmissionIndices[0]
-                    elif meshIndex == 2:  # deciduousTrees mesh hitted
-                        treesTransmissionIndex = treesTransmissionIndices[1][seasonIndexDummy]
-                    skyExposureFactor += raysIntensityWithoutTransmissionIndex*treesTransmissionIndex
-                    break
-            # no hitting, the ray only hits the sky dome
+        
+        meshesL = []
+        for mesh in contextMeshes:
+            if (mesh == None) or (mesh.Faces.Count == 0):
+                meshesL.append(None)
             else:
-                treesTransmissionIndex = 1
-                skyExposureFactor += raysIntensityWithoutTransmissionIndex * treesTransmissionIndex
+                meshesL.append(mesh)
+        
+        directions, weights = self.skyPatches(skySubdivision, precision)
+        
+        numOfTestPts = len(testPts)
+        numOfChunks = int(math.ceil(numOfTestPts/float(chunkSize)))
+        def chunkHitClasses(chunkIndex):
+            chunkClasses = array.array("B")
+            for testPt in testPts[chunkIndex*chunkSize : (chunkIndex+1)*chunkSize]:
+                # lifting up the testPt due to MeshRay intersection
+                testPtLifted = Rhino.Geometry.Point3d(testPt[0], testPt[1], testPt[2]+tol)
+                for direction in directions:
+                    ray = Rhino.Geometry.Ray3d(testPtLifted, direction)
+                    hitClass = 0  # no hitting, the ray only hits the sky dome
+                    for meshIndex,mesh in enumerate(meshesL):
+                        if (mesh != None) and (Rhino.Geometry.Intersect.Intersection.MeshRay(mesh,ray) >= 0):
+                            hitClass = meshIndex + 1
+                            break
+                    chunkClasses.append(hitClass)
+            return chunkClasses
         
-        del meshFacesCentroids
+        hitClasses = array.array("B")
+        for chunkClasses in gismo_kernels.runInParallel(chunkHitClasses, numOfChunks, parallel):
+            hitClasses.extend(chunkClasses)
         
-        return skyExposureFactor
+        return hitClasses
+    
+    
+    def skyExposureFactorsFromHitClasses(self, hitClasses, latitude, precision, treesTransmissionIndices=[0,[0,0]], skySubdivision="uv", leaflessStartHOY=None, leaflessEndHOY=None):
+        """
+        calculate sky exposure factors from the hit classes recorded by skyHitClasses (with the same precision and skySubdivision)
+        no rays are traced, so the factors can be recalculated for any treesTransmissionIndices and leafless period
+        deciduous trees transmission index is the leafless one (treesTransmissionIndices[1][0]) for the hours of the year (HOYs 1 to 8760) from leaflessStartHOY to leaflessEndHOY, and the inleaf one (treesTransmissionIndices[1][1]) for the rest of them. If the leafless period is not supplied, the trees are inleaf for the whole year
+        returns an array of sky exposure factors, one per test point
+        """
+        directions, weights = self.skyPatches(skySubdivision, precision)
+        numOfPatches = len(weights)
+        
+        # share of the hours of the year in which deciduous trees are leafless
+        numOfLeaflessHours = 0
+        if (leaflessStartHOY != None) and (leaflessEndHOY != None):
+            for hoy in xrange(1,8761):
+                if self.noLeavesPeriod("perHoy", latitude, hoy, leaflessStartHOY, leaflessEndHOY) == 0:
+                    numOfLeaflessHours += 1
+        leaflessShare = numOfLeaflessHours/8760.0
+        deciduousTreesTransmissionIndex = leaflessShare*treesTransmissionIndices[1][0] + (1-leaflessShare)*treesTransmissionIndices[1][1]
+        
+        # weight of each sky patch per hit class: sky, context, coniferousTrees, deciduousTrees
+        classWeightsL = [weights, [0]*numOfPatches, [weight*treesTransmissionIndices[0] for weight in weights], [weight*deciduousTreesTransmissionIndex for weight in weights]]
+        
+        skyExposureFactors = array.array("d")
+        for start in xrange(0, len(hitClasses), numOfPatches):
+            skyExposureFactor = 0  # 0 equals to 100% shading, 1 equals to 0% shading
+            for i,hitClass in enumerate(hitClasses[start:start+numOfPatches]):
+                skyExposureFactor += classWeightsL[hitClass][i]
+            skyExposureFactors.append(skyExposureFactor)
+        
+        return skyExposureFactors
+    
+    
+    def calculateSkyExposureFactors(self, testPts, contextMeshes, latitude, precision, treesTransmissionIndices=[0,[0,0]], skySubdivision="uv", chunkSize=256, parallel=True, leaflessStartHOY=None, leaflessEndHOY=None):
+        """
+        calculate sky exposure factors of a number of test points, in a single call
+        use skyHitClasses and skyExposureFactorsFromHitClasses instead, if the factors need to be recalculated for different trees transmission indices
+        returns an array of sky exposure factors, in the order of testPts
+        """
+        hitClasses = self.skyHitClasses(testPts, contextMeshes, precision, skySubdivision, chunkSize, parallel)
+        skyExposureFactors = self.skyExposureFactorsFromHitClasses(hitClasses, latitude, precision, treesTransmissionIndices, skySubdivision, leaflessStartHOY, leaflessEndHOY)
+        
+        return skyExposureFactors
 
 
 class GIS():
@@ -1922,6 +2153,35 @@ class GIS():
         return originPtProjected
     
     
+    def gridValues(self, grid, numOfRows, numOfColumns, noDataValue=None):
+        """
+        read all values of a MapWinGIS grid into a flat array("f"), row after row (the first row is at the top (north) of the grid)
+        whole rows are read at once with grid.GetRow. If the interop does not allow it, the values are read cell by cell
+        cells with noDataValue are set to float("nan")
+        """
+        values = array.array("f")
+        rowValues = System.Array.CreateInstance(System.Single, numOfColumns)
+        bulkRead = True
+        for k in xrange(numOfRows):
+            if bulkRead:
+                try:
+                    bulkRead = grid.GetRow(k, rowValues)
+                except Exception, e:
+                    # ref float parameter can not be passed as an array
+                    bulkRead = False
+            if bulkRead:
+                values.extend(rowValues)
+            else:
+                values.extend([grid.Value(i,k) for i in xrange(numOfColumns)])
+        
+        if noDataValue != None:
+            noDataValue = array.array("f", [noDataValue])[0]  # compare in single precision
+            if noDataValue in values:
+                values = array.array("f", [float("nan") if z == noDataValue else z for z in values])
+        
+        return values
+    
+    
     def projectedLocationCoordinates(self, locationLatitudeD, locationLongitudeD):
         """
         convert latitude,longitude coordinates to x,y projected coordinates
@@ -2323,6 +2583,25 @@ class OSM():
         return requiredKeyRequiredValue_dict
 
 
+# Rhino-free kernels (elevation grids, horizon angles, viewsheds, contours, UTM projection) and file caches are kept in the separate "gismo_kernels.py" module, so that they can be run and tested outside of Rhino
+gismo_mainComponent = mainComponent()
+gismoFolder, gismoFolderPrintMsg = gismo_mainComponent.gismoWorkingFolder(gismoFolder_)
+gismo_kernels, gismoKernelsPrintMsg = gismo_mainComponent.gismoKernels(gismoFolder)
+if gismo_kernels != None:
+    Terrain = gismo_kernels.Terrain
+    HorizonProfiles = gismo_kernels.HorizonProfiles
+    ElevationTiles = gismo_kernels.ElevationTiles
+    GeoTiff = gismo_kernels.GeoTiff
+    DEMTileCache = gismo_kernels.DEMTileCache
+else:
+    # the gismoKernelsPrintMsg warning is raised bellow. Only the components tagged with "#requiresGismoKernels" are not run (see Check.versionDate)
+    Terrain = None
+    HorizonProfiles = None
+    ElevationTiles = None
+    GeoTiff = None
+    DEMTileCache = None
+
+
 def raiseWarning(booleanValue, printMsg):
     if not booleanValue:
         level = Grasshopper.Kernel.GH_RuntimeMessageLevel.Warning
@@ -2338,22 +2617,29 @@ sc.sticky["gismo_CreateGeometry"] = CreateGeometry
 sc.sticky["gismo_EnvironmentalAnalysis"] = EnvironmentalAnalysis
 sc.sticky["gismo_GIS"] = GIS
 sc.sticky["gismo_OSM"] = OSM
+sc.sticky["gismo_Terrain"] = Terrain
+sc.sticky["gismo_HorizonProfiles"] = HorizonProfiles
+sc.sticky["gismo_ElevationTiles"] = ElevationTiles
+sc.sticky["gismo_GeoTiff"] = GeoTiff
+sc.sticky["gismo_DEMTileCache"] = DEMTileCache
+sc.sticky["gismo_kernels"] = gismo_kernels
 sc.sticky["gismo_mapwingisFolder"] = mapFolder_
 
 # check gismoFolder
-gismo_mainComponent = mainComponent()
-gismoFolder, printMsg = gismo_mainComponent.gismoWorkingFolder(gismoFolder_)
-raiseWarning(gismoFolder, printMsg)
+raiseWarning(gismoFolder, gismoFolderPrintMsg)
 sc.sticky["gismo_gismoFolder"] = gismoFolder
 
+# check gismo_kernels
+raiseWarning(gismo_kernels, gismoKernelsPrintMsg)
+
 # check mapWinGIS
 iteropMapWinGIS_dll_folderPath, gdalDataPath_folderPath, validInstallFolder, printMsg = gismo_mainComponent.mapWinGIS(mapFolder_)
 raiseWarning(validInstallFolder, printMsg)
 
-if gismoFolder and validInstallFolder:
+if gismoFolder and gismo_kernels and validInstallFolder:
     print "The Gismo penguin is peeping!! Gismo Gismo component is ran successfully!\n\ngismoFolder_: %s\nmapFolder_: %s" % (gismoFolder, iteropMapWinGIS_dll_folderPath)
 if gismoFolder:
-    sc.sticky["gismoGismo_released"] = ""  # mapWinGIS might not be used for all components, so validInstallFolder = True is not important for all components
+    sc.sticky["gismoGismo_released"] = ""  # mapWinGIS and gismo_kernels might not be used for all components, so validInstallFolder = True and gismo_kernels != None are not important for all components
     # online check of Gismo Gismo version from the github repository
 
 # send the Gismo_Gismo component to the back
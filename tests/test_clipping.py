@@ -0,0 +1,117 @@
+"""
+Tests of the clipping of grids, meshes and polylines of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+terrain = gismo_kernels.Terrain()
+
+
+def plane(x, y):
+    return 2*x + 3*y - 1
+
+
+def test_grid_is_clipped_on_the_rectangle_edges():
+    xL = [float(x) for x in range(11)]
+    yL = [float(y) for y in range(10, -1, -1)]  # rows start at the top of the grid
+    zValues = [plane(x, y) for y in yL for x in xL]
+    clippedXL, clippedYL, clippedZvalues = terrain.clipGridToRectangle(xL, yL, zValues, 2.5, 6.25, 1.2, 7)
+    
+    assert clippedXL == [2.5, 3, 4, 5, 6, 6.25]
+    assert [round(y, 9) for y in clippedYL] == [7, 6, 5, 4, 3, 2, 1.2]
+    assert len(clippedZvalues) == 6*7
+    for rowIndex, y in enumerate(clippedYL):
+        for columnIndex, x in enumerate(clippedXL):
+            # linearly interpolated elevations of a plane are exact
+            assert abs(clippedZvalues[rowIndex*6 + columnIndex] - plane(x, y)) < 1e-9
+
+
+def test_grid_inside_the_rectangle_is_not_changed():
+    xL = [0.0, 0.5, 1.0, 1.5]
+    yL = [1.0, 0.5, 0.0]
+    zValues = [1, 2, 3, 4, 5, None, 7, 8, 9, 10, 11, 12]
+    assert terrain.clipGridToRectangle(xL, yL, zValues, -10, 10, -10, 10) == (xL, yL, zValues)
+
+
+def test_elevations_interpolated_from_no_data_have_no_data():
+    xL = [0.0, 1.0, 2.0, 3.0]
+    yL = [2.0, 1.0, 0.0]
+    zValues = [0, 1, 2, 3,
+               4, None, 6, 7,
+               8, 9, 10, 11]
+    clippedXL, clippedYL, clippedZvalues = terrain.clipGridToRectangle(xL, yL, zValues, 0.5, 3, 0, 1)
+    assert clippedXL == [0.5, 1, 2, 3] and clippedYL == [1, 0]
+    assert clippedZvalues[0] != clippedZvalues[0] and clippedZvalues[1] == None  # NaN next to the no data point, and the no data point itself
+    assert clippedZvalues[2:] == [6, 7, 8.5, 9, 10, 11]
+
+
+def gridFaces(halfSize, numOfCells):
+    # counterclockwise quads of a grid of the plane's vertices
+    spacing = 2.0*halfSize/numOfCells
+    verticesL = [(-halfSize + k*spacing, -halfSize + i*spacing, plane(-halfSize + k*spacing, -halfSize + i*spacing)) for i in range(numOfCells+1) for k in range(numOfCells+1)]
+    facesL = []
+    for i in range(numOfCells):
+        for k in range(numOfCells):
+            a = i*(numOfCells+1) + k
+            facesL.append((a, a+1, a+numOfCells+2, a+numOfCells+1))
+    return verticesL, facesL
+
+
+def signedArea(verticesL, face):
+    pointsL = [verticesL[index] for index in face]
+    return 0.5*sum(x0*y1 - x1*y0 for (x0,y0,z0),(x1,y1,z1) in zip(pointsL, pointsL[1:] + pointsL[:1]))
+
+
+def test_mesh_is_clipped_to_the_circle_without_cracks():
+    centerX, centerY, radius = 0.2, 0.1, 3.3
+    verticesL, facesL = gridFaces(5, 10)
+    clippedVerticesL, clippedFacesL = terrain.clipFacesToCircle(verticesL, facesL, centerX, centerY, radius)
+    
+    for x, y, z in clippedVerticesL:
+        assert math.hypot(x - centerX, y - centerY) <= radius + 1e-9
+        assert abs(z - plane(x, y)) < 1e-9
+    facesAreasL = [signedArea(clippedVerticesL, face) for face in clippedFacesL]
+    assert min(facesAreasL) > 0  # faces keep their orientation
+    assert 0.98*math.pi*radius*radius < sum(facesAreasL) < math.pi*radius*radius  # the arcs are replaced with straight lines
+    
+    # edges are shared by two faces, except the boundary edges along the circle
+    edgeFacesD = {}
+    for face in clippedFacesL:
+        for indexA, indexB in zip(face, face[1:] + face[:1]):
+            edgeFacesD.setdefault((min(indexA, indexB), max(indexA, indexB)), []).append(face)
+    for (indexA, indexB), edgeFacesL in edgeFacesD.items():
+        assert len(edgeFacesL) <= 2
+        if len(edgeFacesL) == 1:
+            for index in (indexA, indexB):
+                x, y, z = clippedVerticesL[index]
+                assert abs(math.hypot(x - centerX, y - centerY) - radius) < 1e-9
+
+
+def test_faces_inside_and_outside_of_the_circle():
+    verticesL, facesL = gridFaces(1, 2)
+    clippedVerticesL, clippedFacesL = terrain.clipFacesToCircle(verticesL, facesL, 0, 0, 10)
+    # vertices are renumbered in the order of the faces
+    assert [[clippedVerticesL[index] for index in face] for face in clippedFacesL] == [[verticesL[index] for index in face] for face in facesL]
+    assert terrain.clipFacesToCircle(verticesL, facesL, 20, 0, 10) == ([], [])
+
+
+def test_polyline_is_clipped_to_the_circle():
+    partsL = terrain.clipPolylineToCircle([(-10, 0, 0), (0, 0, 5), (10, 0, 10), (10, 10, 10)], 0, 0, 4)
+    assert partsL == [[(-4, 0, 3), (0, 0, 5), (4, 0, 7)]]
+    assert terrain.clipPolylineToCircle([(-10, 5, 0), (10, 5, 0)], 0, 0, 4) == []
+
+
+def test_closed_polyline_is_joined_back_at_its_start():
+    # square with its corners outside of the circle, starting in the middle of a side
+    squarePointsL = [(0, -2, 0), (2, -2, 0), (2, 2, 0), (-2, 2, 0), (-2, -2, 0), (0, -2, 0)]
+    partsL = terrain.clipPolylineToCircle(squarePointsL, 0, 0, 2.5)
+    assert len(partsL) == 4
+    assert partsL[0][1] == (0, -2, 0) and len(partsL[0]) == 3
+    for part in partsL:
+        for x, y, z in (part[0], part[-1]):
+            assert abs(math.hypot(x, y) - 2.5) < 1e-9
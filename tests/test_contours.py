@@ -0,0 +1,85 @@
+"""
+Tests of the contour lines of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+terrain = gismo_kernels.Terrain()
+
+
+def flatGrid(heightFunction, numOfRows, numOfColumns):
+    return [heightFunction(column, row) for row in range(numOfRows) for column in range(numOfColumns)]
+
+
+def assertOnLevel(zValues, numOfColumns, level, pointsL):
+    # each point lies on a cell edge, where the elevations are linearly interpolated
+    for column, row in pointsL:
+        onVerticalEdge = (column == int(column)); onHorizontalEdge = (row == int(row))
+        assert onVerticalEdge or onHorizontalEdge
+        if onHorizontalEdge:
+            column0 = min(int(math.floor(column)), numOfColumns-2); fraction = column - column0
+            z0 = zValues[int(row)*numOfColumns + column0]; z1 = zValues[int(row)*numOfColumns + column0 + 1]
+        else:
+            row0 = int(math.floor(row)); fraction = row - row0
+            z0 = zValues[row0*numOfColumns + int(column)]; z1 = zValues[(row0+1)*numOfColumns + int(column)]
+        assert abs(z0 + (z1 - z0)*fraction - level) < 1e-9
+
+
+def test_contours_of_a_cone_are_closed_circles():
+    numOfRows = numOfColumns = 41
+    zValues = flatGrid(lambda column, row: 100 - math.hypot(column - 20, row - 20), numOfRows, numOfColumns)
+    contoursL = terrain.contourPolylines(zValues, numOfRows, numOfColumns, [85, 95, 200])
+    assert sorted(level for level, pointsL in contoursL) == [85, 95]
+    
+    for level, pointsL in contoursL:
+        assert pointsL[0] == pointsL[-1]
+        assert len(pointsL) > 8
+        assertOnLevel(zValues, numOfColumns, level, pointsL)
+        for column, row in pointsL:
+            # cones are linearly interpolated between the grid points, so the circles are approximated within a fraction of a cell
+            assert abs(math.hypot(column - 20, row - 20) - (100 - level)) < 0.3
+
+
+def test_contours_of_a_plane_are_open_lines():
+    numOfRows, numOfColumns = 6, 9
+    zValues = flatGrid(lambda column, row: 2.0*column, numOfRows, numOfColumns)
+    contoursL = terrain.contourPolylines(zValues, numOfRows, numOfColumns, [5, 11.5])
+    assert len(contoursL) == 2
+    for level, pointsL in contoursL:
+        assert sorted(pointsL, key=lambda point: point[1]) == [(level/2.0, row) for row in range(numOfRows)]
+
+
+def test_contours_stop_at_cells_with_no_data():
+    numOfRows, numOfColumns = 7, 5
+    zValues = flatGrid(lambda column, row: float(column), numOfRows, numOfColumns)
+    zValues[3*numOfColumns + 2] = float("nan")
+    contoursL = terrain.contourPolylines(zValues, numOfRows, numOfColumns, [1.5])
+    # the cells touching the no data point are left out, so the line is split into two parts
+    assert sorted(sorted(pointsL, key=lambda point: point[1]) for level, pointsL in contoursL) == [[(1.5, 0), (1.5, 1), (1.5, 2)], [(1.5, 4), (1.5, 5), (1.5, 6)]]
+
+
+def test_saddle_cells_are_resolved_by_the_mean_elevation():
+    # the mean elevation of the cell (0.5) is above the level 0.4: the high corners are connected
+    contoursL = terrain.contourPolylines([1, 0, 0, 1], 2, 2, [0.4, 0.6])
+    contoursD = {}
+    for level, pointsL in contoursL:
+        contoursD.setdefault(level, []).append(sorted((round(column, 9), round(row, 9)) for column, row in pointsL))
+    assert sorted(contoursD[0.4]) == [[(0, 0.6), (0.4, 1)], [(0.6, 0), (1, 0.4)]]
+    # and below the level 0.6: the low corners are connected
+    assert sorted(contoursD[0.6]) == [[(0, 0.4), (0.4, 0)], [(0.6, 1), (1, 0.6)]]
+
+
+def test_contours_of_two_peaks():
+    numOfRows, numOfColumns = 21, 41
+    zValues = flatGrid(lambda column, row: 10*math.exp(-((column - 10)**2 + (row - 10)**2)/30.0) + 10*math.exp(-((column - 30)**2 + (row - 10)**2)/30.0), numOfRows, numOfColumns)
+    contoursL = terrain.contourPolylines(zValues, numOfRows, numOfColumns, [5])
+    assert len(contoursL) == 2
+    for level, pointsL in contoursL:
+        assert pointsL[0] == pointsL[-1]
+        assertOnLevel(zValues, numOfColumns, level, pointsL)
+    assert sorted(round(sum(column for column, row in pointsL[:-1]) / (len(pointsL)-1)) for level, pointsL in contoursL) == [10, 30]
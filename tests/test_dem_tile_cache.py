@@ -0,0 +1,121 @@
+"""
+Tests of the DEM tiles cache of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+tiles are "downloaded" by writing them with DEMTileCache.writeGeoTiff, so their elevations are known
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+cellSize = 0.1  # 10x10 cells per tile
+
+
+def elevation(latitude, longitude):
+    return 100*latitude + longitude
+
+
+class FakeDownloads(object):
+    # download functions of the DEMTileCache methods, which write tiles instead of downloading them
+    def __init__(self, demTileCache, noDataCell=None, invalidTiles=()):
+        self.demTileCache = demTileCache
+        self.noDataCell = noDataCell  # (latitude, longitude) of a cell with no data
+        self.invalidTiles = invalidTiles  # (south, west) of the tiles whose "download" is an error page
+        self.downloadedLinksL = []
+    
+    def downloadLink(self, south, north, west, east):
+        return "https://dem.example/?south=%s&north=%s&west=%s&east=%s" % (south, north, west, east)
+    
+    def downloadFile(self, downloadLink, filePath):
+        self.downloadedLinksL.append(downloadLink)
+        south, north, west, east = [int(parameter.split("=")[1]) for parameter in downloadLink.split("?")[1].split("&")]
+        if (south, west) in self.invalidTiles:
+            with open(filePath, "wb") as myFile:
+                myFile.write(b"<html>Too many requests</html>")
+            return True
+        
+        def elevationsRow(row):
+            latitude = north - (row+0.5)*cellSize
+            elevationsL = []
+            for column in range(10):
+                longitude = west + (column+0.5)*cellSize
+                noData = (self.noDataCell != None) and (abs(latitude - self.noDataCell[0]) < cellSize/2) and (abs(longitude - self.noDataCell[1]) < cellSize/2)
+                elevationsL.append(None if noData else elevation(latitude, longitude))
+            return elevationsL
+        self.demTileCache.writeGeoTiff(filePath, west, north, cellSize, cellSize, 10, 10, elevationsRow)
+        return True
+
+
+def test_tile_file_names():
+    demTileCache = gismo_kernels.DEMTileCache("cache")
+    assert demTileCache.tileFilePath("SRTMGL3", 44, 20) == os.path.join("cache", "SRTMGL3_N44_E020.tif")
+    assert demTileCache.tileFilePath("SRTMGL3", -1, -79) == os.path.join("cache", "SRTMGL3_S01_W079.tif")
+    assert demTileCache.tileIndices(44.55, 45.25, 20.65, 21.35) == [(44, 20), (44, 21), (45, 20), (45, 21)]
+    assert demTileCache.tileIndices(44.2, 44.2, 20.3, 20.3) == [(44, 20)]
+
+
+def test_mosaic_of_four_tiles(tmp_path):
+    demTileCache = gismo_kernels.DEMTileCache(str(tmp_path))
+    downloads = FakeDownloads(demTileCache, noDataCell=(45.05, 20.95))
+    outputFilePath = str(tmp_path / "region.tiff")
+    assert demTileCache.mosaic("SRTMGL3", 44.55, 45.25, 20.65, 21.35, outputFilePath, downloads.downloadLink, downloads.downloadFile)
+    assert len(downloads.downloadedLinksL) == 4
+    
+    geoTiff = gismo_kernels.GeoTiff(outputFilePath)
+    assert geoTiff.epsgCode == 4326
+    # the raster is aligned to the cells of the tiles
+    assert abs(geoTiff.originX - 20.6) < 1e-9 and abs(geoTiff.originY - 45.3) < 1e-9
+    assert (geoTiff.numOfRows, geoTiff.numOfColumns) == (8, 8)
+    for row, elevationsRow in enumerate(geoTiff.readWindow(0, 0, 8, 8)):
+        for column, z in enumerate(elevationsRow):
+            longitude, latitude = geoTiff.cellCenter(row, column)
+            if (abs(latitude - 45.05) < 1e-6) and (abs(longitude - 20.95) < 1e-6):
+                assert z == None
+            else:
+                assert abs(z - elevation(latitude, longitude)) < 0.01  # float32 elevations
+    geoTiff.close()
+
+
+def test_cached_tiles_are_not_downloaded_again(tmp_path):
+    demTileCache = gismo_kernels.DEMTileCache(str(tmp_path))
+    downloads = FakeDownloads(demTileCache)
+    assert demTileCache.mosaic("SRTMGL3", 44.2, 44.8, 20.2, 20.8, str(tmp_path / "first.tiff"), downloads.downloadLink, downloads.downloadFile)
+    assert demTileCache.mosaic("SRTMGL3", 44.2, 44.8, 20.2, 21.8, str(tmp_path / "second.tiff"), downloads.downloadLink, downloads.downloadFile)
+    assert downloads.downloadedLinksL == [downloads.downloadLink(44, 45, 20, 21), downloads.downloadLink(44, 45, 21, 22)]
+    # tiles of other DEM sources are cached separately
+    assert demTileCache.mosaic("AW3D30", 44.2, 44.8, 20.2, 20.8, str(tmp_path / "third.tiff"), downloads.downloadLink, downloads.downloadFile)
+    assert len(downloads.downloadedLinksL) == 3
+
+
+def test_invalid_downloads_are_not_cached(tmp_path):
+    demTileCache = gismo_kernels.DEMTileCache(str(tmp_path))
+    downloads = FakeDownloads(demTileCache, invalidTiles=[(44, 21)])
+    outputFilePath = str(tmp_path / "region.tiff")
+    assert not demTileCache.mosaic("SRTMGL3", 44.2, 44.8, 20.2, 21.8, outputFilePath, downloads.downloadLink, downloads.downloadFile)
+    assert not os.path.exists(demTileCache.tileFilePath("SRTMGL3", 44, 21))
+    assert not os.path.exists(outputFilePath)
+    # regions crossing the antimeridian are not mosaicked
+    assert not demTileCache.mosaic("SRTMGL3", 10.2, 10.8, 179.5, -179.5, outputFilePath, downloads.downloadLink, downloads.downloadFile)
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path):
+    demTileCache = gismo_kernels.DEMTileCache(str(tmp_path))
+    downloads = FakeDownloads(demTileCache)
+    now = time.time()
+    tileFilePathsL = []
+    for index in range(3):
+        tileFilePath = demTileCache.tileFilePath("SRTMGL3", 44, 20+index)
+        downloads.downloadFile(downloads.downloadLink(44, 45, 20+index, 21+index), tileFilePath)
+        os.utime(tileFilePath, (now - 100 + index, now - 100 + index))
+        tileFilePathsL.append(tileFilePath)
+    tileSize = os.path.getsize(tileFilePathsL[0])
+    
+    demTileCache.maxFolderSizeBytes = 2*tileSize  # room for two tiles
+    demTileCache.evict(keepFilePathsL=[tileFilePathsL[0]])
+    assert [os.path.exists(tileFilePath) for tileFilePath in tileFilePathsL] == [True, False, True]
+    
+    demTileCache.maxFolderSizeBytes = tileSize
+    demTileCache.evict()
+    assert [os.path.exists(tileFilePath) for tileFilePath in tileFilePathsL] == [False, False, True]
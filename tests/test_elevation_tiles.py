@@ -0,0 +1,92 @@
+"""
+Tests of the elevation tiles files of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+
+def elevation(row, column):
+    return 100 + 3*row - 2*column + (row*column) % 7
+
+
+def writeGrid(filePath, numOfRows, numOfColumns):
+    elevationTiles = gismo_kernels.ElevationTiles(filePath, numOfRows, numOfColumns)
+    elevationTiles.writeWindow(0, 0, [[elevation(row, column) for column in range(numOfColumns)] for row in range(numOfRows)])
+    return elevationTiles
+
+
+def test_windows_are_read_back_as_written(tmp_path):
+    filePath = str(tmp_path / "grid.getf")
+    elevationTiles = gismo_kernels.ElevationTiles(filePath, 4, 5)
+    assert elevationTiles.readWindow(0, 0, 4, 5) == [[None]*5]*4  # new files have no data
+    
+    elevationTiles.writeWindow(1, 2, [[1.5, None], [-2.25, 3]])
+    elevationTiles.close()
+    
+    elevationTiles = gismo_kernels.ElevationTiles(filePath)
+    assert (elevationTiles.numOfRows, elevationTiles.numOfColumns) == (4, 5)
+    assert elevationTiles.readWindow(1, 1, 2, 3) == [[None, 1.5, None], [None, -2.25, 3]]
+    # windows are clipped to the grid
+    assert elevationTiles.readWindow(3, 4, 10, 10) == [[None]]
+    assert elevationTiles.readWindow(-1, 2, 3, 1) == [[None], [1.5]]
+    assert elevationTiles.readWindow(4, 0, 1, 1) == []
+    elevationTiles.close(True)
+    assert not os.path.exists(filePath)
+
+
+def test_invalid_files_are_not_opened(tmp_path):
+    filePath = str(tmp_path / "invalid.getf")
+    with open(filePath, "wb") as myFile:
+        myFile.write(b"GHPF" + b"\x00"*10)
+    with pytest.raises(ValueError):
+        gismo_kernels.ElevationTiles(filePath)
+
+
+def test_tiles_with_halo_are_stitched_seamlessly(tmp_path):
+    numOfRows, numOfColumns = 11, 9
+    elevationTiles = writeGrid(str(tmp_path / "grid.getf"), numOfRows, numOfColumns)
+    
+    def maximum3x3(windowLL):
+        # maximum of the 3x3 cells around each cell of the window
+        return [[max(windowLL[r][c] for r in range(max(row-1, 0), min(row+2, len(windowLL))) for c in range(max(column-1, 0), min(column+2, len(windowLL[0])))) for column in range(len(windowLL[0]))] for row in range(len(windowLL))]
+    
+    outputTiles = elevationTiles.mapTiles(maximum3x3, str(tmp_path / "maximum.getf"), tileSize=4, halo=1)
+    wholeGridLL = [[elevation(row, column) for column in range(numOfColumns)] for row in range(numOfRows)]
+    assert outputTiles.readWindow(0, 0, numOfRows, numOfColumns) == maximum3x3(wholeGridLL)
+    outputTiles.close(True)
+    elevationTiles.close(True)
+
+
+def test_tiles_are_downsampled(tmp_path):
+    numOfRows, numOfColumns = 7, 10
+    elevationTiles = writeGrid(str(tmp_path / "grid.getf"), numOfRows, numOfColumns)
+    
+    def maximum2x2(windowLL):
+        # maximum of each 2x2 block of cells (blocks at the window's edges are clipped)
+        return [[max(max(rowL[column:column+2]) for rowL in windowLL[row:row+2]) for column in range(0, len(windowLL[0]), 2)] for row in range(0, len(windowLL), 2)]
+    
+    outputTiles = elevationTiles.mapTiles(maximum2x2, str(tmp_path / "downsampled.getf"), tileSize=4, halo=2, shrinkFactor=2)
+    assert (outputTiles.numOfRows, outputTiles.numOfColumns) == (4, 5)
+    wholeGridLL = [[elevation(row, column) for column in range(numOfColumns)] for row in range(numOfRows)]
+    assert outputTiles.readWindow(0, 0, 4, 5) == maximum2x2(wholeGridLL)
+    outputTiles.close(True)
+    elevationTiles.close(True)
+
+
+def test_results_file_is_deleted_if_processing_fails(tmp_path):
+    elevationTiles = writeGrid(str(tmp_path / "grid.getf"), 6, 6)
+    outputFilePath = str(tmp_path / "failed.getf")
+    
+    def failingFunction(windowLL):
+        raise ValueError("no data")
+    
+    with pytest.raises(ValueError):
+        elevationTiles.mapTiles(failingFunction, outputFilePath, tileSize=4)
+    assert not os.path.exists(outputFilePath)
+    elevationTiles.close(True)
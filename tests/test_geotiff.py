@@ -0,0 +1,317 @@
+"""
+Tests of the GeoTIFF reader of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+GeoTIFF files are written by the tests themselves, so that their elevations are known
+"""
+
+import os
+import random
+import struct
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+typeFormats = {2:"s", 3:"H", 4:"I", 12:"d", 16:"Q"}  # TIFF field type: struct format
+
+
+def writeTiff(filePath, tagsL, blocksL, tiled, byteOrder="<", bigTiff=False):
+    # single image TIFF file. tagsL are (tag, field type, values) tuples, and blocksL the encoded strips or tiles
+    data = bytearray(16 if bigTiff else 8)
+    blockOffsetsL = []
+    for block in blocksL:
+        blockOffsetsL.append(len(data))
+        data.extend(block)
+    offsetsType = 16 if bigTiff else 4
+    tagsL = tagsL + [(324 if tiled else 273, offsetsType, blockOffsetsL), (325 if tiled else 279, offsetsType, [len(block) for block in blocksL])]
+    tagsL.sort()
+    
+    entryFormat, valueSize = ("HHQ", 8) if bigTiff else ("HHI", 4)
+    data.extend(bytearray(len(data) % 2))
+    ifdOffset = len(data)
+    ifdSize = (8 if bigTiff else 2) + len(tagsL)*(4 + 2*valueSize) + valueSize
+    ifd = bytearray(struct.pack(byteOrder + ("Q" if bigTiff else "H"), len(tagsL)))
+    extraValues = bytearray()
+    for tag, fieldType, values in tagsL:
+        if fieldType == 2:
+            packedValues = values
+        else:
+            packedValues = struct.pack(byteOrder + "%s%s" % (len(values), typeFormats[fieldType]), *values)
+        ifd.extend(struct.pack(byteOrder + entryFormat, tag, fieldType, len(values)))
+        if len(packedValues) <= valueSize:
+            ifd.extend(packedValues + bytearray(valueSize - len(packedValues)))
+        else:
+            ifd.extend(struct.pack(byteOrder + entryFormat[2], ifdOffset + ifdSize + len(extraValues)))
+            extraValues.extend(packedValues + bytearray(len(packedValues) % 2))
+    ifd.extend(bytearray(valueSize))  # no next image
+    data.extend(ifd + extraValues)
+    
+    if bigTiff:
+        data[:16] = (b"II" if byteOrder == "<" else b"MM") + struct.pack(byteOrder + "HHHQ", 43, 8, 0, ifdOffset)
+    else:
+        data[:8] = (b"II" if byteOrder == "<" else b"MM") + struct.pack(byteOrder + "HI", 42, ifdOffset)
+    with open(filePath, "wb") as myFile:
+        myFile.write(bytes(data))
+
+
+def lzwEncode(data):
+    # TIFF LZW compression (most significant bit first codes, with early change), the same as libtiff's
+    def newTable():
+        return dict((bytes(bytearray([i])), i) for i in range(256))
+    table = newTable()
+    nextCode = 258
+    codeLength = 9
+    codesL = [(256, codeLength)]  # (code, code length)
+    word = b""
+    for i in range(len(data)):
+        character = data[i:i+1]
+        if (word + character) in table:
+            word += character
+            continue
+        codesL.append((table[word], codeLength))
+        table[word + character] = nextCode
+        nextCode += 1
+        if nextCode == 4094:
+            codesL.append((256, codeLength))
+            table = newTable()
+            nextCode = 258
+            codeLength = 9
+        elif nextCode == (1 << codeLength):
+            codeLength += 1
+        word = character
+    codesL.append((table[word], codeLength))
+    nextCode += 1
+    if nextCode == (1 << codeLength):
+        codeLength += 1
+    codesL.append((257, codeLength))
+    
+    bits = 0; numOfBits = 0
+    encoded = bytearray()
+    for code, codeLength in codesL:
+        bits = (bits << codeLength) | code
+        numOfBits += codeLength
+        while numOfBits >= 8:
+            numOfBits -= 8
+            encoded.append((bits >> numOfBits) & 255)
+    if numOfBits > 0:
+        encoded.append((bits << (8 - numOfBits)) & 255)
+    return bytes(encoded)
+
+
+def packBitsEncode(data):
+    # PackBits: runs of 3 or more equal bytes are repeated, the other bytes are copied as literal runs
+    data = bytearray(data)
+    encoded = bytearray()
+    literal = bytearray()
+    i = 0
+    while i < len(data):
+        runLength = 1
+        while (i + runLength < len(data)) and (data[i+runLength] == data[i]) and (runLength < 128):
+            runLength += 1
+        if runLength >= 3:
+            if literal:
+                encoded.append(len(literal)-1); encoded.extend(literal); literal = bytearray()
+            encoded.append(257-runLength); encoded.append(data[i])
+            i += runLength
+        else:
+            literal.append(data[i])
+            if len(literal) == 128:
+                encoded.append(127); encoded.extend(literal); literal = bytearray()
+            i += 1
+    if literal:
+        encoded.append(len(literal)-1); encoded.extend(literal)
+    return bytes(encoded)
+
+
+def encodeRow(rowValues, sampleFormat, byteOrder, predictor, samplesPerPixel):
+    # bytes of a row of samples of a block, with the predictor applied
+    if predictor == 2:
+        bits = 8*struct.calcsize(sampleFormat)
+        unsignedValues = [value % (1 << bits) for value in rowValues]
+        differences = unsignedValues[:samplesPerPixel] + [(unsignedValues[i] - unsignedValues[i-samplesPerPixel]) % (1 << bits) for i in range(samplesPerPixel, len(rowValues))]
+        return struct.pack(byteOrder + "%s%s" % (len(rowValues), sampleFormat.upper()), *differences)
+    if predictor == 3:
+        # bytes grouped by their significance, and differenced
+        bytesPerSample = struct.calcsize(sampleFormat)
+        samplesBytes = bytearray(struct.pack(">%s%s" % (len(rowValues), sampleFormat), *rowValues))
+        rowBytes = bytearray()
+        for byteIndex in range(bytesPerSample):
+            rowBytes.extend(samplesBytes[byteIndex::bytesPerSample])
+        for i in range(len(rowBytes)-1, samplesPerPixel-1, -1):
+            rowBytes[i] = (rowBytes[i] - rowBytes[i-samplesPerPixel]) & 255
+        return bytes(rowBytes)
+    return struct.pack(byteOrder + "%s%s" % (len(rowValues), sampleFormat), *rowValues)
+
+
+def writeGeoTiff(filePath, valuesLL, sampleFormat, compression=1, predictor=1, tileSize=None, rowsPerStrip=None, samplesPerPixel=1, byteOrder="<", bigTiff=False, extraTagsL=()):
+    # write the valuesLL grid (rows of samples, interleaved by pixel) to a GeoTIFF file, with 30 m cells and the upper left corner at (500000, 4600000) of UTM zone 34N
+    numOfRows = len(valuesLL)
+    numOfColumns = len(valuesLL[0]) // samplesPerPixel
+    zero = 0.0 if sampleFormat in "fd" else 0
+    blocksRowsLLL = []
+    if tileSize != None:
+        blockWidth = blockHeight = tileSize
+        for row0 in range(0, numOfRows, tileSize):
+            for column0 in range(0, numOfColumns, tileSize):
+                # tiles are padded to their full size
+                tileRowsLL = []
+                for row in range(row0, row0+tileSize):
+                    rowValues = valuesLL[row][column0*samplesPerPixel:(column0+tileSize)*samplesPerPixel] if row < numOfRows else []
+                    tileRowsLL.append(rowValues + [zero]*(tileSize*samplesPerPixel - len(rowValues)))
+                blocksRowsLLL.append(tileRowsLL)
+    else:
+        blockWidth = numOfColumns
+        blockHeight = rowsPerStrip or numOfRows
+        blocksRowsLLL = [valuesLL[row0:row0+blockHeight] for row0 in range(0, numOfRows, blockHeight)]  # the last strip is shorter
+    
+    blocksL = []
+    for blockRowsLL in blocksRowsLLL:
+        block = b"".join(encodeRow(rowValues, sampleFormat, byteOrder, predictor, samplesPerPixel) for rowValues in blockRowsLL)
+        if compression == 8:
+            block = zlib.compress(block)
+        elif compression == 5:
+            block = lzwEncode(block)
+        elif compression == 32773:
+            block = packBitsEncode(block)
+        blocksL.append(block)
+    
+    sampleFormatTag = 3 if sampleFormat in "fd" else (2 if sampleFormat.islower() else 1)
+    tagsL = [(256, 4, [numOfColumns]), (257, 4, [numOfRows]), (258, 3, [8*struct.calcsize(sampleFormat)]*samplesPerPixel), (259, 3, [compression]), (277, 3, [samplesPerPixel]), (317, 3, [predictor]), (339, 3, [sampleFormatTag]*samplesPerPixel),
+             (33550, 12, [30.0, 30.0, 0.0]), (33922, 12, [0.0, 0.0, 0.0, 500000.0, 4600000.0, 0.0])]
+    if tileSize != None:
+        tagsL += [(322, 3, [blockWidth]), (323, 3, [blockHeight])]
+    else:
+        tagsL += [(278, 3, [blockHeight])]
+    writeTiff(filePath, tagsL + list(extraTagsL), blocksL, tileSize != None, byteOrder, bigTiff)
+
+
+def int16Grid(numOfRows, numOfColumns):
+    return [[row*100 - column*37 - 200 for column in range(numOfColumns)] for row in range(numOfRows)]
+
+
+def float32Grid(numOfRows, numOfColumns):
+    return [[100.125 + 0.5*row - 1.25*column for column in range(numOfColumns)] for row in range(numOfRows)]
+
+
+@pytest.mark.parametrize("byteOrder", ["<", ">"])
+def test_georeferencing_and_no_data(tmp_path, byteOrder):
+    filePath = str(tmp_path / "dem.tif")
+    valuesLL = int16Grid(6, 5)
+    valuesLL[2][3] = -9999
+    geoKeyDirectory = [1, 1, 0, 3, 1024, 0, 1, 1, 1025, 0, 1, 1, 3072, 0, 1, 32634]  # projected, RasterPixelIsArea, UTM zone 34N
+    writeGeoTiff(filePath, valuesLL, "h", rowsPerStrip=4, byteOrder=byteOrder, extraTagsL=[(34735, 3, geoKeyDirectory), (42113, 2, b"-9999\x00")])
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert (geoTiff.numOfRows, geoTiff.numOfColumns) == (6, 5)
+    assert geoTiff.epsgCode == 32634
+    assert (geoTiff.originX, geoTiff.originY, geoTiff.cellSizeX, geoTiff.cellSizeY) == (500000, 4600000, 30, 30)
+    assert geoTiff.cellCenter(2, 3) == (500105, 4599925)
+    assert geoTiff.windowFromBounds(500031, 4599850, 500089, 4599941) == (1, 1, 4, 2)
+    assert geoTiff.windowFromBounds(499000, 4599000, 501000, 4601000) == (0, 0, 6, 5)  # clipped to the grid
+    
+    windowLL = geoTiff.readWindow(1, 2, 4, 10)
+    assert windowLL == [[-174, -211, -248], [-74, None, -148], [26, -11, -48], [126, 89, 52]]
+    geoTiff.close()
+
+
+
+@pytest.mark.parametrize("compression", [1, 5, 8, 32773])
+@pytest.mark.parametrize("layout", [{"rowsPerStrip": 5}, {"tileSize": 16}])
+def test_compressions_of_strips_and_tiles(tmp_path, compression, layout):
+    filePath = str(tmp_path / "dem.tif")
+    valuesLL = float32Grid(37, 29)
+    writeGeoTiff(filePath, valuesLL, "f", compression=compression, **layout)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.readWindow(0, 0, 37, 29) == valuesLL
+    assert geoTiff.readWindow(14, 12, 5, 6) == [rowValues[12:18] for rowValues in valuesLL[14:19]]  # window crossing the blocks
+    geoTiff.close()
+
+
+def test_horizontal_predictor_of_signed_interleaved_samples(tmp_path):
+    filePath = str(tmp_path / "dem.tif")
+    elevationsLL = int16Grid(20, 18)
+    qualityLL = [[(row + column) % 5 for column in range(18)] for row in range(20)]
+    valuesLL = [[value for pair in zip(elevationsRow, qualityRow) for value in pair] for elevationsRow, qualityRow in zip(elevationsLL, qualityLL)]
+    writeGeoTiff(filePath, valuesLL, "h", compression=5, predictor=2, tileSize=16, samplesPerPixel=2)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.readWindow(0, 0, 20, 18) == elevationsLL
+    assert geoTiff.readWindow(0, 0, 20, 18, band=1) == qualityLL
+    geoTiff.close()
+
+
+@pytest.mark.parametrize("byteOrder", ["<", ">"])
+def test_floating_point_predictor(tmp_path, byteOrder):
+    filePath = str(tmp_path / "dem.tif")
+    valuesLL = float32Grid(21, 19)
+    valuesLL[4][7] = float("nan")
+    writeGeoTiff(filePath, valuesLL, "f", compression=8, predictor=3, tileSize=16, byteOrder=byteOrder)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    expectedLL = [list(rowValues) for rowValues in valuesLL]
+    expectedLL[4][7] = None  # NaN cells have no data
+    assert geoTiff.readWindow(0, 0, 21, 19) == expectedLL
+    geoTiff.close()
+
+
+def test_long_lzw_strips_with_wider_codes_and_clear_codes(tmp_path):
+    filePath = str(tmp_path / "dem.tif")
+    randomGenerator = random.Random(3)
+    valuesLL = [[randomGenerator.randint(0, 255) for column in range(250)] for row in range(160)]
+    writeGeoTiff(filePath, valuesLL, "B", compression=5)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.readWindow(0, 0, 160, 250) == valuesLL
+    geoTiff.close()
+
+
+def test_packbits_example_of_the_tiff_specification(tmp_path):
+    # the PackBits example of the TIFF 6.0 specification (section 9)
+    packed = bytes(bytearray([0xFE, 0xAA, 0x02, 0x80, 0x00, 0x2A, 0xFD, 0xAA, 0x03, 0x80, 0x00, 0x2A, 0x22, 0xF7, 0xAA]))
+    unpacked = [0xAA]*3 + [0x80, 0x00, 0x2A] + [0xAA]*4 + [0x80, 0x00, 0x2A, 0x22] + [0xAA]*10
+    filePath = str(tmp_path / "dem.tif")
+    tagsL = [(256, 4, [24]), (257, 4, [1]), (258, 3, [8]), (259, 3, [32773]), (278, 3, [1])]
+    writeTiff(filePath, tagsL, [packed], False)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.readWindow(0, 0, 1, 24) == [unpacked]
+    assert (geoTiff.originX, geoTiff.originY, geoTiff.cellSizeX) == (0, 0, 1)  # not georeferenced
+    geoTiff.close()
+
+
+def test_pixel_is_point_tie_point_is_the_cell_center(tmp_path):
+    filePath = str(tmp_path / "dem.tif")
+    geoKeyDirectory = [1, 1, 0, 2, 1025, 0, 1, 2, 2048, 0, 1, 4326]  # RasterPixelIsPoint, WGS 84
+    writeGeoTiff(filePath, int16Grid(3, 3), "h", extraTagsL=[(34735, 3, geoKeyDirectory)])
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.epsgCode == 4326
+    assert (geoTiff.originX, geoTiff.originY) == (500000 - 15, 4600000 + 15)
+    assert geoTiff.cellCenter(0, 0) == (500000, 4600000)
+    geoTiff.close()
+
+
+def test_bigtiff(tmp_path):
+    filePath = str(tmp_path / "dem.tif")
+    valuesLL = int16Grid(17, 33)
+    writeGeoTiff(filePath, valuesLL, "h", compression=8, tileSize=16, bigTiff=True)
+    
+    geoTiff = gismo_kernels.GeoTiff(filePath)
+    assert geoTiff.bigTiff
+    assert geoTiff.readWindow(0, 0, 17, 33) == valuesLL
+    geoTiff.close()
+
+
+def test_unsupported_files_are_not_read(tmp_path):
+    filePath = str(tmp_path / "dem.tif")
+    with open(filePath, "wb") as myFile:
+        myFile.write(b"GIF89a" + b"\x00"*20)
+    with pytest.raises(ValueError):
+        gismo_kernels.GeoTiff(filePath)
+    
+    writeGeoTiff(filePath, int16Grid(2, 2), "h", compression=7)  # JPEG
+    with pytest.raises(ValueError):
+        gismo_kernels.GeoTiff(filePath)
@@ -0,0 +1,226 @@
+"""
+Tests of the Rhino-free "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+terrain = gismo_kernels.Terrain()
+
+
+def gridMesh(heightFunction, halfSize, spacing):
+    # triangulated grid of vertices (x,y,heightFunction(x,y)), the same as CreateGeometry().meshToArrays output of a terrain mesh
+    numOfVertices = int(round(2*halfSize/spacing)) + 1
+    verticesL = []
+    for i in range(numOfVertices):
+        for k in range(numOfVertices):
+            x = -halfSize + k*spacing
+            y = -halfSize + i*spacing
+            verticesL.append((x, y, heightFunction(x, y)))
+    trianglesL = []
+    for i in range(numOfVertices-1):
+        for k in range(numOfVertices-1):
+            a = i*numOfVertices + k
+            trianglesL.append((a, a+1, a+numOfVertices+1))
+            trianglesL.append((a, a+numOfVertices+1, a+numOfVertices))
+    return verticesL, trianglesL
+
+
+def hills(x, y):
+    return 8*math.exp(-((x-20)**2 + (y-10)**2)/100.0) + 5*math.exp(-((x+25)**2 + (y+15)**2)/60.0) + 3*math.exp(-(x**2 + (y-35)**2)/200.0)
+
+
+def exactHorizonAngles(verticesL, trianglesL, origin, directions):
+    # horizon angle of a triangulated terrain along each direction: the highest elevation angle of the points in which the triangle edges cross the vertical half-plane of the direction
+    # (along a triangle's section of the half-plane the tangent of the elevation angle is monotonic, so its maximum is at one of the crossed edges)
+    edges = set()
+    for a, b, c in trianglesL:
+        edges.update([(min(a, b), max(a, b)), (min(b, c), max(b, c)), (min(a, c), max(a, c))])
+    horizonAnglesR = []
+    for dx, dy in directions:
+        horizonAngleR = 0
+        for a, b in edges:
+            P = verticesL[a]; Q = verticesL[b]
+            sideP = dx*(P[1]-origin[1]) - dy*(P[0]-origin[0])
+            sideQ = dx*(Q[1]-origin[1]) - dy*(Q[0]-origin[0])
+            if (sideP > 0 and sideQ > 0) or (sideP < 0 and sideQ < 0) or (sideP == sideQ):
+                continue
+            t = sideP / (sideP - sideQ)
+            x = P[0] + t*(Q[0]-P[0]); y = P[1] + t*(Q[1]-P[1]); z = P[2] + t*(Q[2]-P[2])
+            distance = dx*(x-origin[0]) + dy*(y-origin[1])
+            if distance > 1e-9:
+                horizonAngleR = max(horizonAngleR, math.atan2(z-origin[2], distance))
+        horizonAnglesR.append(horizonAngleR)
+    return horizonAnglesR
+
+
+def test_mesh_to_elevation_grid_of_a_plane():
+    verticesL, trianglesL = gridMesh(lambda x, y: 0.2*x - 0.1*y + 3, 10, 2)
+    cellSize = 0.5
+    elevationsLL, startX, startY, numOfRows, numOfColumns = terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+
+    assert (startX, startY, numOfRows, numOfColumns) == (-10, 10, 41, 41)
+    # triangle edges are rasterized to their nearest cells (keeping the highest elevation), so a cell can be raised by up to half of the cell diagonal times the slope
+    edgeTolerance = 0.5*math.hypot(cellSize, cellSize)*math.hypot(0.2, 0.1)
+    for row in range(numOfRows):
+        for column in range(numOfColumns):
+            x = startX + column*cellSize
+            y = startY - row*cellSize
+            assert -1e-9 <= elevationsLL[row][column] - (0.2*x - 0.1*y + 3) <= edgeTolerance
+
+
+def test_horizon_angles_of_a_wall():
+    # 10 units high and 1 unit thick wall, 20 units north of the origin
+    wallHeight = 10; wallDistance = 20
+    verticesL, trianglesL = gridMesh(lambda x, y: wallHeight if (wallDistance <= y <= wallDistance+1) else 0, 40, 1)
+    elevationsLL, startX, startY, numOfRows, numOfColumns = terrain.meshToElevationGrid(verticesL, trianglesL, 0.25)
+
+    directions = terrain.azimuthDirections([0, 90, 180, 270])
+    horizonAnglesR = terrain.horizonAngles(elevationsLL, startX, startY, 0.25, (0, 0, 0.01), directions, bilinear=False)
+
+    # the wall is enlarged to the cells next to it when rasterized, so its nearest face can be up to 1 cell closer
+    assert math.atan((wallHeight-0.01)/wallDistance) - 0.001 <= horizonAnglesR[0] <= math.atan((wallHeight-0.01)/(wallDistance-0.25)) + 0.001
+    assert horizonAnglesR[1:] == [0, 0, 0]
+
+
+def test_horizon_angles_match_exact_terrain_horizon():
+    verticesL, trianglesL = gridMesh(hills, 50, 1)
+    origin = (0, 0, hills(0, 0) + 0.01)
+    directions = terrain.azimuthDirections(range(0, 360, 10))
+    referenceAnglesR = exactHorizonAngles(verticesL, trianglesL, origin, directions)
+
+    cellSize = 0.25
+    elevationsLL, startX, startY, numOfRows, numOfColumns = terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+    horizonAnglesR = terrain.horizonAnglesMultiple(elevationsLL, startX, startY, cellSize, [origin], directions, bilinear=False)[0]
+
+    # rasterization can only raise the terrain
+    for referenceAngleR, horizonAngleR in zip(referenceAnglesR, horizonAnglesR):
+        assert -0.1 < math.degrees(horizonAngleR - referenceAngleR) < 0.5
+
+
+def test_horizon_angles_grid_matches_walking():
+    verticesL, trianglesL = gridMesh(hills, 30, 1)
+    cellSize = 1
+    elevationsLL, startX, startY, numOfRows, numOfColumns = terrain.meshToElevationGrid(verticesL, trianglesL, cellSize)
+    directions = terrain.azimuthDirections([0, 45, 100, 200, 315])
+    horizonAnglesL = terrain.horizonAnglesGrid(elevationsLL, cellSize, directions)
+
+    # cell at the 0,0 origin (on steep slopes the nearest cells sampled by the two methods differ too much)
+    row = column = 30
+    originPt = (startX + column*cellSize, startY - row*cellSize, elevationsLL[row][column])
+    walkedAnglesR = terrain.horizonAngles(elevationsLL, startX, startY, cellSize, originPt, directions, bilinear=False)
+    for horizonAngles, walkedAngleR in zip(horizonAnglesL, walkedAnglesR):
+        assert abs(math.degrees(horizonAngles[row*numOfColumns+column] - walkedAngleR)) < 1
+
+
+def test_sky_view_factors_of_flat_terrain():
+    elevationsLL = [[5.0]*20 for row in range(15)]
+    directions = terrain.azimuthDirections([sectorIndex*360.0/16 for sectorIndex in range(16)])
+    skyViewFactors = terrain.skyViewFactors(terrain.horizonAnglesGrid(elevationsLL, 2, directions))
+
+    assert len(skyViewFactors) == 20*15
+    assert all(abs(skyViewFactor - 1) < 1e-6 for skyViewFactor in skyViewFactors)
+
+
+def test_highest_hit_row_matches_exhaustive_scan():
+    numOfRows = 1200
+    for silhouetteRow in (-1, 0, 1, 15, 16, 17, 500, 1198, 1199):
+        rayHit = lambda row: row <= silhouetteRow
+        for startRow in (None, 0, 300, 1199):
+            hitRow = terrain.highestHitRow(rayHit, numOfRows, startRow)
+            assert silhouetteRow - 1 <= hitRow <= silhouetteRow
+            assert (hitRow == -1) == (silhouetteRow == -1)
+
+
+def test_gradients_of_a_planar_terrain_are_exact_up_to_the_edges():
+    # z = 0.5x + 0.2y sampled on a grid covering a 41x41 mesh: the slope and the slope direction at every mesh vertex, including the edge ones and the ones next to the no data cells, are the same
+    verticesL, trianglesL = gridMesh(lambda x, y: 0.5*x + 0.2*y, 20, 1)
+    cellSize = 0.7
+    startX = -20; startY = 20
+    numOfRows = numOfColumns = int(math.ceil(40/cellSize)) + 1
+    elevationsLL = [[0.5*(startX + column*cellSize) + 0.2*(startY - row*cellSize) for column in range(numOfColumns)] for row in range(numOfRows)]
+    for k in range(numOfColumns):
+        elevationsLL[-1][k] = None  # last row and column (past the mesh edges) with no data, as left by meshToElevationGrid
+        elevationsLL[k][-1] = None
+    for row, column in ((10, 20), (30, 35), (40, 5), (40, 6), (40, 7)):
+        elevationsLL[row][column] = None  # holes of no data cells
+    dzdxLL, dzdyLL = terrain.gradientsGrid(elevationsLL, cellSize)
+    
+    expectedSlopeAngleR, expectedSlopeDirectionD = terrain.slopeAndDirection(0.5, 0.2)
+    for x, y, z in verticesL:
+        columnF = (x-startX)/cellSize
+        rowF = (startY-y)/cellSize
+        dzdx = terrain.elevationAt(dzdxLL, columnF, rowF)
+        dzdy = terrain.elevationAt(dzdyLL, columnF, rowF)
+        slopeAngleR, slopeDirectionD = terrain.slopeAndDirection(dzdx, dzdy)
+        assert abs(math.degrees(slopeAngleR - expectedSlopeAngleR)) < 1e-6
+        assert abs(slopeDirectionD - expectedSlopeDirectionD) < 1e-6
+
+
+def test_gradients_are_not_estimated_without_neighbours_along_an_axis():
+    dzdxLL, dzdyLL = terrain.gradientsGrid([[1.0, 2.0, 3.0]], 1.0)
+    assert dzdxLL == [[None, None, None]]
+    assert dzdyLL == [[None, None, None]]
+    
+    dzdxLL, dzdyLL = terrain.gradientsGrid([[None, 1.0], [2.0, 3.0]], 1.0)
+    assert dzdxLL[0][0] == None
+    assert abs(dzdxLL[1][1] - 1) < 1e-12 and abs(dzdyLL[1][1] + 2) < 1e-12
+
+
+def rtinGrid(numOfRows, numOfColumns, heightFunction):
+    # flat list of elevations, row after row, the same as the Terrain Generator's zL
+    return [heightFunction(column, row) for row in range(numOfRows) for column in range(numOfColumns)]
+
+
+def rtinTriangles2d(gridIndicesL, trianglesL, numOfColumns):
+    # triangles as three (column, -row) points, so that the triangles are counter-clockwise
+    pointsL = [(gridIndex % numOfColumns, -(gridIndex // numOfColumns)) for gridIndex in gridIndicesL]
+    return [(pointsL[a], pointsL[b], pointsL[c]) for a, b, c in trianglesL]
+
+
+def signedArea(triangle):
+    (x0, y0), (x1, y1), (x2, y2) = triangle
+    return 0.5*((x1 - x0)*(y2 - y0) - (x2 - x0)*(y1 - y0))
+
+
+def test_rtin_triangles_cover_the_grid_within_the_max_error():
+    numOfRows, numOfColumns = 37, 53  # not a square of 2^n+1 vertices
+    zValues = rtinGrid(numOfRows, numOfColumns, lambda column, row: hills(column - 26, row - 18))
+    maxError = 0.25
+    gridIndicesL, trianglesL = terrain.rtinTriangles(zValues, numOfRows, numOfColumns, maxError)
+    triangles2d = rtinTriangles2d(gridIndicesL, trianglesL, numOfColumns)
+    
+    # all the triangles are counter-clockwise, inside of the grid, and together they cover it without overlaps
+    assert all(0 <= gridIndex < numOfRows*numOfColumns for gridIndex in gridIndicesL)
+    assert all(signedArea(triangle) > 0 for triangle in triangles2d)
+    assert abs(sum(signedArea(triangle) for triangle in triangles2d) - (numOfRows - 1)*(numOfColumns - 1)) < 1e-9
+    assert len(gridIndicesL) < numOfRows*numOfColumns / 2
+    
+    # each grid point is inside of a triangle, which is not more than maxError above or below it
+    for row in range(numOfRows):
+        for column in range(numOfColumns):
+            x, y = column, -row
+            for triangle, (a, b, c) in zip(triangles2d, trianglesL):
+                area = signedArea(triangle)
+                w0 = signedArea(((x, y), triangle[1], triangle[2])) / area
+                w1 = signedArea((triangle[0], (x, y), triangle[2])) / area
+                w2 = 1 - w0 - w1
+                if min(w0, w1, w2) >= -1e-9:
+                    z = w0*zValues[gridIndicesL[a]] + w1*zValues[gridIndicesL[b]] + w2*zValues[gridIndicesL[c]]
+                    assert abs(z - zValues[row*numOfColumns + column]) <= maxError + 1e-9
+                    break
+            else:
+                assert False, "grid point %s, %s is not covered" % (row, column)
+
+
+def test_rtin_triangles_of_a_plane():
+    # a plane is represented exactly by the two root triangles of each square
+    numOfRows = numOfColumns = 33
+    zValues = rtinGrid(numOfRows, numOfColumns, lambda column, row: 0.3*column - 0.2*row + 5)
+    gridIndicesL, trianglesL = terrain.rtinTriangles(zValues, numOfRows, numOfColumns, 1e-6)
+    assert sorted(gridIndicesL) == [0, numOfColumns - 1, (numOfRows - 1)*numOfColumns, numOfRows*numOfColumns - 1]
+    assert len(trianglesL) == 2
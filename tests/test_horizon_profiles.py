@@ -0,0 +1,51 @@
+"""
+Tests of the horizon profiles cache of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+
+def test_profile_is_read_back_as_written(tmp_path):
+    horizonProfiles = gismo_kernels.HorizonProfiles(str(tmp_path))
+    profileAnglesR = [math.radians(azimuth % 30) for azimuth in range(3600)]
+    horizonProfiles.write(44.8125, 20.4612, 1.5, 0, 50000, "SRTMGL3", 117.25, profileAnglesR)
+    
+    elevationM, readAnglesR = horizonProfiles.read(44.8125, 20.4612, 1.5, 0, 50000, "SRTMGL3")
+    assert elevationM == 117.25
+    assert len(readAnglesR) == 3600
+    assert max(abs(a - b) for a, b in zip(readAnglesR, profileAnglesR)) < 1e-6  # float32 angles
+    
+    # a profile of a different key (here: DEM source) is not cached
+    assert horizonProfiles.read(44.8125, 20.4612, 1.5, 0, 50000, "AW3D30") == (None, None)
+
+
+def test_invalid_profile_files_are_not_read(tmp_path):
+    horizonProfiles = gismo_kernels.HorizonProfiles(str(tmp_path))
+    profileFilePath = horizonProfiles.write(10, 20, 0, 0, 1000, "SRTMGL3", 5, [0.1]*360)
+    with open(profileFilePath, "ab") as myFile:
+        myFile.write(b"\x00")  # the size does not match the number of azimuths
+    assert horizonProfiles.read(10, 20, 0, 0, 1000, "SRTMGL3") == (None, None)
+    assert horizonProfiles.unpackProfile(b"GHPF", 4) == (None, None)
+
+
+def test_least_recently_used_profiles_are_evicted(tmp_path):
+    horizonProfiles = gismo_kernels.HorizonProfiles(str(tmp_path))
+    profileSize = horizonProfiles.headerSize + 4*3600
+    horizonProfiles.maxFolderSizeBytes = 2*profileSize  # room for two profiles
+    
+    now = time.time()
+    for index in range(2):
+        profileFilePath = horizonProfiles.write(index, 0, 0, 0, 1000, "SRTMGL3", 0, [0.0]*3600)
+        os.utime(profileFilePath, (now - 100 + index, now - 100 + index))
+    horizonProfiles.read(0, 0, 0, 0, 1000, "SRTMGL3")  # profile 0 is now the most recently used one
+    horizonProfiles.write(2, 0, 0, 0, 1000, "SRTMGL3", 0, [0.0]*3600)
+    
+    assert horizonProfiles.read(1, 0, 0, 0, 1000, "SRTMGL3") == (None, None)
+    assert horizonProfiles.read(0, 0, 0, 0, 1000, "SRTMGL3")[0] == 0
+    assert horizonProfiles.read(2, 0, 0, 0, 1000, "SRTMGL3")[0] == 0
@@ -0,0 +1,102 @@
+"""
+Tests of the UTM projection of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+reference coordinates were computed with PROJ (EPSG:4326 to EPSG:326xx/327xx)
+"""
+
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+utm = gismo_kernels.UTM()
+terrain = gismo_kernels.Terrain()
+
+# latitude, longitude, UTM zone, north or south, easting, northing
+referencePointsL = [
+    (44.8125, 20.4612, 34, "north", 457396.040, 4962263.056),
+    (48.858222, 2.2945, 31, "north", 448251.818, 5411935.123),
+    (64.1466, -21.9426, 27, "north", 454138.377, 7113689.869),
+    (45.0, 29.0, 34, "north", 1130519.729, 5014178.301),  # 8 degrees away from the central meridian
+    (0.0, 3.0, 31, "north", 500000.0, 0.0),
+    (-33.856784, 151.215297, 56, "south", 334900.261, 6252290.522),
+    (-0.5, -78.5, 17, "south", 778265.778, 9944681.960),
+]
+
+
+@pytest.mark.parametrize("latitude, longitude, utmZone, northOrsouth, easting, northing", referencePointsL)
+def test_projected_coordinates_match_proj(latitude, longitude, utmZone, northOrsouth, easting, northing):
+    eastingsL, northingsL = utm.utmCoordinates([latitude], [longitude], utmZone, northOrsouth)
+    assert abs(eastingsL[0] - easting) < 0.001
+    assert abs(northingsL[0] - northing) < 0.001
+
+
+@pytest.mark.parametrize("latitude, longitude, utmZone, northOrsouth, easting, northing", referencePointsL)
+def test_inverse_projection_matches_proj(latitude, longitude, utmZone, northOrsouth, easting, northing):
+    latitudesD, longitudesD = utm.utmToLatitudesLongitudes([easting], [northing], utmZone, northOrsouth)
+    # 1e-8 degrees is about 1 mm
+    assert abs(latitudesD[0] - latitude) < 1e-8
+    assert abs(longitudesD[0] - longitude) < 1e-8
+
+
+def test_projection_round_trip():
+    latitudesD = [-79.5 + 7.9*i for i in range(21)]
+    longitudesD = [14.1 + 0.6*(i % 21) for i in range(21)]  # zone 33 and its neighbours
+    eastingsL, northingsL = utm.utmCoordinates(latitudesD, longitudesD, 33, "north")
+    roundTripLatitudesD, roundTripLongitudesD = utm.utmToLatitudesLongitudes(eastingsL, northingsL, 33, "north")
+    # the third order series are accurate to about 1 mm within the UTM zones
+    assert max(abs(a - b) for a, b in zip(latitudesD, roundTripLatitudesD)) < 1e-8
+    assert max(abs(a - b) for a, b in zip(longitudesD, roundTripLongitudesD)) < 1e-8
+
+
+class GeographicRaster(object):
+    # EPSG:4326 raster (with GeoTiff's attributes and readWindow method) of 3 arc-second cells, whose elevations are a linear function of latitude and longitude
+    def __init__(self):
+        self.originX = 20.0; self.originY = 45.0
+        self.cellSizeX = self.cellSizeY = 1/1200.0
+        self.numOfRows = 120; self.numOfColumns = 180
+    
+    def elevation(self, latitude, longitude):
+        return 1000*(latitude - 44.9) - 400*(longitude - 20.0)
+    
+    def readWindow(self, row0, column0, numOfRows, numOfColumns):
+        row1 = min(row0+numOfRows, self.numOfRows); column1 = min(column0+numOfColumns, self.numOfColumns)
+        return [[self.elevation(self.originY - (row+0.5)*self.cellSizeY, self.originX + (column+0.5)*self.cellSizeX) for column in range(max(column0, 0), column1)] for row in range(max(row0, 0), row1)]
+
+
+def test_utm_grid_covers_the_raster_and_keeps_its_resolution():
+    raster = GeographicRaster()
+    originX, originY, cellSize, numOfRows, numOfColumns = terrain.utmGrid(raster, 34, "north")
+    
+    cornersLatitudesD = [44.9, 44.9, 45.0, 45.0]
+    cornersLongitudesD = [20.0, 20.15, 20.0, 20.15]
+    eastingsL, northingsL = utm.utmCoordinates(cornersLatitudesD, cornersLongitudesD, 34, "north")
+    for easting, northing in zip(eastingsL, northingsL):
+        assert originX - 1e-6 <= easting <= originX + numOfColumns*cellSize
+        assert originY - numOfRows*cellSize <= northing <= originY + 1e-6
+    assert 60 < cellSize < 80  # 3 arc-seconds are 92.6 m along the meridian and 65.5 m along the 45th parallel
+
+
+def test_reprojected_rows_interpolate_the_raster():
+    raster = GeographicRaster()
+    utmGrid = terrain.utmGrid(raster, 34, "north")
+    originX, originY, cellSize, numOfRows, numOfColumns = utmGrid
+    row = numOfRows // 2
+    elevationsRow = terrain.reprojectedRow(raster, utmGrid, row, 34, "north")
+    assert len(elevationsRow) == numOfColumns
+    
+    latitudesD, longitudesD = utm.utmToLatitudesLongitudes([originX + (column+0.5)*cellSize for column in range(numOfColumns)], [originY - (row+0.5)*cellSize]*numOfColumns, 34, "north")
+    numOfInnerCells = 0
+    for elevation, latitude, longitude in zip(elevationsRow, latitudesD, longitudesD):
+        insideCellCenters = (20.0 + raster.cellSizeX/2 < longitude < 20.15 - raster.cellSizeX/2) and (44.9 + raster.cellSizeY/2 < latitude < 45.0 - raster.cellSizeY/2)
+        if insideCellCenters:
+            # bilinear interpolation of a linear function is exact
+            assert abs(elevation - raster.elevation(latitude, longitude)) < 1e-6
+            numOfInnerCells += 1
+    assert numOfInnerCells > 0.9*numOfColumns
+    
+    # rows outside of the raster have no data
+    assert terrain.reprojectedRow(raster, utmGrid, numOfRows + 50, 34, "north") == [None]*numOfColumns
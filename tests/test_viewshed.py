@@ -0,0 +1,98 @@
+"""
+Tests of the viewsheds of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+terrain = gismo_kernels.Terrain()
+
+
+def hillsGrid(numOfRows, numOfColumns, cellSize):
+    return [[30*math.sin(column*cellSize/70.0) * math.cos(row*cellSize/90.0) + 0.002*(column*cellSize)**1.5 for column in range(numOfColumns)] for row in range(numOfRows)]
+
+
+def exactlyVisible(elevationsLL, observerColumn, observerRow, observerZ, column, row, targetHeight=0, samplesPerCell=8):
+    # line of sight from the observer to the target, checked against the bilinearly interpolated terrain
+    numOfSamples = samplesPerCell * max(abs(column - observerColumn), abs(row - observerRow))
+    targetZ = elevationsLL[row][column] + targetHeight
+    for i in range(1, numOfSamples):
+        t = i / float(numOfSamples)
+        columnF = observerColumn + t*(column - observerColumn)
+        rowF = observerRow + t*(row - observerRow)
+        if terrain.elevationAt(elevationsLL, columnF, rowF) > observerZ + t*(targetZ - observerZ) + 1e-9:
+            return False
+    return True
+
+
+def test_flat_terrain_is_visible_up_to_the_max_distance():
+    elevationsLL = [[10.0]*21 for row in range(15)]
+    visible = terrain.viewshed(elevationsLL, 5, 8, 6, 11.7)
+    assert list(visible) == [1]*(21*15)
+    
+    visible = terrain.viewshed(elevationsLL, 5, 8, 6, 11.7, maxDistance=30)
+    for row in range(15):
+        for column in range(21):
+            assert visible[row*21+column] == (1 if math.hypot(column-8, row-6)*5 <= 30 else 0)
+
+
+def test_shadow_of_a_wall():
+    # a 20 m wall along the column 10, observed from the column 2 at 2 m
+    elevationsLL = [[20.0 if column == 10 else 0.0 for column in range(30)] for row in range(9)]
+    observerZ = 2.0
+    visible = terrain.viewshed(elevationsLL, 1, 2, 4, observerZ)
+    for column in range(30):
+        # along the observer's row, cells behind the wall are visible only above the line of sight grazing its top
+        losHeight = observerZ + (20.0 - observerZ)*(column - 2)/8.0
+        assert visible[4*30+column] == (1 if (column <= 10) or (0.0 >= losHeight) else 0)
+    # targets high enough above the terrain are visible behind the wall: 30 m is above the line of sight up to the column 14
+    visible = terrain.viewshed(elevationsLL, 1, 2, 4, observerZ, targetHeight=30)
+    assert [visible[4*30+column] for column in range(11, 30)] == [1]*4 + [0]*15
+
+
+def test_cells_with_no_data_are_not_visible_and_do_not_block():
+    elevationsLL = [[0.0]*12 for row in range(12)]
+    for row in range(12):
+        elevationsLL[row][6] = None
+    visible = terrain.viewshed(elevationsLL, 1, 2, 5, 1.5)
+    for row in range(12):
+        assert [visible[row*12+column] for column in range(12)] == [1]*6 + [0] + [1]*5
+    # observers outside of the grid see nothing
+    assert sum(terrain.viewshed(elevationsLL, 1, 15, 5, 1.5)) == 0
+
+
+def test_viewshed_matches_exact_lines_of_sight():
+    numOfRows, numOfColumns, cellSize = 41, 53, 10.0
+    elevationsLL = hillsGrid(numOfRows, numOfColumns, cellSize)
+    observerColumn, observerRow = 17, 22
+    observerZ = elevationsLL[observerRow][observerColumn] + 1.7
+    visible = terrain.viewshed(elevationsLL, cellSize, observerColumn, observerRow, observerZ)
+    
+    numOfMatches = 0
+    for row in range(numOfRows):
+        for column in range(numOfColumns):
+            if visible[row*numOfColumns+column] == exactlyVisible(elevationsLL, observerColumn, observerRow, observerZ, column, row):
+                numOfMatches += 1
+    # XDraw is an approximation: it disagrees only near the edges of the shadows
+    assert numOfMatches > 0.97*numOfRows*numOfColumns
+    assert 0.2*numOfRows*numOfColumns < sum(visible) < 0.8*numOfRows*numOfColumns  # the terrain is neither flat nor fully hidden
+
+def test_cumulative_viewshed_counts_the_observers():
+    numOfRows, numOfColumns, cellSize = 23, 31, 10.0
+    elevationsLL = hillsGrid(numOfRows, numOfColumns, cellSize)
+    observers = [(column, row, elevationsLL[row][column] + 1.7) for column, row in [(3, 4), (15, 11), (28, 20), (9, 19), (22, 2)]]
+    counts, bitsetsL = terrain.cumulativeViewshed(elevationsLL, cellSize, observers, targetHeight=1, maxDistance=150, observerBitsets=True, parallel=False, batchSize=2)
+    
+    viewshedsL = [terrain.viewshed(elevationsLL, cellSize, column, row, observerZ, 1, 150) for column, row, observerZ in observers]
+    assert list(counts) == [sum(visible[index] for visible in viewshedsL) for index in range(numOfRows*numOfColumns)]
+    assert len(bitsetsL) == len(observers)
+    for bitset, visible in zip(bitsetsL, viewshedsL):
+        assert [(bitset[index >> 3] >> (index & 7)) & 1 for index in range(numOfRows*numOfColumns)] == list(visible)
+    
+    counts, bitsetsL = terrain.cumulativeViewshed(elevationsLL, cellSize, observers, targetHeight=1, maxDistance=150)
+    assert bitsetsL == None
+    assert list(counts) == [sum(visible[index] for visible in viewshedsL) for index in range(numOfRows*numOfColumns)]
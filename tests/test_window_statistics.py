@@ -0,0 +1,60 @@
+"""
+Tests of the window statistics (summed-area tables, sliding minimums and maximums) of the "gismo_kernels" module (userObjects/gismo_kernels.py). Run them with: python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "userObjects"))
+import gismo_kernels
+
+terrain = gismo_kernels.Terrain()
+
+
+def randomGrid(numOfRows, numOfColumns, seed):
+    randomGenerator = random.Random(seed)
+    return [[randomGenerator.randint(-50, 50) for column in range(numOfColumns)] for row in range(numOfRows)]
+
+
+def test_summed_area_table_of_a_small_grid():
+    valuesLL = [[1, 2, 3],
+                [4, None, 6]]
+    table = terrain.summedAreaTable(valuesLL)
+    assert list(table) == [0, 0, 0, 0,
+                           0, 1, 3, 6,
+                           0, 5, 7, 16]
+
+
+def test_window_sums_match_the_sums_of_the_cells():
+    numOfRows, numOfColumns = 13, 17
+    valuesLL = randomGrid(numOfRows, numOfColumns, 1)
+    valuesLL[5][8] = None  # no data is summed as 0
+    squaresLL = [[None if value == None else value*value for value in valuesRow] for valuesRow in valuesLL]
+    tablesL = [terrain.summedAreaTable(valuesLL), terrain.summedAreaTable(squaresLL)]
+    
+    for row0, column0, row1, column1 in [(0, 0, 12, 16), (5, 8, 5, 8), (2, 3, 9, 11), (0, 16, 12, 16), (12, 0, 12, 16)]:
+        windowCellsL = [valuesLL[row][column] or 0 for row in range(row0, row1+1) for column in range(column0, column1+1)]
+        assert terrain.windowSums(tablesL, numOfColumns, row0, column0, row1, column1) == [sum(windowCellsL), sum(value*value for value in windowCellsL)]
+
+
+@pytest.mark.parametrize("radius", [0, 1, 3, 30])
+def test_window_minimums_and_maximums_match_the_cells(radius):
+    numOfRows, numOfColumns = 11, 19
+    valuesLL = randomGrid(numOfRows, numOfColumns, radius)
+    minLL, maxLL = terrain.windowMinMax(valuesLL, radius)
+    
+    for row in range(numOfRows):
+        for column in range(numOfColumns):
+            # windows are clipped at the grid edges
+            windowCellsL = [valuesLL[r][c] for r in range(max(row-radius, 0), min(row+radius+1, numOfRows)) for c in range(max(column-radius, 0), min(column+radius+1, numOfColumns))]
+            assert minLL[row][column] == min(windowCellsL)
+            assert maxLL[row][column] == max(windowCellsL)
+
+
+def test_window_minimums_and_maximums_of_a_single_row():
+    minLL, maxLL = terrain.windowMinMax([[3, 1, 4, 1, 5, 9, 2, 6]], 2)
+    assert minLL == [[1, 1, 1, 1, 1, 1, 2, 2]]
+    assert maxLL == [[4, 4, 5, 9, 9, 9, 9, 9]]
@@ -0,0 +1,2020 @@
+# Gismo kernels: Rhino-free numeric methods of Gismo
+#
+# Gismo is a plugin for GIS Environmental Analysis (GPL) started by Djordje Spasic.
+# 
+# This file is part of Gismo.
+# 
+# Copyright (c) 2019, Djordje Spasic <djordjedspasic@gmail.com>
+# Gismo is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+#
+# Gismo is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along with this program. If not, see http://www.gnu.org/licenses/.
+#
+# The GPL-3.0+ license <http://spdx.org/licenses/GPL-3.0+>
+
+"""
+Rhino-free methods for analysis of terrain elevation grids (rasterization, interpolation, horizon angles, sky view factors, viewsheds, contours, adaptive triangulation), the horizon profiles cache, the elevation tiles files, the GeoTIFF reader and the DEM tiles cache.
+They only use plain python lists, tuples, arrays and files, so they can be run and tested outside of Rhino (with IronPython 2.7 or CPython).
+This module is installed together with Gismo user objects. Gismo Gismo component loads it on each run (only if its compatibleGismoVersion is the same as the Gismo Gismo component's version and date), and shares its classes with the other Gismo components through sc.sticky ("gismo_Terrain", "gismo_GeoTiff"...).
+"""
+
+import collections
+import zlib
+import bisect
+import struct
+import array
+import math
+import sys
+import os
+try:
+    import mmap
+except ImportError:
+    mmap = None
+try:
+    import System  # IronPython: tasks are run on all processor cores
+except ImportError:
+    System = None
+
+try:
+    xrange
+except NameError:
+    xrange = range  # CPython 3
+
+compatibleGismoVersion = "VER 0.0.3\nJAN_29_2019"  # the same as ghenv.Component.Message of the Gismo Gismo component this module is released with
+
+
+def arrayToBytes(values):
+    """
+    bytes of an array.array (array.tostring was renamed to array.tobytes in CPython 3)
+    """
+    if hasattr(values, "tobytes"):
+        return values.tobytes()
+    return values.tostring()
+
+
+def arrayFromBytes(typecode, valuesBytes):
+    """
+    array.array of the bytes (array.fromstring was renamed to array.frombytes in CPython 3)
+    """
+    values = array.array(typecode)
+    if hasattr(values, "frombytes"):
+        values.frombytes(valuesBytes)
+    else:
+        values.fromstring(valuesBytes)
+    return values
+
+
+def runInParallel(function, numOfTasks, parallel=True):
+    """
+    call function(taskIndex) for each task index, on all processor cores if parallel=True and System.Threading.Tasks.Parallel is available (used by Gismo components through sc.sticky["gismo_kernels"])
+    results are returned in the order of task indices, regardless of the order in which the tasks were finished
+    """
+    results = [None] * numOfTasks
+    def task(taskIndex):
+        results[taskIndex] = function(taskIndex)
+    
+    if parallel and (numOfTasks > 1) and (System != None):
+        System.Threading.Tasks.Parallel.ForEach(xrange(numOfTasks), task)
+    else:
+        for taskIndex in xrange(numOfTasks):
+            task(taskIndex)
+    
+    return results
+
+
+class Terrain(object):
+    """
+    Rhino-free methods for analysis of terrain elevation grids
+    """
+    def meshToElevationGrid(self, verticesL, trianglesL, cellSize):
+        """
+        rasterize triangles to a top-surface elevation grid (rows start at the top (north) of the grid, columns at its left (west) side)
+        cells not covered by any triangle are set to None
+        """
+        xL = [vertex[0] for vertex in verticesL]
+        yL = [vertex[1] for vertex in verticesL]
+        startX = min(xL)  # X coordinate of the first column
+        startY = max(yL)  # Y coordinate of the first row
+        numOfColumns = int(math.ceil((max(xL) - startX) / cellSize)) + 1
+        numOfRows = int(math.ceil((startY - min(yL)) / cellSize)) + 1
+        del xL; del yL
+        
+        elevationsLL = [[None]*numOfColumns for k in xrange(numOfRows)]
+        
+        def setElevation(column, row, z):
+            if (column >= 0) and (column < numOfColumns) and (row >= 0) and (row < numOfRows):
+                elevationsRow = elevationsLL[row]
+                if (elevationsRow[column] == None) or (z > elevationsRow[column]):
+                    elevationsRow[column] = z
+        
+        for triangle in trianglesL:
+            # triangle vertices in grid (column, row) coordinates
+            c0 = (verticesL[triangle[0]][0] - startX) / cellSize;  r0 = (startY - verticesL[triangle[0]][1]) / cellSize;  z0 = verticesL[triangle[0]][2]
+            c1 = (verticesL[triangle[1]][0] - startX) / cellSize;  r1 = (startY - verticesL[triangle[1]][1]) / cellSize;  z1 = verticesL[triangle[1]][2]
+            c2 = (verticesL[triangle[2]][0] - startX) / cellSize;  r2 = (startY - verticesL[triangle[2]][1]) / cellSize;  z2 = verticesL[triangle[2]][2]
+            
+            # triangle interior: cells whose centers are inside the triangle
+            denominator = (r1 - r2)*(c0 - c2) + (c2 - c1)*(r0 - r2)
+            if abs(denominator) > 1e-12:
+                for row in xrange(int(math.ceil(min(r0,r1,r2))), int(math.floor(max(r0,r1,r2)))+1):
+                    for column in xrange(int(math.ceil(min(c0,c1,c2))), int(math.floor(max(c0,c1,c2)))+1):
+                        w0 = ((r1 - r2)*(column - c2) + (c2 - c1)*(row - r2)) / denominator
+                        w1 = ((r2 - r0)*(column - c2) + (c0 - c2)*(row - r2)) / denominator
+                        w2 = 1 - w0 - w1
+                        if (w0 >= 0) and (w1 >= 0) and (w2 >= 0):
+                            setElevation(column, row, w0*z0 + w1*z1 + w2*z2)
+            
+            # triangle edges: vertical and thin triangles (walls, extruded terrain shading masks) may not cover any cell center
+            for (cA,rA,zA),(cB,rB,zB) in (((c0,r0,z0),(c1,r1,z1)), ((c1,r1,z1),(c2,r2,z2)), ((c2,r2,z2),(c0,r0,z0))):
+                numOfSteps = int(2*max(abs(cB-cA), abs(rB-rA))) + 1
+                for step in xrange(numOfSteps+1):
+                    t = step / float(numOfSteps)
+                    setElevation(int(round(cA + t*(cB-cA))), int(round(rA + t*(rB-rA))), zA + t*(zB-zA))
+        
+        return elevationsLL, startX, startY, numOfRows, numOfColumns
+    
+    
+    def elevationAt(self, elevationsLL, columnF, rowF):
+        """
+        bilinear interpolation of the elevation grid at fractional column and row indices
+        returns None outside of the grid, or if all four surrounding cells are None
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        if (columnF < 0) or (rowF < 0) or (columnF > numOfColumns-1) or (rowF > numOfRows-1):
+            return None
+        
+        c0 = min(int(columnF), numOfColumns-2)
+        r0 = min(int(rowF), numOfRows-2)
+        fc = columnF - c0
+        fr = rowF - r0
+        
+        z00 = elevationsLL[r0][c0];  z01 = elevationsLL[r0][c0+1]
+        z10 = elevationsLL[r0+1][c0];  z11 = elevationsLL[r0+1][c0+1]
+        if (z00 != None) and (z01 != None) and (z10 != None) and (z11 != None):
+            return (z00*(1-fc) + z01*fc)*(1-fr) + (z10*(1-fc) + z11*fc)*fr
+        
+        # some of the surrounding cells have no data. Average the valid ones by their weights
+        weightedSum = 0; weightsSum = 0
+        for z, weight in ((z00, (1-fc)*(1-fr)), (z01, fc*(1-fr)), (z10, (1-fc)*fr), (z11, fc*fr)):
+            if z != None:
+                weightedSum += z*weight
+                weightsSum += weight
+        if weightsSum == 0:
+            # the point is at the center of a cell with no data: take the nearest valid one
+            validL = [(abs(fc-c)+abs(fr-r), z) for z,c,r in ((z00,0,0), (z01,1,0), (z10,0,1), (z11,1,1)) if z != None]
+            if len(validL) == 0:
+                return None
+            return min(validL)[1]
+        return weightedSum / weightsSum
+    
+    
+    def elevationAtCubic(self, elevationsLL, columnF, rowF):
+        """
+        bicubic (Keys, a=-0.5) interpolation of the elevation grid at fractional column and row indices
+        bilinear interpolation (elevationAt) is used next to the edges of the grid, and next to the cells with no data
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        c0 = int(math.floor(columnF))
+        r0 = int(math.floor(rowF))
+        if (c0 < 1) or (r0 < 1) or (c0 > numOfColumns-3) or (r0 > numOfRows-3):
+            return self.elevationAt(elevationsLL, columnF, rowF)
+        
+        def keysWeights(t):
+            return (((-0.5*t + 1)*t - 0.5)*t,  (1.5*t - 2.5)*t*t + 1,  ((-1.5*t + 2)*t + 0.5)*t,  (0.5*t - 0.5)*t*t)
+        
+        columnWeights = keysWeights(columnF - c0)
+        rowWeights = keysWeights(rowF - r0)
+        elevation = 0
+        for rowWeight, elevationsRow in zip(rowWeights, elevationsLL[r0-1:r0+3]):
+            rowElevations = elevationsRow[c0-1:c0+3]
+            if None in rowElevations:
+                return self.elevationAt(elevationsLL, columnF, rowF)
+            elevation += rowWeight * sum(weight*z for weight,z in zip(columnWeights, rowElevations))
+        
+        return elevation
+    
+    
+    def downsampledGrid(self, elevationsLL):
+        """
+        mean-pooled grid with half as many rows and columns: each cell is the mean of a 2x2 block of cells (the last row and column of blocks can be incomplete). Cells with no data (None) are left out of the means
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        downsampledLL = []
+        for row in xrange(0, numOfRows, 2):
+            rowsL = elevationsLL[row:row+2]
+            downsampledRow = []
+            for column in xrange(0, numOfColumns, 2):
+                blockElevationsL = [z for elevationsRow in rowsL for z in elevationsRow[column:column+2] if z != None]
+                if len(blockElevationsL) > 0:
+                    downsampledRow.append(sum(blockElevationsL) / float(len(blockElevationsL)))
+                else:
+                    downsampledRow.append(None)
+            downsampledLL.append(downsampledRow)
+        
+        return downsampledLL
+    
+    
+    def rtinTriangles(self, zValues, numOfRows, numOfColumns, maxError):
+        """
+        error-bounded adaptive triangulation (right-triangulated irregular network) of a grid of elevations: zValues is a flat list (or array) of elevations, row after row, with no data already replaced
+        the grid is padded to a square of 2^n+1 vertices, whose two root triangles are split at the midpoints of their hypotenuses until none of the grid cells they cover is more than maxError above or below them. Neighbouring triangles share the errors of the hypotenuse midpoints, so they are always split together, and the triangulation has no cracks
+        returns the flat grid indices (row*numOfColumns + column) of the used vertices, and the triangles as tuples of three indices to that list (counter-clockwise seen from above, when the rows go from north to south)
+        """
+        tileSize = 2
+        while tileSize < max(numOfRows, numOfColumns) - 1:
+            tileSize *= 2
+        size = tileSize + 1
+        lastColumn = numOfColumns - 1
+        lastRow = numOfRows - 1
+        
+        # elevations padded to a size*size square by repeating the last column and row
+        heights = array.array("f", [0.0]) * (size*size)
+        for row in xrange(size):
+            sourceStart = min(row, lastRow)*numOfColumns
+            rowElevations = array.array("f", zValues[sourceStart:sourceStart+numOfColumns])
+            start = row*size
+            heights[start:start+numOfColumns] = rowElevations
+            heights[start+numOfColumns:start+size] = array.array("f", [rowElevations[-1]]) * (size-numOfColumns)
+        
+        inf = float("inf")
+        def straddles(minX, maxX, minY, maxY):
+            # triangles crossing the last column or row of the grid always have to be split, so that the padding can be left out
+            return (minX < lastColumn < maxX) or (minY < lastRow < maxY)
+        
+        def midpointErrors(forcedSplitsS):
+            # errors of the hypotenuse midpoints, from the smallest triangles (hypotenuse of 2 cells) to the largest ones. Each midpoint also takes the errors of its children's midpoints
+            errors = array.array("f", [0.0]) * (size*size)
+            s = 2
+            while s <= tileSize:
+                h = s//2
+                q = h//2
+                # midpoints of the horizontal and vertical edges of length s: hypotenuses of the triangles with their apexes in the centers of the s squares on both sides
+                for y in xrange(0, size, s):
+                    for x0 in xrange(0, tileSize, s):
+                        for ax,ay,mx,my,bx,by in ((x0,y,x0+h,y,x0+s,y), (y,x0,y,x0+h,y,x0+s)):
+                            middleIndex = my*size + mx
+                            if (middleIndex in forcedSplitsS) or straddles(max(mx-h,0), min(mx+h,tileSize), max(my-h,0), min(my+h,tileSize)):
+                                error = inf
+                            else:
+                                error = abs((heights[ay*size+ax] + heights[by*size+bx])/2 - heights[middleIndex])
+                            if q > 0:
+                                # children: centers of the h squares along the edge
+                                for childX,childY in ((mx-q,my-q), (mx-q,my+q), (mx+q,my-q), (mx+q,my+q)):
+                                    if (0 <= childX <= tileSize) and (0 <= childY <= tileSize):
+                                        error = max(error, errors[childY*size+childX])
+                            errors[middleIndex] = error
+                # centers of the s squares: hypotenuses of the two triangles along one of the square's diagonals
+                for y0 in xrange(0, tileSize, s):
+                    for x0 in xrange(0, tileSize, s):
+                        mx = x0 + h; my = y0 + h
+                        middleIndex = my*size + mx
+                        if (middleIndex in forcedSplitsS) or straddles(x0, x0+s, y0, y0+s):
+                            error = inf
+                        elif ((x0//s + y0//s) % 2) == 0:
+                            error = abs((heights[y0*size+x0] + heights[(y0+s)*size+x0+s])/2 - heights[middleIndex])
+                        else:
+                            error = abs((heights[y0*size+x0+s] + heights[(y0+s)*size+x0])/2 - heights[middleIndex])
+                        # children: midpoints of the square's edges
+                        errors[middleIndex] = max(error, errors[y0*size+mx], errors[(y0+s)*size+mx], errors[my*size+x0], errors[my*size+x0+s])
+                s *= 2
+            
+            return errors
+        
+        def maxDeviation(ax,ay, bx,by, cx,cy):
+            # the largest vertical distance between the triangle's plane and the grid cells inside the triangle
+            za = heights[ay*size+ax]; zb = heights[by*size+bx]; zc = heights[cy*size+cx]
+            denominator = float((bx - ax)*(cy - ay) - (by - ay)*(cx - ax))
+            deviation = 0
+            for y in xrange(min(ay,by,cy), max(ay,by,cy)+1):
+                for x in xrange(min(ax,bx,cx), max(ax,bx,cx)+1):
+                    wa = ((bx - x)*(cy - y) - (by - y)*(cx - x)) / denominator
+                    wb = ((cx - x)*(ay - y) - (cy - y)*(ax - x)) / denominator
+                    wc = 1 - wa - wb
+                    if (wa >= 0) and (wb >= 0) and (wc >= 0):
+                        deviation = max(deviation, abs(wa*za + wb*zb + wc*zc - heights[y*size+x]))
+            return deviation
+        
+        # the midpoint errors only bound the elevations along the hypotenuses. Triangles which are still further than maxError from some of the grid cells inside them are forced to split, and the errors are calculated again
+        forcedSplitsS = set()
+        while True:
+            errors = midpointErrors(forcedSplitsS)
+            trianglesCoordinatesL = []
+            trianglesStack = [(0,0, tileSize,tileSize, tileSize,0), (tileSize,tileSize, 0,0, 0,tileSize)]
+            while trianglesStack:
+                ax,ay, bx,by, cx,cy = trianglesStack.pop()
+                mx = (ax + bx)//2; my = (ay + by)//2
+                if (abs(ax - cx) + abs(ay - cy) > 1) and (errors[my*size+mx] > maxError):
+                    trianglesStack.append((cx,cy, ax,ay, mx,my))
+                    trianglesStack.append((bx,by, cx,cy, mx,my))
+                elif (max(ax,bx,cx) <= lastColumn) and (max(ay,by,cy) <= lastRow):
+                    trianglesCoordinatesL.append((ax,ay, bx,by, cx,cy))
+            
+            numOfForcedSplits = len(forcedSplitsS)
+            for ax,ay, bx,by, cx,cy in trianglesCoordinatesL:
+                if (abs(ax - cx) + abs(ay - cy) > 1) and (maxDeviation(ax,ay, bx,by, cx,cy) > maxError):
+                    forcedSplitsS.add(((ay + by)//2)*size + (ax + bx)//2)
+            if len(forcedSplitsS) == numOfForcedSplits:
+                break
+        errors = None; heights = None  # heights are used by the nested functions, so they can not be deleted
+        
+        gridIndicesL = []
+        vertexIndicesD = {}
+        trianglesL = []
+        for ax,ay, bx,by, cx,cy in trianglesCoordinatesL:
+            if (bx - ax)*(cy - ay) - (by - ay)*(cx - ax) > 0:
+                bx,by, cx,cy = cx,cy, bx,by
+            triangle = []
+            for x,y in ((ax,ay), (bx,by), (cx,cy)):
+                gridIndex = y*numOfColumns + x
+                vertexIndex = vertexIndicesD.get(gridIndex)
+                if vertexIndex == None:
+                    vertexIndex = vertexIndicesD[gridIndex] = len(gridIndicesL)
+                    gridIndicesL.append(gridIndex)
+                triangle.append(vertexIndex)
+            trianglesL.append(tuple(triangle))
+        
+        return gridIndicesL, trianglesL
+    
+    
+    def contourPolylines(self, zValues, numOfRows, numOfColumns, levelsL):
+        """
+        marching squares contours of a grid of elevations: zValues is a flat list (or array) of elevations, row after row. None or float("nan") are no data, and the cells touching them are left out
+        the segments of each cell are stitched into polylines by the cell edges they cross (each edge is shared by two cells), so no geometric tolerance is needed. Saddle cells are resolved by the mean elevation of the cell's corners
+        returns a list of (level, pointsL) tuples, where pointsL are the (column, row) fractional grid coordinates of the polyline's points. The first point is repeated at the end of closed polylines
+        """
+        sortedLevelsL = sorted(set(levelsL))
+        # crossed cell edges of each level: edge key -> (column, row), and edge key -> stitched edge keys
+        edgePointsLD = [{} for level in sortedLevelsL]
+        edgeNeighboursLD = [{} for level in sortedLevelsL]
+        
+        # segments of each corner configuration, by cell edges: 0 - top, 1 - right, 2 - bottom, 3 - left. Corner bits: 8 - top left, 4 - top right, 2 - bottom right, 1 - bottom left (bit is set if the corner's elevation >= level)
+        segmentsL = [(), ((3,2),), ((2,1),), ((3,1),), ((0,1),), None, ((0,2),), ((3,0),), ((3,0),), ((0,2),), None, ((0,1),), ((3,1),), ((2,1),), ((3,2),), ()]
+        saddleSegmentsD = {(5,True): ((3,0),(2,1)), (5,False): ((0,1),(3,2)), (10,True): ((0,1),(3,2)), (10,False): ((3,0),(2,1))}
+        
+        for row in xrange(numOfRows-1):
+            topRowStart = row*numOfColumns
+            bottomRowStart = topRowStart + numOfColumns
+            for column in xrange(numOfColumns-1):
+                zTL = zValues[topRowStart+column]; zTR = zValues[topRowStart+column+1]
+                zBR = zValues[bottomRowStart+column+1]; zBL = zValues[bottomRowStart+column]
+                if (zTL == None) or (zTR == None) or (zBR == None) or (zBL == None) or (zTL != zTL) or (zTR != zTR) or (zBR != zBR) or (zBL != zBL):
+                    continue
+                
+                # levels crossing the cell: minimal corner elevation < level <= maximal corner elevation
+                firstLevelIndex = bisect.bisect_right(sortedLevelsL, min(zTL, zTR, zBR, zBL))
+                lastLevelIndex = bisect.bisect_right(sortedLevelsL, max(zTL, zTR, zBR, zBL))
+                for levelIndex in xrange(firstLevelIndex, lastLevelIndex):
+                    level = sortedLevelsL[levelIndex]
+                    configuration = (8 if zTL >= level else 0) | (4 if zTR >= level else 0) | (2 if zBR >= level else 0) | (1 if zBL >= level else 0)
+                    segments = segmentsL[configuration]
+                    if segments == None:
+                        segments = saddleSegmentsD[(configuration, (zTL + zTR + zBR + zBL)/4.0 >= level)]
+                    
+                    edgePointsD = edgePointsLD[levelIndex]
+                    edgeNeighboursD = edgeNeighboursLD[levelIndex]
+                    for edgeA,edgeB in segments:
+                        keysL = []
+                        for edge in (edgeA, edgeB):
+                            # horizontal edges have even keys, vertical edges odd ones
+                            if edge == 0:
+                                key = 2*(topRowStart+column)
+                                if key not in edgePointsD: edgePointsD[key] = (column + (level - zTL)/(zTR - zTL), row)
+                            elif edge == 1:
+                                key = 2*(topRowStart+column+1) + 1
+                                if key not in edgePointsD: edgePointsD[key] = (column + 1, row + (level - zTR)/(zBR - zTR))
+                            elif edge == 2:
+                                key = 2*(bottomRowStart+column)
+                                if key not in edgePointsD: edgePointsD[key] = (column + (level - zBL)/(zBR - zBL), row + 1)
+                            else:
+                                key = 2*(topRowStart+column) + 1
+                                if key not in edgePointsD: edgePointsD[key] = (column, row + (level - zTL)/(zBL - zTL))
+                            keysL.append(key)
+                        edgeNeighboursD.setdefault(keysL[0], []).append(keysL[1])
+                        edgeNeighboursD.setdefault(keysL[1], []).append(keysL[0])
+        
+        # stitch the segments: open polylines start at the edges with a single segment (grid boundary, or no data), the remaining ones are closed
+        contoursL = []
+        for levelIndex, level in enumerate(sortedLevelsL):
+            edgePointsD = edgePointsLD[levelIndex]
+            edgeNeighboursD = edgeNeighboursLD[levelIndex]
+            startKeysL = [key for key,neighboursL in edgeNeighboursD.items() if len(neighboursL) == 1] + list(edgeNeighboursD.keys())
+            for startKey in startKeysL:
+                if startKey not in edgeNeighboursD:
+                    continue  # already stitched
+                keysL = [startKey]
+                key = startKey
+                while True:
+                    neighboursL = edgeNeighboursD.pop(key)
+                    nextKey = None
+                    for neighbourKey in neighboursL:
+                        if neighbourKey in edgeNeighboursD:
+                            nextKey = neighbourKey
+                            break
+                        elif (neighbourKey == startKey) and (len(keysL) > 2):
+                            keysL.append(startKey)  # closed polyline
+                    if nextKey == None:
+                        break
+                    keysL.append(nextKey)
+                    key = nextKey
+                contoursL.append((level, [edgePointsD[key] for key in keysL]))
+            edgePointsLD[levelIndex] = None; edgeNeighboursLD[levelIndex] = None
+        
+        return contoursL
+    
+    
+    def clipGridToRectangle(self, xL, yL, zValues, minX, maxX, minY, maxY):
+        """
+        cut a grid of elevations to a rectangle: xL are the x coordinates of the columns, yL the y coordinates of the rows, and zValues a flat list (or array) of elevations, row after row
+        the columns and rows outside of the rectangle are removed, and new ones are added on its edges. Their elevations are linearly interpolated along the grid lines, so they lie exactly on the mesh of the original grid (no data if one of the interpolated elevations is None or float("nan"))
+        returns the x coordinates of the columns, the y coordinates of the rows, and a flat list of elevations of the cut grid
+        """
+        numOfRows = len(yL)
+        numOfColumns = len(xL)
+        noData = float("nan")
+        
+        def fractionalIndices(coordinatesL, minCoordinate, maxCoordinate):
+            # (index, fraction) tuples of the grid lines inside the range, and of the range's ends
+            step = coordinatesL[1] - coordinatesL[0]
+            lastIndex = len(coordinatesL) - 1
+            indexA = min(max((minCoordinate - coordinatesL[0]) / step, 0), lastIndex)
+            indexB = min(max((maxCoordinate - coordinatesL[0]) / step, 0), lastIndex)
+            firstIndexF = min(indexA, indexB)
+            lastIndexF = max(indexA, indexB)
+            indicesF = [firstIndexF] + [i for i in xrange(int(math.ceil(firstIndexF)), int(math.floor(lastIndexF))+1) if firstIndexF < i < lastIndexF] + [lastIndexF]
+            indicesL = []
+            for indexF in indicesF:
+                if abs(indexF - round(indexF)) < 1e-9:
+                    indexF = round(indexF)
+                index = min(int(indexF), lastIndex-1)
+                indicesL.append((index, indexF - index))
+            return indicesL
+        
+        def interpolate(zA, zB, fraction):
+            if fraction == 0:
+                return zA
+            elif fraction == 1:
+                return zB
+            elif (zA == None) or (zB == None) or (zA != zA) or (zB != zB):
+                return noData
+            return zA + (zB - zA)*fraction
+        
+        columnsL = fractionalIndices(xL, minX, maxX)
+        rowsL = fractionalIndices(yL, minY, maxY)
+        
+        clippedXL = [xL[column] + (xL[column+1] - xL[column])*fraction for column,fraction in columnsL]
+        clippedYL = [yL[row] + (yL[row+1] - yL[row])*fraction for row,fraction in rowsL]
+        clippedZvalues = []
+        for row,rowFraction in rowsL:
+            upperRowZvalues = zValues[row*numOfColumns:(row+1)*numOfColumns]
+            lowerRowZvalues = zValues[(row+1)*numOfColumns:(row+2)*numOfColumns]
+            rowZvalues = [interpolate(zA, zB, rowFraction) for zA,zB in zip(upperRowZvalues, lowerRowZvalues)]
+            clippedZvalues.extend([interpolate(rowZvalues[column], rowZvalues[column+1], fraction) for column,fraction in columnsL])
+        
+        return clippedXL, clippedYL, clippedZvalues
+    
+    
+    def clipFacesToCircle(self, verticesL, facesL, centerX, centerY, radius):
+        """
+        cut mesh faces to a circle, seen from above: verticesL are the (x,y,z) coordinates of the vertices, and facesL the convex faces as tuples of vertex indices
+        faces outside of the circle are removed, and the ones crossing it are cut where their edges cross the circle (the arcs between the crossings are replaced with straight lines), and triangulated. Elevations of the new vertices are linearly interpolated along the edges. Neighbouring faces share the new vertices, so the cut mesh has no cracks
+        returns the vertices and faces of the cut mesh. Faces keep their orientation
+        """
+        radiusSquared = radius*radius
+        insideL = [(x - centerX)*(x - centerX) + (y - centerY)*(y - centerY) <= radiusSquared for x,y,z in verticesL]
+        clippedVerticesL = []
+        clippedIndicesD = {}  # vertex index, or (vertex index A, vertex index B, crossing) -> index of the cut mesh vertex
+        
+        def clippedIndex(index):
+            clippedIndex = clippedIndicesD.get(index)
+            if clippedIndex == None:
+                clippedIndex = clippedIndicesD[index] = len(clippedVerticesL)
+                clippedVerticesL.append(verticesL[index])
+            return clippedIndex
+        
+        def edgeCrossings(indexA, indexB):
+            # cut mesh vertices where the edge crosses the circle, in the direction from indexA to indexB. Crossings are always calculated from the lower vertex index, so that both faces of the edge get the same ones
+            index0 = min(indexA, indexB); index1 = max(indexA, indexB)
+            x0,y0,z0 = verticesL[index0]; x1,y1,z1 = verticesL[index1]
+            dx = x1 - x0; dy = y1 - y0
+            a = dx*dx + dy*dy
+            b = 2*((x0 - centerX)*dx + (y0 - centerY)*dy)
+            c = (x0 - centerX)*(x0 - centerX) + (y0 - centerY)*(y0 - centerY) - radiusSquared
+            discriminantRoot = math.sqrt(max(b*b - 4*a*c, 0))
+            # the number of crossings follows the inside/outside vertices, so that vertices lying on the circle do not create extra crossings
+            if insideL[index0] and insideL[index1]:
+                tL = []
+            elif insideL[index0]:
+                tL = [min((-b + discriminantRoot)/(2*a), 1)]
+            elif insideL[index1]:
+                tL = [max((-b - discriminantRoot)/(2*a), 0)]
+            elif (discriminantRoot > 0) and (0 < (-b - discriminantRoot)/(2*a)) and ((-b + discriminantRoot)/(2*a) < 1):
+                tL = [(-b - discriminantRoot)/(2*a), (-b + discriminantRoot)/(2*a)]
+            else:
+                tL = []
+            crossingsL = []
+            for crossing,t in enumerate(tL):
+                key = (index0, index1, crossing)
+                if key not in clippedIndicesD:
+                    clippedIndicesD[key] = len(clippedVerticesL)
+                    clippedVerticesL.append((x0 + dx*t, y0 + dy*t, z0 + (z1 - z0)*t))
+                crossingsL.append(clippedIndicesD[key])
+            if index0 != indexA:
+                crossingsL.reverse()
+            return crossingsL
+        
+        clippedFacesL = []
+        for face in facesL:
+            insideFaceL = [insideL[index] for index in face]
+            if all(insideFaceL):
+                clippedFacesL.append(tuple([clippedIndex(index) for index in face]))
+                continue
+            polygon = []
+            for n,indexA in enumerate(face):
+                if insideFaceL[n]:
+                    polygon.append(clippedIndex(indexA))
+                polygon.extend(edgeCrossings(indexA, face[(n+1) % len(face)]))
+            for n in xrange(1, len(polygon)-1):
+                clippedFacesL.append((polygon[0], polygon[n], polygon[n+1]))
+        
+        return clippedVerticesL, clippedFacesL
+    
+    
+    def clipPolylineToCircle(self, pointsL, centerX, centerY, radius):
+        """
+        parts of a polyline inside a circle, seen from above: pointsL are the (x,y,z) coordinates of the polyline's points
+        returns a list of polylines (lists of (x,y,z) coordinates). A closed polyline crossing the circle is joined back at its start
+        """
+        radiusSquared = radius*radius
+        partsL = []
+        part = []
+        for (x0,y0,z0),(x1,y1,z1) in zip(pointsL[:-1], pointsL[1:]):
+            dx = x1 - x0; dy = y1 - y0; dz = z1 - z0
+            a = dx*dx + dy*dy
+            b = 2*((x0 - centerX)*dx + (y0 - centerY)*dy)
+            c = (x0 - centerX)*(x0 - centerX) + (y0 - centerY)*(y0 - centerY) - radiusSquared
+            if a == 0:
+                continue
+            discriminant = b*b - 4*a*c
+            # parameters of the segment's part inside the circle
+            if discriminant > 0:
+                discriminantRoot = math.sqrt(discriminant)
+                tStart = max((-b - discriminantRoot)/(2*a), 0)
+                tEnd = min((-b + discriminantRoot)/(2*a), 1)
+            else:
+                tStart = tEnd = 1
+            if tStart >= tEnd:
+                if len(part) > 1: partsL.append(part)
+                part = []
+                continue
+            if (tStart > 0) or (len(part) == 0):
+                if len(part) > 1: partsL.append(part)
+                part = [(x0,y0,z0) if tStart == 0 else (x0 + dx*tStart, y0 + dy*tStart, z0 + dz*tStart)]
+            part.append((x1,y1,z1) if tEnd == 1 else (x0 + dx*tEnd, y0 + dy*tEnd, z0 + dz*tEnd))
+            if tEnd < 1:
+                partsL.append(part)
+                part = []
+        if len(part) > 1:
+            partsL.append(part)
+        
+        if (len(partsL) > 1) and (pointsL[0] == pointsL[-1]) and (partsL[0][0] == pointsL[0]) and (partsL[-1][-1] == pointsL[-1]):
+            partsL[0] = partsL.pop() + partsL[0][1:]
+        
+        return partsL
+    
+    
+    def azimuthDirections(self, azimuthsD, northRad=0):
+        """
+        horizontal unit directions (x,y) for azimuths measured clockwise from the north
+        """
+        directions = []
+        for azimuthD in azimuthsD:
+            angleR = math.radians(azimuthD) - northRad  # clockwise from +Y axis
+            directions.append((math.sin(angleR), math.cos(angleR)))
+        
+        return directions
+    
+    
+    def horizonAngles(self, elevationsLL, startX, startY, cellSize, originPt, directions, maxDistance=None, minDistance=None, earthCurvature=False, unitConversionFactor=1, bilinear=True, elevationMax=None):
+        """
+        calculate horizon angles (in radians) for each of the directions by walking outward across the elevation grid, and keeping the running maximum elevation angle
+        originPt is a (x,y,z) tuple. Horizon angles are never smaller than 0 (astronomical horizon)
+        bilinear=False samples the nearest cell instead, which keeps the thin obstacles (walls) of rasterized meshes
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        originX, originY, originZ = originPt
+        originColumn = (originX - startX) / cellSize
+        originRow = (startY - originY) / cellSize
+        
+        stepDistance = 0.5*cellSize  # sample the grid twice per cell
+        if (minDistance == None) or (minDistance < stepDistance):
+            minDistance = stepDistance  # skip the cell of the origin itself
+        if maxDistance == None:
+            maxDistance = math.hypot(numOfColumns, numOfRows) * cellSize
+        
+        if elevationMax == None:
+            elevationMax = max([max([z for z in elevationsRow if z != None] or [originZ]) for elevationsRow in elevationsLL])
+        heightMax = elevationMax - originZ
+        
+        # earth curvature and atmospheric refraction correction (in Rhino document units): 0.0675 * distanceKM^2 meters
+        curvatureFactor = 0.0675 * unitConversionFactor / 1000000 if earthCurvature else 0
+        
+        horizonAnglesR = []
+        for dx,dy in directions:
+            maxTangent = 0
+            distance = minDistance
+            while distance <= maxDistance:
+                if heightMax <= maxTangent*distance:
+                    break  # even the highest cell of the grid can not raise the horizon any more
+                columnF = originColumn + dx*distance/cellSize
+                rowF = originRow - dy*distance/cellSize
+                if (columnF < 0) or (rowF < 0) or (columnF > numOfColumns-1) or (rowF > numOfRows-1):
+                    break  # walked out of the grid
+                if bilinear:
+                    z = self.elevationAt(elevationsLL, columnF, rowF)
+                else:
+                    z = elevationsLL[int(rowF+0.5)][int(columnF+0.5)]
+                if z != None:
+                    tangent = (z - originZ - curvatureFactor*distance*distance) / distance
+                    if tangent > maxTangent:
+                        maxTangent = tangent
+                distance += stepDistance
+            horizonAnglesR.append(math.atan(maxTangent))
+        
+        return horizonAnglesR
+    
+    
+    def horizonAnglesMultiple(self, elevationsLL, startX, startY, cellSize, originPts, directions, maxDistance=None, minDistance=None, earthCurvature=False, unitConversionFactor=1, bilinear=True):
+        """
+        calculate horizon angles (in radians) for a number of origin points, sharing the same elevation grid and directions
+        """
+        elevationMax = None
+        for elevationsRow in elevationsLL:
+            for z in elevationsRow:
+                if (z != None) and ((elevationMax == None) or (z > elevationMax)):
+                    elevationMax = z
+        
+        horizonAnglesRLL = []
+        for originPt in originPts:
+            horizonAnglesR = self.horizonAngles(elevationsLL, startX, startY, cellSize, originPt, directions, maxDistance, minDistance, earthCurvature, unitConversionFactor, bilinear, elevationMax)
+            horizonAnglesRLL.append(horizonAnglesR)
+        
+        return horizonAnglesRLL
+    
+    
+    def horizonAnglesGrid(self, elevationsLL, cellSize, directions):
+        """
+        calculate horizon angles (in radians) of all cells of the elevation grid, with the convex hull line sweep (O(cells) per direction)
+        the grid is split into lines of cells parallel to the direction (one cell per column or row), and each line is swept from its far end, while keeping the upper convex hull of the already swept cells
+        returns a list of array("f") horizon angles per direction, with the index of a cell being row*numOfColumns+column. Cells with no data (None) are left at 0
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        
+        horizonAnglesL = []
+        for dx,dy in directions:
+            horizonAngles = array.array("f", [0]) * (numOfRows*numOfColumns)
+            # direction in grid coordinates (rows go towards -Y)
+            dColumn = dx
+            dRow = -dy
+            if abs(dColumn) >= abs(dRow):
+                # lines are swept column by column
+                numOfPrimary = numOfColumns; numOfSecondary = numOfRows; dPrimary = dColumn; dSecondary = dRow
+                cellIndex = lambda primary, secondary: secondary*numOfColumns + primary
+            else:
+                # lines are swept row by row
+                numOfPrimary = numOfRows; numOfSecondary = numOfColumns; dPrimary = dRow; dSecondary = dColumn
+                cellIndex = lambda primary, secondary: primary*numOfColumns + secondary
+            
+            lineSlope = dSecondary / dPrimary
+            shifts = [int(round(primary*lineSlope)) for primary in xrange(numOfPrimary)]  # cell (primary, secondary) belongs to the line: secondary - shifts[primary]
+            lineIndexMin = -max(shifts)
+            hullsL = [[] for k in xrange(numOfSecondary - min(shifts) - lineIndexMin)]  # upper convex hull (t, z) per line, the nearest cell being the last one
+            
+            if dPrimary > 0:
+                primaryOrder = xrange(numOfPrimary-1, -1, -1)  # start from the far end of the lines
+            else:
+                primaryOrder = xrange(numOfPrimary)
+            for primary in primaryOrder:
+                shift = shifts[primary]
+                for secondary in xrange(numOfSecondary):
+                    index = cellIndex(primary, secondary)
+                    z = elevationsLL[index // numOfColumns][index % numOfColumns]
+                    if z == None:
+                        continue
+                    t = (primary*dPrimary + secondary*dSecondary) * cellSize  # distance along the direction
+                    hull = hullsL[secondary - shift - lineIndexMin]
+                    # remove the hull cells which are below the line from the current cell to the next hull cell
+                    while (len(hull) >= 2) and ((hull[-1][1]-z)/(hull[-1][0]-t) <= (hull[-2][1]-z)/(hull[-2][0]-t)):
+                        hull.pop()
+                    if len(hull) > 0:
+                        tangent = (hull[-1][1]-z)/(hull[-1][0]-t)
+                        if tangent > 0:
+                            horizonAngles[index] = math.atan(tangent)
+                    hull.append((t, z))
+            horizonAnglesL.append(horizonAngles)
+        
+        return horizonAnglesL
+    
+    
+    def skyViewFactors(self, horizonAnglesL):
+        """
+        sky view factor of a horizontal surface, from the horizon angles of equally spaced azimuth sectors (horizonAnglesGrid output): mean of the squared cosines of the horizon angles
+        returns array("f") of sky view factors (from 0 to 1)
+        """
+        numOfSectors = len(horizonAnglesL)
+        skyViewFactors = array.array("f", [0]) * len(horizonAnglesL[0])
+        for horizonAngles in horizonAnglesL:
+            for index, horizonAngleR in enumerate(horizonAngles):
+                skyViewFactors[index] += math.cos(horizonAngleR)**2 / numOfSectors
+        
+        return skyViewFactors
+    
+    
+    def gradientsGrid(self, elevationsLL, cellSize):
+        """
+        elevation gradients of each cell of the grid, by Horn's 3x3 finite differences kernel
+        neighbouring cells outside of the grid or with no data are linearly extrapolated from the central cell and the opposite neighbour (2*e - opposite), or for the corner cells from the two neighbours next to them (b + d - e), so that the gradients of a planar terrain are exact up to the edges of the grid
+        returns two grids (lists of rows, the same as elevationsLL): dz/dx (towards east) and dz/dy (towards north). Cells with no data, and cells without any neighbour along one of the axes, are set to None
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        dzdxLL = []
+        dzdyLL = []
+        for row in xrange(numOfRows):
+            upperRow = elevationsLL[row-1] if row > 0 else None
+            centralRow = elevationsLL[row]
+            lowerRow = elevationsLL[row+1] if row < numOfRows-1 else None
+            dzdxL = [None]*numOfColumns
+            dzdyL = [None]*numOfColumns
+            for column in xrange(numOfColumns):
+                e = centralRow[column]
+                if e == None:
+                    continue
+                # a b c
+                # d e f
+                # g h i
+                a = b = c = d = f = g = h = i = None
+                if upperRow != None:
+                    b = upperRow[column]
+                    if column > 0: a = upperRow[column-1]
+                    if column < numOfColumns-1: c = upperRow[column+1]
+                if column > 0: d = centralRow[column-1]
+                if column < numOfColumns-1: f = centralRow[column+1]
+                if lowerRow != None:
+                    h = lowerRow[column]
+                    if column > 0: g = lowerRow[column-1]
+                    if column < numOfColumns-1: i = lowerRow[column+1]
+                
+                # side neighbours: extrapolated from the opposite side neighbour
+                if (b == None) and (h != None): b = 2*e - h
+                elif (h == None) and (b != None): h = 2*e - b
+                if (d == None) and (f != None): d = 2*e - f
+                elif (f == None) and (d != None): f = 2*e - d
+                if (b == None) or (d == None):
+                    # no neighbours along one of the axes: the gradient can not be estimated
+                    continue
+                
+                # corner neighbours: extrapolated from the opposite corner neighbour, or from the side neighbours next to them
+                if a == None: a = (2*e - i) if (i != None) else (b + d - e)
+                if c == None: c = (2*e - g) if (g != None) else (b + f - e)
+                if g == None: g = (2*e - c) if (c != None) else (h + d - e)
+                if i == None: i = (2*e - a) if (a != None) else (h + f - e)
+                
+                dzdxL[column] = ((c + 2*f + i) - (a + 2*d + g)) / (8*cellSize)
+                dzdyL[column] = ((a + 2*b + c) - (g + 2*h + i)) / (8*cellSize)
+            dzdxLL.append(dzdxL)
+            dzdyLL.append(dzdyL)
+        
+        return dzdxLL, dzdyLL
+    
+    
+    def summedAreaTable(self, valuesLL):
+        """
+        summed-area table (integral image) of the grid: element (row, column) is the sum of all grid cells above and left of it
+        sum of any rectangular window of cells is then calculated from only four elements of the table (windowSums)
+        returns array("d") of (numOfRows+1)*(numOfColumns+1) elements, indexed by row*(numOfColumns+1)+column. Cells with no data (None) are summed as 0
+        """
+        numOfRows = len(valuesLL)
+        numOfColumns = len(valuesLL[0])
+        tableColumns = numOfColumns + 1
+        table = array.array("d", [0]) * ((numOfRows+1)*tableColumns)
+        for row in xrange(numOfRows):
+            valuesRow = valuesLL[row]
+            rowSum = 0
+            upperIndex = row*tableColumns
+            index = upperIndex + tableColumns
+            for column in xrange(numOfColumns):
+                value = valuesRow[column]
+                if value != None:
+                    rowSum += value
+                table[index+column+1] = table[upperIndex+column+1] + rowSum
+        
+        return table
+    
+    
+    def windowSums(self, tablesL, numOfColumns, row0, column0, row1, column1):
+        """
+        sums of the grid cells from row0 to row1 and from column0 to column1 (including), for each of the summed-area tables (summedAreaTable outputs of grids with numOfColumns columns)
+        """
+        tableColumns = numOfColumns + 1
+        a = row0*tableColumns + column0
+        b = row0*tableColumns + column1 + 1
+        c = (row1+1)*tableColumns + column0
+        d = (row1+1)*tableColumns + column1 + 1
+        return [table[d] - table[b] - table[c] + table[a] for table in tablesL]
+    
+    
+    def windowMinMax(self, valuesLL, radius):
+        """
+        minimum and maximum of the square window of (2*radius+1)x(2*radius+1) cells around each cell of the grid (windows are clipped at the grid edges)
+        windows are slid along the rows, and then along the columns, keeping monotonic deques of window candidates. So the runtime does not depend on the radius
+        valuesLL should not contain cells with no data (None)
+        returns two grids (lists of rows): minimums and maximums
+        """
+        def slidingMinMax(valuesL):
+            minL = []; maxL = []
+            minDeque = collections.deque(); maxDeque = collections.deque()  # indices of values
+            numOfValues = len(valuesL)
+            for index in xrange(numOfValues + radius):
+                if index < numOfValues:
+                    value = valuesL[index]
+                    while minDeque and (valuesL[minDeque[-1]] >= value): minDeque.pop()
+                    minDeque.append(index)
+                    while maxDeque and (valuesL[maxDeque[-1]] <= value): maxDeque.pop()
+                    maxDeque.append(index)
+                center = index - radius
+                if center >= 0:
+                    while minDeque[0] < center - radius: minDeque.popleft()
+                    while maxDeque[0] < center - radius: maxDeque.popleft()
+                    minL.append(valuesL[minDeque[0]])
+                    maxL.append(valuesL[maxDeque[0]])
+            return minL, maxL
+        
+        numOfRows = len(valuesLL)
+        numOfColumns = len(valuesLL[0])
+        rowsMinLL = []; rowsMaxLL = []
+        for valuesRow in valuesLL:
+            minL, maxL = slidingMinMax(valuesRow)
+            rowsMinLL.append(minL); rowsMaxLL.append(maxL)
+        
+        minLL = [[None]*numOfColumns for row in xrange(numOfRows)]
+        maxLL = [[None]*numOfColumns for row in xrange(numOfRows)]
+        for column in xrange(numOfColumns):
+            minL, maxLdummy = slidingMinMax([rowsMinLL[row][column] for row in xrange(numOfRows)])
+            minLdummy, maxL = slidingMinMax([rowsMaxLL[row][column] for row in xrange(numOfRows)])
+            for row in xrange(numOfRows):
+                minLL[row][column] = minL[row]
+                maxLL[row][column] = maxL[row]
+        
+        return minLL, maxLL
+    
+    
+    def slopeAndDirection(self, dzdx, dzdy):
+        """
+        slope angle (in radians) and slope direction (downslope, in degrees clockwise from the Y axis) from the elevation gradients
+        """
+        gradient = math.hypot(dzdx, dzdy)
+        slopeAngleR = math.atan(gradient)
+        if gradient < 1e-9:
+            slopeDirectionD = 0
+        else:
+            slopeDirectionD = math.degrees(math.atan2(-dzdx, -dzdy)) % 360
+        
+        return slopeAngleR, slopeDirectionD
+    
+    
+    def viewshed(self, elevationsLL, cellSize, observerColumn, observerRow, observerZ, targetHeight=0, maxDistance=None):
+        """
+        visibility of each cell of the grid from the observer, by XDraw approximation: the cells are processed in square rings around the observer cell, and the line of sight height of each cell is interpolated from the two cells of the previous ring which the line towards the observer passes between
+        observerZ: absolute height of the observer (cell elevation plus observer height). targetHeight: height above the cells which should be visible. maxDistance: cells further from the observer are not visible
+        returns array("B") of 1 (visible) and 0 (not visible, outside of the maxDistance or with no data), indexed by row*numOfColumns+column
+        """
+        numOfRows = len(elevationsLL)
+        numOfColumns = len(elevationsLL[0])
+        visible = array.array("B", [0]) * (numOfRows*numOfColumns)
+        if (observerColumn < 0) or (observerColumn >= numOfColumns) or (observerRow < 0) or (observerRow >= numOfRows):
+            return visible
+        
+        numOfRings = max(observerColumn, numOfColumns-1-observerColumn, observerRow, numOfRows-1-observerRow)
+        if maxDistance != None:
+            numOfRings = min(numOfRings, int(maxDistance/cellSize))
+            maxDistanceSquared = (maxDistance/cellSize)**2
+        else:
+            maxDistanceSquared = None
+        
+        # line of sight heights: the lowest height at which a cell can be seen from the observer (or cell elevation, if it is higher), for the cells of the last processed ring
+        losHeights = {}
+        losHeights[(observerRow, observerColumn)] = observerZ
+        if elevationsLL[observerRow][observerColumn] != None:
+            visible[observerRow*numOfColumns+observerColumn] = 1
+        
+        for ring in xrange(1, numOfRings+1):
+            ringLosHeights = {}
+            distanceRatio = ring / float(ring-1) if ring > 1 else None
+            rowStart = max(observerRow-ring, 0); rowEnd = min(observerRow+ring, numOfRows-1)
+            columnStart = max(observerColumn-ring, 0); columnEnd = min(observerColumn+ring, numOfColumns-1)
+            for row in xrange(rowStart, rowEnd+1):
+                dr = row - observerRow
+                if (dr == ring) or (dr == -ring):
+                    columns = xrange(columnStart, columnEnd+1)  # upper and lower side of the ring
+                else:
+                    columns = [column for column in (observerColumn-ring, observerColumn+ring) if (column >= columnStart) and (column <= columnEnd)]  # left and right side of the ring
+                elevationsRow = elevationsLL[row]
+                for column in columns:
+                    dc = column - observerColumn
+                    z = elevationsRow[column]
+                    if ring == 1:
+                        # neighbors of the observer cell are always visible
+                        losHeight = -1e300
+                    else:
+                        # interpolate the line of sight height where the line towards the observer crosses the previous ring
+                        if abs(dc) >= abs(dr):
+                            previousColumn = observerColumn + (ring-1)*(1 if dc > 0 else -1)
+                            previousRowF = observerRow + dr*(ring-1)/float(ring)
+                            row0 = int(math.floor(previousRowF)); fraction = previousRowF - row0
+                            h0 = losHeights.get((row0, previousColumn)); h1 = losHeights.get((row0+1, previousColumn), h0)
+                        else:
+                            previousRow = observerRow + (ring-1)*(1 if dr > 0 else -1)
+                            previousColumnF = observerColumn + dc*(ring-1)/float(ring)
+                            column0 = int(math.floor(previousColumnF)); fraction = previousColumnF - column0
+                            h0 = losHeights.get((previousRow, column0)); h1 = losHeights.get((previousRow, column0+1), h0)
+                        if h0 == None: h0 = h1
+                        previousLosHeight = h0 + (h1 - h0)*fraction
+                        losHeight = observerZ + (previousLosHeight - observerZ)*distanceRatio
+                    
+                    if z == None:
+                        ringLosHeights[(row, column)] = losHeight  # cells with no data do not block the line of sight
+                        continue
+                    if (z + targetHeight >= losHeight) and ((maxDistanceSquared == None) or (dr*dr + dc*dc <= maxDistanceSquared)):
+                        visible[row*numOfColumns+column] = 1
+                    ringLosHeights[(row, column)] = max(z, losHeight)
+            losHeights = ringLosHeights
+        
+        return visible
+    
+    
+    def cumulativeViewshed(self, elevationsLL, cellSize, observers, targetHeight=0, maxDistance=None, observerBitsets=False, parallel=True, batchSize=32):
+        """
+        number of observers which see each cell of the grid (viewsheds of all observers share the same elevation grid)
+        observers: list of (column, row, observerZ) tuples, the same as viewshed's inputs
+        observers' viewsheds are calculated on all processor cores if parallel=True, in batches of "batchSize" observers (only the viewsheds of a single batch are kept in memory at once)
+        returns array("I") of counts indexed by row*numOfColumns+column, and a list of per observer bitsets (array("B"), bit "index%8" of byte "index//8" being set for visible cells) if observerBitsets=True (otherwise None)
+        """
+        numOfCells = len(elevationsLL) * len(elevationsLL[0])
+        counts = array.array("I", [0]) * numOfCells
+        bitsetsL = [] if observerBitsets else None
+        
+        def observerViewshed(observerIndex):
+            observerColumn, observerRow, observerZ = batchObservers[observerIndex]
+            return self.viewshed(elevationsLL, cellSize, observerColumn, observerRow, observerZ, targetHeight, maxDistance)
+        
+        for batchStart in xrange(0, len(observers), batchSize):
+            batchObservers = observers[batchStart:batchStart+batchSize]
+            for visible in runInParallel(observerViewshed, len(batchObservers), parallel):
+                if observerBitsets:
+                    bitset = array.array("B", [0]) * ((numOfCells+7)//8)
+                for index, isVisible in enumerate(visible):
+                    if isVisible:
+                        counts[index] += 1
+                        if observerBitsets:
+                            bitset[index >> 3] |= 1 << (index & 7)
+                if observerBitsets:
+                    bitsetsL.append(bitset)
+        
+        return counts, bitsetsL
+    
+    
+    def highestHitRow(self, rayHit, numOfRows, startRow=None, coarseStep=16, toleranceRows=1):
+        """
+        find the highest row (of a sky dome column) for which rayHit(row) returns True, with as few rays as possible
+        rows below the terrain silhouette are assumed to be hit, and rows above it not. Returns -1 if none of the rows is hit
+        startRow (for example: the result of the neighbouring column) is searched around with doubling steps, otherwise coarse rays are shot from the zenith downward
+        the transition between hit and missed rows is then bisected, until it is not wider than toleranceRows
+        """
+        if (startRow == None) or (startRow < 0):
+            # coarse rays from the zenith downward
+            row = numOfRows-1
+            missRow = numOfRows  # dummy row above the zenith
+            while True:
+                if rayHit(row):
+                    hitRow = row
+                    break
+                missRow = row
+                if row == 0:
+                    return -1
+                row = max(row-coarseStep, 0)
+        else:
+            startRow = min(startRow, numOfRows-1)
+            step = 1
+            if rayHit(startRow):
+                # search upward
+                hitRow = startRow
+                while True:
+                    if hitRow == numOfRows-1:
+                        missRow = numOfRows
+                        break
+                    row = min(hitRow+step, numOfRows-1)
+                    if rayHit(row):
+                        hitRow = row
+                        step *= 2
+                    else:
+                        missRow = row
+                        break
+            else:
+                # search downward
+                missRow = startRow
+                while True:
+                    if missRow == 0:
+                        return -1
+                    row = max(missRow-step, 0)
+                    if rayHit(row):
+                        hitRow = row
+                        break
+                    else:
+                        missRow = row
+                        step *= 2
+        
+        # bisection of the transition between hitRow and missRow
+        while (missRow - hitRow) > toleranceRows:
+            row = (hitRow + missRow) // 2
+            if rayHit(row):
+                hitRow = row
+            else:
+                missRow = row
+        
+        return hitRow
+    
+    
+    def utmGrid(self, geoTiff, utmZone, northOrsouth):
+        """
+        UTM zone grid covering a geographic (EPSG:4326) geoTiff: the grid's bounds are the projected bounds of the geoTiff edges, and its cell size keeps the number of cells along the diagonal of the geoTiff (as GDALWarp does)
+        returns originX, originY (upper left corner of the grid), cellSize, numOfRows, numOfColumns
+        """
+        numOfEdgeSamples = 32
+        minLongitude = geoTiff.originX; maxLongitude = geoTiff.originX + geoTiff.numOfColumns*geoTiff.cellSizeX
+        maxLatitude = geoTiff.originY; minLatitude = geoTiff.originY - geoTiff.numOfRows*geoTiff.cellSizeY
+        latitudesD = []; longitudesD = []
+        for k in xrange(numOfEdgeSamples+1):
+            longitude = minLongitude + (maxLongitude-minLongitude)*k/numOfEdgeSamples
+            latitude = minLatitude + (maxLatitude-minLatitude)*k/numOfEdgeSamples
+            latitudesD.extend([minLatitude, maxLatitude, latitude, latitude])
+            longitudesD.extend([longitude, longitude, minLongitude, maxLongitude])
+        eastingsL, northingsL = UTM().utmCoordinates(latitudesD, longitudesD, utmZone, northOrsouth)
+        
+        (upperLeftX, lowerRightX), (upperLeftY, lowerRightY) = UTM().utmCoordinates([maxLatitude, minLatitude], [minLongitude, maxLongitude], utmZone, northOrsouth)
+        cellSize = math.hypot(lowerRightX-upperLeftX, lowerRightY-upperLeftY) / math.hypot(geoTiff.numOfColumns, geoTiff.numOfRows)
+        originX = min(eastingsL)
+        originY = max(northingsL)
+        numOfColumns = int(math.ceil((max(eastingsL) - originX) / cellSize))
+        numOfRows = int(math.ceil((originY - min(northingsL)) / cellSize))
+        
+        return originX, originY, cellSize, numOfRows, numOfColumns
+    
+    
+    def reprojectedRow(self, geoTiff, utmGrid, row, utmZone, northOrsouth, resampling="bilinear"):
+        """
+        elevations of a row of the utmGrid (see utmGrid method) sampled from a geographic (EPSG:4326) geoTiff: the centers of the row cells are inverse projected to latitudes and longitudes, and the geoTiff is interpolated ("bilinear" or "cubic") at them
+        only the window of the geoTiff covering the row is read. Cells outside of the geoTiff or with no data are set to None
+        """
+        originX, originY, cellSize, numOfRows, numOfColumns = utmGrid
+        eastingsL = [originX + (column+0.5)*cellSize for column in xrange(numOfColumns)]
+        northingsL = [originY - (row+0.5)*cellSize] * numOfColumns
+        latitudesD, longitudesD = UTM().utmToLatitudesLongitudes(eastingsL, northingsL, utmZone, northOrsouth)
+        
+        # fractional rows and columns of the geoTiff (the centers of its cells are at integer values)
+        columnsF = [(longitude - geoTiff.originX)/geoTiff.cellSizeX - 0.5 for longitude in longitudesD]
+        rowsF = [(geoTiff.originY - latitude)/geoTiff.cellSizeY - 0.5 for latitude in latitudesD]
+        windowRow0 = max(int(math.floor(min(rowsF))) - 1, 0)
+        windowColumn0 = max(int(math.floor(min(columnsF))) - 1, 0)
+        windowLL = geoTiff.readWindow(windowRow0, windowColumn0, int(math.floor(max(rowsF))) + 3 - windowRow0, int(math.floor(max(columnsF))) + 3 - windowColumn0)
+        if len(windowLL) == 0:
+            return [None] * numOfColumns
+        
+        interpolate = self.elevationAtCubic if (resampling == "cubic") else self.elevationAt
+        elevationsRow = [interpolate(windowLL, columnF - windowColumn0, rowF - windowRow0) for columnF, rowF in zip(columnsF, rowsF)]
+        
+        return elevationsRow
+
+
+class UTM(object):
+    """
+    WGS84 Universal Transverse Mercator projection, without MapWinGIS
+    """
+    def transverseMercatorConstants(self, utmZone, northOrsouth):
+        """
+        WGS84 UTM zone constants of the Kruger series (Karney, 2011) for the Transverse Mercator projection:
+        k0*A (scaled rectifying radius), central meridian in radians, false northing, n (third flattening), and the alpha, beta and delta coefficients
+        """
+        a = 6378137.0
+        f = 1/298.257223563
+        n = f/(2-f)
+        k0A = 0.9996 * a/(1+n) * (1 + n**2/4 + n**4/64)
+        centralMeridianR = math.radians((utmZone-1)*6 - 180 + 3)
+        falseNorthing = 10000000.0 if (northOrsouth == "south") else 0.0
+        alphas = (n/2 - 2*n**2/3 + 5*n**3/16,  13*n**2/48 - 3*n**3/5,  61*n**3/240)
+        betas = (n/2 - 2*n**2/3 + 37*n**3/96,  n**2/48 + n**3/15,  17*n**3/480)
+        deltas = (2*n - 2*n**2/3 - 2*n**3,  7*n**2/3 - 8*n**3/5,  56*n**3/15)
+        
+        return k0A, centralMeridianR, falseNorthing, n, alphas, betas, deltas
+    
+    
+    def utmCoordinates(self, latitudesD, longitudesD, utmZone, northOrsouth):
+        """
+        project lists of WGS84 latitudes and longitudes to UTM zone eastings and northings (in meters), without MapWinGIS
+        """
+        k0A, centralMeridianR, falseNorthing, n, alphas, betas, deltas = self.transverseMercatorConstants(utmZone, northOrsouth)
+        e = 2*math.sqrt(n)/(1+n)  # first eccentricity
+        
+        eastingsL = []
+        northingsL = []
+        for latitudeD, longitudeD in zip(latitudesD, longitudesD):
+            sinLatitude = math.sin(math.radians(latitudeD))
+            longitudeR = math.radians(longitudeD) - centralMeridianR
+            t = math.sinh(math.atanh(sinLatitude) - e*math.atanh(e*sinLatitude))
+            xiPrime = math.atan2(t, math.cos(longitudeR))
+            etaPrime = math.atanh(math.sin(longitudeR) / math.sqrt(1 + t*t))
+            xi = xiPrime; eta = etaPrime
+            for j,alpha in enumerate(alphas, 1):
+                xi += alpha * math.sin(2*j*xiPrime) * math.cosh(2*j*etaPrime)
+                eta += alpha * math.cos(2*j*xiPrime) * math.sinh(2*j*etaPrime)
+            eastingsL.append(500000 + k0A*eta)
+            northingsL.append(falseNorthing + k0A*xi)
+        
+        return eastingsL, northingsL
+    
+    
+    def utmToLatitudesLongitudes(self, eastingsL, northingsL, utmZone, northOrsouth):
+        """
+        inverse of utmCoordinates: lists of UTM zone eastings and northings (in meters) to WGS84 latitudes and longitudes
+        """
+        k0A, centralMeridianR, falseNorthing, n, alphas, betas, deltas = self.transverseMercatorConstants(utmZone, northOrsouth)
+        
+        latitudesD = []
+        longitudesD = []
+        for easting, northing in zip(eastingsL, northingsL):
+            xi = (northing - falseNorthing) / k0A
+            eta = (easting - 500000) / k0A
+            xiPrime = xi; etaPrime = eta
+            for j,beta in enumerate(betas, 1):
+                xiPrime -= beta * math.sin(2*j*xi) * math.cosh(2*j*eta)
+                etaPrime -= beta * math.cos(2*j*xi) * math.sinh(2*j*eta)
+            chi = math.asin(math.sin(xiPrime) / math.cosh(etaPrime))  # conformal latitude
+            latitudeR = chi
+            for j,delta in enumerate(deltas, 1):
+                latitudeR += delta * math.sin(2*j*chi)
+            latitudesD.append(math.degrees(latitudeR))
+            longitudesD.append(math.degrees(centralMeridianR + math.atan2(math.sinh(etaPrime), math.cos(xiPrime))))
+        
+        return latitudesD, longitudesD
+    
+    
+
+
+class HorizonProfiles(object):
+    """
+    size-bounded cache of horizon profiles (one elevation angle per azimuth) stored as compact binary files
+    """
+    headerFormat = "<4sHddddddI"  # fileSignature, version, latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, elevationM, numOfAzimuths
+    fileSignature = b"GHPF"
+    version = 1
+    fileExtension = ".hpf"
+    
+    def __init__(self, folderPath, maxFolderSizeMB=50):
+        self.folderPath = folderPath
+        self.maxFolderSizeBytes = maxFolderSizeMB * 1024 * 1024
+        self.headerSize = struct.calcsize(self.headerFormat)
+    
+    
+    def profileFilePath(self, latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, source):
+        """
+        file path of a profile for the given key
+        """
+        fileName = "%s_%s_height=%sM_visibility=%s-%sM_%s%s" % (latitude, longitude, heightM, int(minVisibilityRadiusM), int(maxVisibilityRadiusM), source, self.fileExtension)
+        return os.path.join(self.folderPath, fileName)
+    
+    
+    def write(self, latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, source, elevationM, profileAnglesR):
+        """
+        write the profile (elevation angles in radians, for equally spaced azimuths) to the cache and evict the least recently used profiles if the cache is too large
+        """
+        profileFilePath = self.profileFilePath(latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, source)
+        header = struct.pack(self.headerFormat, self.fileSignature, self.version, latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, elevationM, len(profileAnglesR))
+        profileAngles = array.array("f", profileAnglesR)
+        if sys.byteorder != "little":
+            profileAngles.byteswap()
+        
+        myFile = open(profileFilePath, "wb")
+        myFile.write(header)
+        myFile.write(arrayToBytes(profileAngles))
+        myFile.close()
+        
+        self.evict(profileFilePath)
+        return profileFilePath
+    
+    
+    def read(self, latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, source):
+        """
+        read the profile from the cache (memory-mapped if mmap module is available)
+        returns elevationM and the list of elevation angles in radians. Or None, None if the profile has not been cached or its file is invalid
+        """
+        profileFilePath = self.profileFilePath(latitude, longitude, heightM, minVisibilityRadiusM, maxVisibilityRadiusM, source)
+        if not os.path.exists(profileFilePath):
+            return None, None
+        
+        myFile = open(profileFilePath, "rb")
+        try:
+            # unpack the header and the angles directly from the mapped region, without copying the whole file
+            fileMap = mmap.mmap(myFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                elevationM, profileAnglesR = self.unpackProfile(fileMap, len(fileMap))
+            finally:
+                fileMap.close()
+        except Exception as e:
+            # mmap module is not available or the file can not be mapped
+            myFile.seek(0)
+            fileBytes = myFile.read()
+            elevationM, profileAnglesR = self.unpackProfile(fileBytes, len(fileBytes))
+        myFile.close()
+        
+        if profileAnglesR == None:
+            return None, None
+        
+        # mark the profile as the most recently used one
+        os.utime(profileFilePath, None)
+        
+        return elevationM, profileAnglesR
+    
+    
+    def unpackProfile(self, buffer, bufferSize):
+        """
+        unpack the header and the elevation angles from a buffer (mmap or string) with struct.unpack_from offsets
+        returns elevationM and the list of elevation angles in radians. Or None, None if the buffer is not a valid profile
+        """
+        if bufferSize < self.headerSize:
+            return None, None
+        signature, version, latitudeDummy, longitudeDummy, heightMDummy, minVisibilityRadiusMDummy, maxVisibilityRadiusMDummy, elevationM, numOfAzimuths = struct.unpack_from(self.headerFormat, buffer, 0)
+        if (signature != self.fileSignature) or (version != self.version) or (bufferSize != self.headerSize + 4*numOfAzimuths):
+            return None, None
+        profileAnglesR = list(struct.unpack_from("<%sf" % numOfAzimuths, buffer, self.headerSize))
+        
+        return elevationM, profileAnglesR
+    
+    
+    def evict(self, keepFilePath=None):
+        """
+        delete the least recently used profiles, until the size of the cache folder is smaller than maxFolderSizeMB
+        """
+        profileFilesL = []
+        folderSize = 0
+        for fileName in os.listdir(self.folderPath):
+            if fileName.endswith(self.fileExtension):
+                filePath = os.path.join(self.folderPath, fileName)
+                fileStat = os.stat(filePath)
+                profileFilesL.append((fileStat.st_mtime, fileStat.st_size, filePath))
+                folderSize += fileStat.st_size
+        
+        profileFilesL.sort()
+        for lastUsedTime, fileSize, filePath in profileFilesL:
+            if folderSize <= self.maxFolderSizeBytes:
+                break
+            if filePath != keepFilePath:
+                os.remove(filePath)
+                folderSize -= fileSize
+
+
+class ElevationTiles(object):
+    """
+    elevation grid stored in a binary file (a float32 per cell, rows starting at the top (north) of the grid), which is read, written and processed window by window
+    so the memory used depends on the size of the windows (tiles), not on the size of the whole grid
+    """
+    headerFormat = "<4sHII"  # fileSignature, version, numOfRows, numOfColumns
+    fileSignature = b"GETF"
+    version = 1
+    
+    def __init__(self, filePath, numOfRows=None, numOfColumns=None):
+        """
+        open an existing elevation tiles file, or create a new one (with no data in all cells) if numOfRows and numOfColumns are supplied
+        """
+        self.filePath = filePath
+        self.headerSize = struct.calcsize(self.headerFormat)
+        if numOfRows != None:
+            noDataRow = array.array("f", [float("nan")]) * numOfColumns
+            if sys.byteorder != "little":
+                noDataRow.byteswap()
+            noDataRowBytes = arrayToBytes(noDataRow)
+            myFile = open(filePath, "wb")
+            myFile.write(struct.pack(self.headerFormat, self.fileSignature, self.version, numOfRows, numOfColumns))
+            for row in xrange(numOfRows):
+                myFile.write(noDataRowBytes)
+            myFile.close()
+        
+        self.file = open(filePath, "r+b")
+        signature, version, self.numOfRows, self.numOfColumns = struct.unpack(self.headerFormat, self.file.read(self.headerSize))
+        if (signature != self.fileSignature) or (version != self.version):
+            self.file.close()
+            raise ValueError("%s is not a valid elevation tiles file" % filePath)
+        self.fileMap = None
+    
+    
+    def readWindow(self, row0, column0, numOfRows, numOfColumns):
+        """
+        read the window of cells starting at row0, column0 (memory-mapped if mmap module is available). The window is clipped to the grid
+        returns a list of rows (lists of elevations). Cells with no data are set to None
+        """
+        row1 = min(row0+numOfRows, self.numOfRows); row0 = max(row0, 0)
+        column1 = min(column0+numOfColumns, self.numOfColumns); column0 = max(column0, 0)
+        if (row1 <= row0) or (column1 <= column0):
+            return []
+        
+        if (self.fileMap == None) and (mmap != None):
+            try:
+                self.fileMap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception as e:
+                # the file can not be mapped
+                self.fileMap = False
+        
+        windowLL = []
+        for row in xrange(row0, row1):
+            start = self.headerSize + 4*(row*self.numOfColumns + column0)
+            end = start + 4*(column1 - column0)
+            if self.fileMap:
+                rowBytes = self.fileMap[start:end]
+            else:
+                self.file.seek(start)
+                rowBytes = self.file.read(end - start)
+            elevationsRow = arrayFromBytes("f", rowBytes)
+            if sys.byteorder != "little":
+                elevationsRow.byteswap()
+            windowLL.append([z if z == z else None for z in elevationsRow])  # NaN is not equal to itself
+        
+        return windowLL
+    
+    
+    def writeWindow(self, row0, column0, elevationsLL):
+        """
+        write the rows of elevations (None for no data) starting at row0, column0
+        """
+        if self.fileMap:
+            self.fileMap.close()
+        self.fileMap = None  # remap the file at the next reading
+        
+        for rowIndex, elevationsRow in enumerate(elevationsLL):
+            rowElevations = array.array("f", [float("nan") if z == None else z for z in elevationsRow])
+            if sys.byteorder != "little":
+                rowElevations.byteswap()
+            self.file.seek(self.headerSize + 4*((row0+rowIndex)*self.numOfColumns + column0))
+            self.file.write(arrayToBytes(rowElevations))
+        self.file.flush()
+    
+    
+    def mapTiles(self, function, outputFilePath, tileSize=512, halo=0, shrinkFactor=1):
+        """
+        process the grid tile by tile and stitch the results into a new ElevationTiles file
+        function(windowLL) is called with each tile extended by "halo" cells on each side (clipped to the grid), and it should return the processed window with "shrinkFactor" times less rows and columns (rounded up)
+        tileSize and halo should be multiples of the shrinkFactor
+        returns the ElevationTiles of the results
+        """
+        outputNumOfRows = int(math.ceil(self.numOfRows / float(shrinkFactor)))
+        outputNumOfColumns = int(math.ceil(self.numOfColumns / float(shrinkFactor)))
+        outputTiles = ElevationTiles(outputFilePath, outputNumOfRows, outputNumOfColumns)
+        
+        # the results file is deleted if the processing fails
+        try:
+            for tileRow0 in xrange(0, self.numOfRows, tileSize):
+                for tileColumn0 in xrange(0, self.numOfColumns, tileSize):
+                    windowRow0 = max(tileRow0-halo, 0)
+                    windowColumn0 = max(tileColumn0-halo, 0)
+                    windowLL = self.readWindow(windowRow0, windowColumn0, tileRow0+tileSize+halo-windowRow0, tileColumn0+tileSize+halo-windowColumn0)
+                    resultsLL = function(windowLL)
+                    del windowLL
+                    
+                    # crop the halo of the results
+                    outputRow0 = tileRow0 // shrinkFactor
+                    outputColumn0 = tileColumn0 // shrinkFactor
+                    outputNumOfTileRows = min(tileSize // shrinkFactor, outputNumOfRows - outputRow0)
+                    outputNumOfTileColumns = min(tileSize // shrinkFactor, outputNumOfColumns - outputColumn0)
+                    cropRow0 = (tileRow0 - windowRow0) // shrinkFactor
+                    cropColumn0 = (tileColumn0 - windowColumn0) // shrinkFactor
+                    tileResultsLL = [resultsRow[cropColumn0:cropColumn0+outputNumOfTileColumns] for resultsRow in resultsLL[cropRow0:cropRow0+outputNumOfTileRows]]
+                    outputTiles.writeWindow(outputRow0, outputColumn0, tileResultsLL)
+                    del resultsLL
+        except Exception as e:
+            outputTiles.close(True)
+            raise
+        
+        return outputTiles
+    
+    
+    def close(self, deleteFile=False):
+        """
+        close (and delete if deleteFile=True) the elevation tiles file
+        """
+        if self.fileMap:
+            self.fileMap.close()
+        self.fileMap = None
+        self.file.close()
+        if deleteFile:
+            os.remove(self.filePath)
+
+
+class GeoTiff(object):
+    """
+    pure python reader of single image GeoTIFF elevation files (classic TIFF and BigTIFF): stripped or tiled, uncompressed, deflate, LZW or packbits compressed, with or without a horizontal or floating point predictor
+    the file is memory-mapped (if mmap module is available), and only the strips or tiles covering the read window are decoded
+    """
+    typeFormats = {1:"B", 2:"s", 3:"H", 4:"I", 5:"I", 6:"b", 7:"B", 8:"h", 9:"i", 10:"i", 11:"f", 12:"d", 16:"Q", 17:"q", 18:"Q"}  # TIFF field type: struct format
+    sampleFormats = {(1,8):"B", (1,16):"H", (1,32):"I", (1,64):"Q", (2,8):"b", (2,16):"h", (2,32):"i", (2,64):"q", (3,32):"f", (3,64):"d"}  # (SampleFormat, BitsPerSample): struct format
+    maxCachedBlocks = 64
+    
+    def __init__(self, filePath):
+        """
+        read the tags of the first image of the filePath GeoTIFF file
+        """
+        self.filePath = filePath
+        self.file = open(filePath, "rb")
+        self.fileMap = None
+        if mmap != None:
+            try:
+                self.fileMap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception as e:
+                # the file can not be mapped
+                self.fileMap = None
+        
+        byteOrder = self._read(0, 2)
+        if byteOrder == b"II":
+            self.byteOrder = "<"
+        elif byteOrder == b"MM":
+            self.byteOrder = ">"
+        else:
+            self.close()
+            raise ValueError("%s is not a TIFF file" % filePath)
+        version = self._unpack("H", 2)[0]
+        if version == 42:
+            self.bigTiff = False
+            ifdOffset = self._unpack("I", 4)[0]
+        elif version == 43:
+            self.bigTiff = True
+            ifdOffset = self._unpack("Q", 8)[0]
+        else:
+            self.close()
+            raise ValueError("%s is not a TIFF file" % filePath)
+        self.tags = self._readIFD(ifdOffset)
+        
+        # image structure
+        tags = self.tags
+        self.numOfColumns = tags[256][0]
+        self.numOfRows = tags[257][0]
+        self.samplesPerPixel = tags.get(277, (1,))[0]
+        self.bitsPerSample = tags.get(258, (1,))[0]
+        self.bytesPerSample = self.bitsPerSample // 8
+        sampleFormat = tags.get(339, (1,))[0]
+        self.signedSamples = (sampleFormat == 2)
+        if (sampleFormat, self.bitsPerSample) not in self.sampleFormats:
+            self.close()
+            raise ValueError("%s: %s bits samples of sample format %s are not supported" % (filePath, self.bitsPerSample, sampleFormat))
+        self.sampleFormat = self.sampleFormats[(sampleFormat, self.bitsPerSample)]
+        self.compression = tags.get(259, (1,))[0]
+        if self.compression not in (1, 5, 8, 32946, 32773):
+            self.close()
+            raise ValueError("%s: TIFF compression %s is not supported" % (filePath, self.compression))
+        self.predictor = tags.get(317, (1,))[0]
+        self.planarConfiguration = tags.get(284, (1,))[0]
+        if 322 in tags:
+            # tiles
+            self.blockWidth = tags[322][0]
+            self.blockHeight = tags[323][0]
+            self.blockOffsets = tags[324]
+            self.blockByteCounts = tags[325]
+        else:
+            # strips
+            self.blockWidth = self.numOfColumns
+            self.blockHeight = min(tags.get(278, (self.numOfRows,))[0], self.numOfRows)
+            self.blockOffsets = tags[273]
+            self.blockByteCounts = tags[279]
+        self.blocksAcross = (self.numOfColumns + self.blockWidth - 1) // self.blockWidth
+        self.blocksDown = (self.numOfRows + self.blockHeight - 1) // self.blockHeight
+        self.blocksCache = collections.OrderedDict()
+        
+        # no data value (GDAL_NODATA tag)
+        self.noDataValue = None
+        if 42113 in tags:
+            try:
+                self.noDataValue = float(tags[42113].strip())
+            except ValueError:
+                pass
+        
+        self._readGeoKeys()
+    
+    
+    def _read(self, offset, length):
+        if self.fileMap != None:
+            return self.fileMap[offset:offset+length]
+        self.file.seek(offset)
+        return self.file.read(length)
+    
+    
+    def _unpack(self, structFormat, offset, count=1):
+        return struct.unpack(self.byteOrder + "%s%s" % (count, structFormat), self._read(offset, count*struct.calcsize(structFormat)))
+    
+    
+    def _readIFD(self, ifdOffset):
+        """
+        read the tags of the image file directory: tag: tuple of values (string for ASCII tags)
+        """
+        if self.bigTiff:
+            numOfEntries = self._unpack("Q", ifdOffset)[0]
+            entryFormat = "HHQ"; entrySize = 20; valueSize = 8
+            entriesOffset = ifdOffset + 8
+        else:
+            numOfEntries = self._unpack("H", ifdOffset)[0]
+            entryFormat = "HHI"; entrySize = 12; valueSize = 4
+            entriesOffset = ifdOffset + 2
+        
+        tags = {}
+        for i in xrange(numOfEntries):
+            entryOffset = entriesOffset + i*entrySize
+            tag, fieldType, count = self._unpack(entryFormat[0], entryOffset, 2) + self._unpack(entryFormat[2], entryOffset+4)
+            if fieldType not in self.typeFormats:
+                continue
+            structFormat = self.typeFormats[fieldType]
+            if fieldType in (5, 10):
+                count *= 2  # rationals are pairs of numerator and denominator
+            valuesSize = count * struct.calcsize(structFormat)
+            valuesOffset = entryOffset + entrySize - valueSize
+            if valuesSize > valueSize:
+                valuesOffset = self._unpack("Q" if self.bigTiff else "I", valuesOffset)[0]
+            
+            if fieldType == 2:
+                tags[tag] = self._read(valuesOffset, count).rstrip(b"\x00").decode("latin-1")
+            else:
+                values = self._unpack(structFormat, valuesOffset, count)
+                if fieldType in (5, 10):
+                    values = tuple(values[k] / float(values[k+1]) if values[k+1] != 0 else 0.0 for k in xrange(0, count, 2))
+                tags[tag] = values
+        
+        return tags
+    
+    
+    def _readGeoKeys(self):
+        """
+        read GeoKeys, EPSG code, and the affine transform: coordinates of the upper left corner of the upper left cell and cell sizes
+        """
+        tags = self.tags
+        self.geoKeys = {}
+        geoKeyDirectory = tags.get(34735, ())
+        if len(geoKeyDirectory) >= 4:
+            numOfKeys = geoKeyDirectory[3]
+            for k in xrange(numOfKeys):
+                keyId, location, count, valueOffset = geoKeyDirectory[4+4*k:8+4*k]
+                if location == 0:
+                    value = valueOffset
+                elif location == 34736:
+                    value = tags.get(34736, ())[valueOffset:valueOffset+count]
+                    if len(value) == 1:
+                        value = value[0]
+                elif location == 34737:
+                    value = tags.get(34737, "")[valueOffset:valueOffset+count].rstrip("|")
+                else:
+                    value = tags.get(location, ())[valueOffset:valueOffset+count]
+                self.geoKeys[keyId] = value
+        
+        # EPSG code of the projected (ProjectedCSTypeGeoKey) or geographic (GeographicTypeGeoKey) coordinate system. 32767 stands for user-defined
+        self.epsgCode = None
+        for keyId in (3072, 2048):
+            if (keyId in self.geoKeys) and (self.geoKeys[keyId] != 32767):
+                self.epsgCode = self.geoKeys[keyId]
+                break
+        
+        if 34264 in tags:
+            # ModelTransformationTag (rotation terms are not supported)
+            transformation = tags[34264]
+            self.cellSizeX = transformation[0]
+            self.cellSizeY = -transformation[5]
+            self.originX = transformation[3]
+            self.originY = transformation[7]
+        elif (33550 in tags) and (33922 in tags):
+            # ModelPixelScaleTag and ModelTiepointTag
+            scaleX, scaleY = tags[33550][:2]
+            tiePointI, tiePointJ, tiePointK, tiePointX, tiePointY = tags[33922][:5]
+            self.cellSizeX = scaleX
+            self.cellSizeY = scaleY
+            self.originX = tiePointX - tiePointI*scaleX
+            self.originY = tiePointY + tiePointJ*scaleY
+        else:
+            self.cellSizeX = self.cellSizeY = 1.0
+            self.originX = self.originY = 0.0
+        
+        if self.geoKeys.get(1025) == 2:
+            # GTRasterTypeGeoKey is RasterPixelIsPoint: the tie point is the center of the cell
+            self.originX -= self.cellSizeX/2.0
+            self.originY += self.cellSizeY/2.0
+    
+    
+    def cellCenter(self, row, column):
+        """
+        coordinates of the center of the cell at row, column
+        """
+        return self.originX + (column+0.5)*self.cellSizeX, self.originY - (row+0.5)*self.cellSizeY
+    
+    
+    def windowFromBounds(self, minX, minY, maxX, maxY):
+        """
+        row0, column0, numOfRows, numOfColumns of the window of cells covering the bounds, clipped to the grid
+        """
+        column0 = max(int(math.floor((minX-self.originX)/self.cellSizeX)), 0)
+        column1 = min(int(math.ceil((maxX-self.originX)/self.cellSizeX)), self.numOfColumns)
+        row0 = max(int(math.floor((self.originY-maxY)/self.cellSizeY)), 0)
+        row1 = min(int(math.ceil((self.originY-minY)/self.cellSizeY)), self.numOfRows)
+        
+        return row0, column0, max(row1-row0, 0), max(column1-column0, 0)
+    
+    
+    def readWindow(self, row0, column0, numOfRows, numOfColumns, band=0):
+        """
+        read the elevations of the window of cells starting at row0, column0. The window is clipped to the grid
+        returns a list of rows (lists of elevations). Cells with no data are set to None
+        """
+        row1 = min(row0+numOfRows, self.numOfRows); row0 = max(row0, 0)
+        column1 = min(column0+numOfColumns, self.numOfColumns); column0 = max(column0, 0)
+        if (row1 <= row0) or (column1 <= column0):
+            return []
+        
+        windowLL = [[] for row in xrange(row0, row1)]
+        for blockRow in xrange(row0 // self.blockHeight, (row1-1) // self.blockHeight + 1):
+            blockRow0 = blockRow*self.blockHeight
+            for blockColumn in xrange(column0 // self.blockWidth, (column1-1) // self.blockWidth + 1):
+                blockColumn0 = blockColumn*self.blockWidth
+                blockValues = self._blockValues(blockRow*self.blocksAcross + blockColumn, band)
+                windowColumn0 = max(column0, blockColumn0) - blockColumn0
+                windowColumn1 = min(column1, blockColumn0+self.blockWidth) - blockColumn0
+                for row in xrange(max(row0, blockRow0), min(row1, blockRow0+self.blockHeight)):
+                    start = (row-blockRow0)*self.blockWidth
+                    windowLL[row-row0].extend(blockValues[start+windowColumn0:start+windowColumn1])
+        
+        return windowLL
+    
+    
+    def _blockValues(self, blockIndex, band):
+        """
+        decoded values of a band of a strip or tile, row after row (None for no data). Recently used blocks are cached
+        """
+        if self.planarConfiguration == 2:
+            blockIndex += band * self.blocksAcross * self.blocksDown
+            blockSamplesPerPixel = 1
+            band = 0
+        else:
+            blockSamplesPerPixel = self.samplesPerPixel
+        cacheKey = (blockIndex, band)
+        if cacheKey in self.blocksCache:
+            blockValues = self.blocksCache.pop(cacheKey)
+            self.blocksCache[cacheKey] = blockValues
+            return blockValues
+        
+        numOfBlockCells = self.blockWidth * self.blockHeight
+        if (blockIndex >= len(self.blockOffsets)) or (self.blockByteCounts[blockIndex] == 0):
+            # sparse block
+            blockValues = [None] * numOfBlockCells
+        else:
+            values = self._decodeBlock(blockIndex, blockSamplesPerPixel)
+            if blockSamplesPerPixel > 1:
+                values = values[band::blockSamplesPerPixel]
+            noDataValue = self.noDataValue
+            blockValues = [None if (z != z) or (z == noDataValue) else z for z in values]  # NaN is not equal to itself
+            if len(blockValues) < numOfBlockCells:
+                # last strip
+                blockValues.extend([None] * (numOfBlockCells - len(blockValues)))
+        
+        self.blocksCache[cacheKey] = blockValues
+        if len(self.blocksCache) > self.maxCachedBlocks:
+            self.blocksCache.popitem(last=False)
+        
+        return blockValues
+    
+    
+    def _decodeBlock(self, blockIndex, blockSamplesPerPixel):
+        """
+        decompress a strip or tile, and undo its predictor
+        """
+        data = self._read(self.blockOffsets[blockIndex], self.blockByteCounts[blockIndex])
+        if self.compression in (8, 32946):
+            data = zlib.decompress(data)
+        elif self.compression == 5:
+            data = self._lzwDecode(data)
+        elif self.compression == 32773:
+            data = self._packBitsDecode(data)
+        
+        rowLength = self.blockWidth * blockSamplesPerPixel  # number of samples in a row of the block
+        numOfRows = min(len(data) // (rowLength*self.bytesPerSample), self.blockHeight)
+        data = data[:numOfRows*rowLength*self.bytesPerSample]
+        
+        if self.predictor == 3:
+            return self._floatingPointPredictor(data, rowLength, blockSamplesPerPixel)
+        
+        if self.predictor == 2:
+            # differences are added as unsigned integers
+            values = list(struct.unpack(self.byteOrder + "%s%s" % (numOfRows*rowLength, self.sampleFormat.upper()), data))
+            modulo = 1 << self.bitsPerSample
+            for rowStart in xrange(0, len(values), rowLength):
+                for i in xrange(rowStart+blockSamplesPerPixel, rowStart+rowLength):
+                    values[i] = (values[i] + values[i-blockSamplesPerPixel]) % modulo
+            if self.signedSamples:
+                signedLimit = modulo >> 1
+                values = [value-modulo if value >= signedLimit else value for value in values]
+            return values
+        
+        return struct.unpack(self.byteOrder + "%s%s" % (numOfRows*rowLength, self.sampleFormat), data)
+    
+    
+    def _floatingPointPredictor(self, data, rowLength, blockSamplesPerPixel):
+        """
+        undo the floating point predictor: bytes of each row are differenced, and grouped by their significance (the most significant bytes of all samples first)
+        """
+        bytesPerSample = self.bytesPerSample
+        rowBytes = rowLength * bytesPerSample
+        data = bytearray(data)
+        values = []
+        for rowStart in xrange(0, len(data), rowBytes):
+            row = data[rowStart:rowStart+rowBytes]
+            for i in xrange(blockSamplesPerPixel, rowBytes):
+                row[i] = (row[i] + row[i-blockSamplesPerPixel]) & 255
+            samplesBytes = bytearray(rowBytes)
+            for byteIndex in xrange(bytesPerSample):
+                samplesBytes[byteIndex::bytesPerSample] = row[byteIndex*rowLength:(byteIndex+1)*rowLength]
+            values.extend(struct.unpack(">%s%s" % (rowLength, self.sampleFormat), bytes(samplesBytes)))
+        
+        return values
+    
+    
+    def _lzwDecode(self, data):
+        """
+        decompress TIFF LZW data (most significant bit first codes, 9 to 12 bits long, with early change)
+        """
+        data = bytearray(data) + bytearray(3)  # padding for reading the last code
+        numOfBits = (len(data)-3) * 8
+        table = [bytes(bytearray([i])) for i in xrange(256)] + [None, None]  # 256: clear code, 257: end of information
+        codeLength = 9
+        bitPosition = 0
+        previous = None
+        decodedL = []
+        while bitPosition + codeLength <= numOfBits:
+            bytePosition = bitPosition >> 3
+            word = (data[bytePosition] << 16) | (data[bytePosition+1] << 8) | data[bytePosition+2]
+            code = (word >> (24 - (bitPosition & 7) - codeLength)) & ((1 << codeLength) - 1)
+            bitPosition += codeLength
+            
+            if code == 256:
+                del table[258:]
+                codeLength = 9
+                previous = None
+                continue
+            elif code == 257:
+                break
+            
+            if previous == None:
+                entry = table[code]
+            else:
+                if code < len(table):
+                    entry = table[code]
+                    table.append(previous + entry[:1])
+                else:
+                    entry = previous + previous[:1]
+                    table.append(entry)
+                if (len(table) + 1 >= (1 << codeLength)) and (codeLength < 12):
+                    codeLength += 1
+            decodedL.append(entry)
+            previous = entry
+        
+        return b"".join(decodedL)
+    
+    
+    def _packBitsDecode(self, data):
+        """
+        decompress PackBits run-length encoded data
+        """
+        data = bytearray(data)
+        decoded = bytearray()
+        i = 0
+        while i < len(data):
+            header = data[i]
+            i += 1
+            if header < 128:
+                # literal run of header+1 bytes
+                decoded.extend(data[i:i+header+1])
+                i += header+1
+            elif header > 128:
+                # byte repeated 257-header times
+                decoded.extend(data[i:i+1] * (257-header))
+                i += 1
+        
+        return bytes(decoded)
+    
+    
+    def close(self):
+        """
+        close the GeoTIFF file
+        """
+        if self.fileMap != None:
+            self.fileMap.close()
+            self.fileMap = None
+        self.file.close()
+
+
+class DEMTileCache(object):
+    """
+    size-bounded cache of 1x1 degree elevation (DEM) tiles, shared by all locations and visibility radii
+    rasters of a region are mosaicked from the cached tiles, and only the missing tiles are downloaded
+    """
+    fileExtension = ".tif"
+    noDataValue = -32768
+    
+    def __init__(self, folderPath, maxFolderSizeMB=2000):
+        self.folderPath = folderPath
+        self.maxFolderSizeBytes = maxFolderSizeMB * 1024 * 1024
+    
+    
+    def tileFilePath(self, sourceLabel, latitudeIndex, longitudeIndex):
+        """
+        file path of the tile with its lower left corner at latitudeIndex, longitudeIndex (in degrees)
+        """
+        fileName = "%s_%s%02d_%s%03d%s" % (sourceLabel, "N" if (latitudeIndex >= 0) else "S", abs(latitudeIndex), "E" if (longitudeIndex >= 0) else "W", abs(longitudeIndex), self.fileExtension)
+        return os.path.join(self.folderPath, fileName)
+    
+    
+    def tileIndices(self, south, north, west, east):
+        """
+        latitude, longitude indices of the tiles covering the region
+        """
+        latitudeIndices = range(int(math.floor(south)), max(int(math.ceil(north)), int(math.floor(south))+1))
+        longitudeIndices = range(int(math.floor(west)), max(int(math.ceil(east)), int(math.floor(west))+1))
+        return [(latitudeIndex, longitudeIndex) for latitudeIndex in latitudeIndices for longitudeIndex in longitudeIndices]
+    
+    
+    def cacheTiles(self, sourceLabel, tileIndicesL, downloadLinkFunction, downloadFileFunction):
+        """
+        download the tiles which are not cached yet: downloadLinkFunction(south, north, west, east) returns the download link of a region, and downloadFileFunction(downloadLink, filePath) downloads it
+        returns True if all the tiles are cached
+        """
+        tileFilePathsL = []
+        for latitudeIndex, longitudeIndex in tileIndicesL:
+            tileFilePath = self.tileFilePath(sourceLabel, latitudeIndex, longitudeIndex)
+            tileFilePathsL.append(tileFilePath)
+            if os.path.exists(tileFilePath):
+                # mark the tile as the most recently used one
+                os.utime(tileFilePath, None)
+                continue
+            
+            tileCached = downloadFileFunction(downloadLinkFunction(latitudeIndex, latitudeIndex+1, longitudeIndex, longitudeIndex+1), tileFilePath)
+            if tileCached:
+                # the downloaded file may be an error message instead of a GeoTIFF
+                try:
+                    GeoTiff(tileFilePath).close()
+                except Exception as e:
+                    tileCached = False
+            if not tileCached:
+                if os.path.exists(tileFilePath):
+                    os.remove(tileFilePath)
+                return False
+        
+        self.evict(tileFilePathsL)
+        return True
+    
+    
+    def mosaic(self, sourceLabel, south, north, west, east, outputFilePath, downloadLinkFunction, downloadFileFunction):
+        """
+        write the raster of the region (south, north, west, east in degrees) to outputFilePath GeoTIFF, mosaicked from the cached tiles. Missing tiles are downloaded first (see cacheTiles method)
+        the raster has the cell size and grid alignment of the tiles. Returns True if the raster has been written
+        """
+        if west >= east:
+            # the region crosses the antimeridian
+            return False
+        tileIndicesL = self.tileIndices(south, north, west, east)
+        if not self.cacheTiles(sourceLabel, tileIndicesL, downloadLinkFunction, downloadFileFunction):
+            return False
+        
+        tiles = {}
+        try:
+            for latitudeIndex, longitudeIndex in tileIndicesL:
+                tiles[(latitudeIndex, longitudeIndex)] = GeoTiff(self.tileFilePath(sourceLabel, latitudeIndex, longitudeIndex))
+            
+            firstTile = tiles[tileIndicesL[0]]
+            cellSizeX = firstTile.cellSizeX
+            cellSizeY = firstTile.cellSizeY
+            originX = firstTile.originX + math.floor((west - firstTile.originX) / cellSizeX) * cellSizeX
+            originY = firstTile.originY - math.floor((firstTile.originY - north) / cellSizeY) * cellSizeY
+            numOfColumns = int(math.ceil((east - originX) / cellSizeX))
+            numOfRows = int(math.ceil((originY - south) / cellSizeY))
+            minLatitudeIndex = tileIndicesL[0][0]; maxLatitudeIndex = tileIndicesL[-1][0]
+            minLongitudeIndex = tileIndicesL[0][1]; maxLongitudeIndex = tileIndicesL[-1][1]
+            
+            # raster columns grouped by the longitude of their tiles
+            columnsLongitudesL = []
+            for column in xrange(numOfColumns):
+                longitude = originX + (column+0.5)*cellSizeX
+                longitudeIndex = min(max(int(math.floor(longitude)), minLongitudeIndex), maxLongitudeIndex)
+                if (len(columnsLongitudesL) == 0) or (columnsLongitudesL[-1][0] != longitudeIndex):
+                    columnsLongitudesL.append((longitudeIndex, []))
+                columnsLongitudesL[-1][1].append(longitude)
+            tilesColumns = {}  # tile indices: tile columns of the raster columns
+            
+            def mosaicRow(row):
+                latitude = originY - (row+0.5)*cellSizeY
+                latitudeIndex = min(max(int(math.floor(latitude)), minLatitudeIndex), maxLatitudeIndex)
+                elevationsRow = []
+                for longitudeIndex, longitudesL in columnsLongitudesL:
+                    tile = tiles[(latitudeIndex, longitudeIndex)]
+                    if (latitudeIndex, longitudeIndex) not in tilesColumns:
+                        tilesColumns[(latitudeIndex, longitudeIndex)] = [min(max(int((longitude - tile.originX) / tile.cellSizeX), 0), tile.numOfColumns-1) for longitude in longitudesL]
+                    tileRow = min(max(int((tile.originY - latitude) / tile.cellSizeY), 0), tile.numOfRows-1)
+                    tileElevationsRow = tile.readWindow(tileRow, 0, 1, tile.numOfColumns)[0]
+                    elevationsRow.extend([tileElevationsRow[tileColumn] for tileColumn in tilesColumns[(latitudeIndex, longitudeIndex)]])
+                return elevationsRow
+            
+            self.writeGeoTiff(outputFilePath, originX, originY, cellSizeX, cellSizeY, numOfRows, numOfColumns, mosaicRow)
+        finally:
+            for tile in tiles.values():
+                tile.close()
+        
+        return True
+    
+    
+    def writeGeoTiff(self, filePath, originX, originY, cellSizeX, cellSizeY, numOfRows, numOfColumns, elevationsRow):
+        """
+        write an uncompressed float32 geographic (EPSG:4326) GeoTIFF, one strip per row. elevationsRow(row) returns the list of elevations of a row (None for no data)
+        originX, originY are the coordinates of the upper left corner of the upper left cell
+        """
+        rowBytes = 4 * numOfColumns
+        stripOffsets = array.array("I", [8 + row*rowBytes for row in xrange(numOfRows)])
+        stripByteCounts = array.array("I", [rowBytes]) * numOfRows
+        if sys.byteorder != "little":
+            stripOffsets.byteswap()
+            stripByteCounts.byteswap()
+        noDataString = ("%s\x00" % self.noDataValue).encode("ascii")
+        tagsL = [  # tag, field type, count, values bytes
+            (256, 4, 1, struct.pack("<I", numOfColumns)),
+            (257, 4, 1, struct.pack("<I", numOfRows)),
+            (258, 3, 1, struct.pack("<H", 32)),  # BitsPerSample
+            (259, 3, 1, struct.pack("<H", 1)),  # no compression
+            (262, 3, 1, struct.pack("<H", 1)),  # BlackIsZero
+            (273, 4, numOfRows, arrayToBytes(stripOffsets)),
+            (277, 3, 1, struct.pack("<H", 1)),  # SamplesPerPixel
+            (278, 4, 1, struct.pack("<I", 1)),  # RowsPerStrip
+            (279, 4, numOfRows, arrayToBytes(stripByteCounts)),
+            (284, 3, 1, struct.pack("<H", 1)),  # PlanarConfiguration
+            (339, 3, 1, struct.pack("<H", 3)),  # float SampleFormat
+            (33550, 12, 3, struct.pack("<3d", cellSizeX, cellSizeY, 0)),  # ModelPixelScale
+            (33922, 12, 6, struct.pack("<6d", 0, 0, 0, originX, originY, 0)),  # ModelTiepoint
+            (34735, 3, 16, struct.pack("<16H", 1,1,0,3,  1024,0,1,2,  1025,0,1,1,  2048,0,1,4326)),  # GeoKeyDirectory: geographic, PixelIsArea, WGS84
+            (42113, 2, len(noDataString), noDataString)]  # GDAL_NODATA
+        
+        myFile = open(filePath, "wb")
+        myFile.write(struct.pack("<2sHI", b"II", 42, 0))  # IFD offset is written at the end
+        for row in xrange(numOfRows):
+            elevations = array.array("f", [self.noDataValue if (z == None) else z for z in elevationsRow(row)])
+            if sys.byteorder != "little":
+                elevations.byteswap()
+            myFile.write(arrayToBytes(elevations))
+        
+        # values which do not fit into the IFD entries
+        entriesL = []
+        for tag, fieldType, count, valuesBytes in tagsL:
+            if len(valuesBytes) > 4:
+                if myFile.tell() % 2 == 1:
+                    myFile.write(b"\x00")
+                valuesOffset = myFile.tell()
+                myFile.write(valuesBytes)
+                valuesBytes = struct.pack("<I", valuesOffset)
+            entriesL.append(struct.pack("<HHI", tag, fieldType, count) + valuesBytes.ljust(4, b"\x00"))
+        if myFile.tell() % 2 == 1:
+            myFile.write(b"\x00")
+        ifdOffset = myFile.tell()
+        myFile.write(struct.pack("<H", len(entriesL)) + b"".join(entriesL) + struct.pack("<I", 0))
+        myFile.seek(4)
+        myFile.write(struct.pack("<I", ifdOffset))
+        myFile.close()
+    
+    
+    def evict(self, keepFilePathsL=[]):
+        """
+        delete the least recently used tiles, until the size of the cache folder is smaller than maxFolderSizeMB
+        """
+        tileFilesL = []
+        folderSize = 0
+        for fileName in os.listdir(self.folderPath):
+            if fileName.endswith(self.fileExtension):
+                filePath = os.path.join(self.folderPath, fileName)
+                fileStat = os.stat(filePath)
+                tileFilesL.append((fileStat.st_mtime, fileStat.st_size, filePath))
+                folderSize += fileStat.st_size
+        
+        tileFilesL.sort()
+        for lastUsedTime, fileSize, filePath in tileFilesL:
+            if folderSize <= self.maxFolderSizeBytes:
+                break
+            if filePath not in keepFilePathsL:
+                os.remove(filePath)
+                folderSize -= fileSize